@@ -15,14 +15,74 @@ class Settings(BaseSettings):
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     openai_vision_model: str = os.getenv("OPENAI_VISION_MODEL", "gpt-4o-mini")
+    # Альтернативный адрес API (прокси, совместимый сервис или mock для нагрузочных тестов)
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
+    # Таймаут запроса к OpenAI (секунды) и число повторов SDK при сетевых ошибках
+    openai_timeout: float = float(os.getenv("OPENAI_TIMEOUT", "60"))
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
     
     # API
     api_host: str = os.getenv("API_HOST", "0.0.0.0")
     api_port: int = int(os.getenv("API_PORT", "8000"))
+    # Режим запуска: development (reload, один процесс) или production (несколько воркеров)
+    app_env: str = os.getenv("APP_ENV", "development")
+    api_workers: int = int(os.getenv("API_WORKERS", "0"))  # 0 - по числу ядер CPU
+    
+    # Контроль нагрузки: одновременные запросы и очередь по классам эндпоинтов
+    admission_enabled: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    admission_llm_concurrency: int = int(os.getenv("ADMISSION_LLM_CONCURRENCY", "8"))
+    admission_llm_queue: int = int(os.getenv("ADMISSION_LLM_QUEUE", "16"))
+    admission_parse_concurrency: int = int(os.getenv("ADMISSION_PARSE_CONCURRENCY", "4"))
+    admission_parse_queue: int = int(os.getenv("ADMISSION_PARSE_QUEUE", "8"))
+    # CoDel: допустимая задержка в очереди и окно её измерения
+    admission_target_delay_ms: int = int(os.getenv("ADMISSION_TARGET_DELAY_MS", "2000"))
+    admission_interval_ms: int = int(os.getenv("ADMISSION_INTERVAL_MS", "5000"))
+    
+    # Circuit breaker для OpenAI и хостов конкурентов: пороги доли ошибок и медленных
+    # вызовов в окне последних вызовов, время разомкнутого состояния, пробные вызовы
+    circuit_enabled: bool = os.getenv("CIRCUIT_ENABLED", "true").lower() == "true"
+    circuit_failure_rate: float = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+    circuit_slow_call_rate: float = float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.8"))
+    circuit_window: int = int(os.getenv("CIRCUIT_WINDOW", "20"))
+    circuit_min_calls: int = int(os.getenv("CIRCUIT_MIN_CALLS", "4"))
+    circuit_open_seconds: float = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+    circuit_half_open_calls: int = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "2"))
+    # Какой вызов считается медленным (секунды)
+    circuit_openai_slow_seconds: float = float(os.getenv("CIRCUIT_OPENAI_SLOW_SECONDS", "45"))
+    circuit_host_slow_seconds: float = float(os.getenv("CIRCUIT_HOST_SLOW_SECONDS", "8"))
+    
+    # Пул процессов для CPU-задач (разбор HTML, перекодирование изображений):
+    # число процессов (0 - ядра CPU на процесс сервера) и предел отправленных задач (0 - 4 на процесс)
+    cpu_pool_enabled: bool = os.getenv("CPU_POOL_ENABLED", "true").lower() == "true"
+    cpu_pool_workers: int = int(os.getenv("CPU_POOL_WORKERS", "0"))
+    cpu_pool_queue: int = int(os.getenv("CPU_POOL_QUEUE", "0"))
+    
+    # Загрузка файлов: предел размера тела запроса, порог выгрузки во временный файл,
+    # ограничения изображения перед отправкой в OpenAI
+    max_upload_size_mb: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "10"))
+    upload_spool_size_kb: int = int(os.getenv("UPLOAD_SPOOL_SIZE_KB", "1024"))
+    image_max_dimension: int = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+    image_max_pixels: int = int(os.getenv("IMAGE_MAX_PIXELS", "40000000"))
+    image_jpeg_quality: int = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+    
+    # Разделяемое между процессами состояние (кеши, лимиты)
+    shared_state_file: str = os.getenv("SHARED_STATE_FILE", "shared_state.db")
+    analysis_cache_ttl: int = int(os.getenv("ANALYSIS_CACHE_TTL", "86400"))
+    openai_requests_per_minute: int = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "0"))  # 0 - без лимита
+    
+    # Диагностика: токен администратора открывает профилирование запросов
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+    profiles_dir: str = os.getenv("PROFILES_DIR", "profiles")
+    profiles_keep: int = int(os.getenv("PROFILES_KEEP", "50"))
+    
+    # Сжатие ответов: минимальный размер тела (байт), уровни gzip и brotli
+    compression_min_size: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    compression_gzip_level: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    compression_brotli_quality: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
     
     # История
     history_file: str = os.getenv("HISTORY_FILE", "history.json")
-    max_history_items: int = int(os.getenv("MAX_HISTORY_ITEMS", "10"))
+    max_history_items: int = int(os.getenv("MAX_HISTORY_ITEMS", "1000"))
     
     # Парсер
     parser_timeout: int = int(os.getenv("PARSER_TIMEOUT", "10"))
@@ -35,9 +95,42 @@ class Settings(BaseSettings):
     selenium_timeout: int = int(os.getenv("SELENIUM_TIMEOUT", "15"))
     selenium_headless: bool = os.getenv("SELENIUM_HEADLESS", "true").lower() == "true"
     selenium_wait_time: int = int(os.getenv("SELENIUM_WAIT_TIME", "3"))
-    # URL конкурентов для мониторинга (через запятую)
+    # URL конкурентов для мониторинга (через запятую, интервал проверки - необязательный суффикс "|минуты")
     competitor_urls: str = os.getenv("COMPETITOR_URLS", "")
-    
+    # Плановый мониторинг COMPETITOR_URLS: интервал по умолчанию (минуты; для отдельного URL -
+    # суффикс "|минуты": https://example.com|60), разброс времени проверки (доля интервала),
+    # файл расписания, шаг планировщика (секунды) и приоритет задач анализа изменений
+    monitor_enabled: bool = os.getenv("MONITOR_ENABLED", "true").lower() == "true"
+    monitor_interval_minutes: float = float(os.getenv("MONITOR_INTERVAL_MINUTES", "360"))
+    monitor_jitter: float = float(os.getenv("MONITOR_JITTER", "0.1"))
+    monitor_state_file: str = os.getenv("MONITOR_STATE_FILE", "monitor_state.json")
+    monitor_tick_seconds: int = int(os.getenv("MONITOR_TICK_SECONDS", "30"))
+    monitor_job_priority: int = int(os.getenv("MONITOR_JOB_PRIORITY", "8"))
+    # Обход сайта (/crawl): лимиты по умолчанию, параллельность и вежливость к сайту
+    crawl_max_pages: int = int(os.getenv("CRAWL_MAX_PAGES", "50"))
+    crawl_max_depth: int = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+    crawl_concurrency: int = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+    crawl_per_host_concurrency: int = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "4"))
+    crawl_delay_ms: int = int(os.getenv("CRAWL_DELAY_MS", "100"))  # между запросами к одному хосту
+    crawl_summary_workers: int = int(os.getenv("CRAWL_SUMMARY_WORKERS", "8"))  # параллельные резюме страниц
+    # Сравнение конкурентов (/compare): сколько конкурентов загружать и анализировать одновременно
+    compare_concurrency: int = int(os.getenv("COMPARE_CONCURRENCY", "5"))
+    # Локальные правила (факты без LLM): JSON-файл с дополнительными правилами
+    rules_file: str = os.getenv("RULES_FILE", "")
+
+    # Хронология изменений сайтов конкурентов
+    timeline_dir: str = os.getenv("TIMELINE_DIR", "timelines")
+    timeline_keyframe_interval: int = int(os.getenv("TIMELINE_KEYFRAME_INTERVAL", "30"))
+
+    # Фоновые задачи (очередь в SQLite, пул воркеров)
+    jobs_db_file: str = os.getenv("JOBS_DB_FILE", "jobs.db")
+    jobs_upload_dir: str = os.getenv("JOBS_UPLOAD_DIR", "job_uploads")
+    job_workers: int = int(os.getenv("JOB_WORKERS", "2"))
+    job_queue_limit: int = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+    job_lease_seconds: int = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+    job_max_attempts: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    job_retention_hours: int = int(os.getenv("JOB_RETENTION_HOURS", "72"))
+
     # Telegram Bot (опционально)
     telegram_bot_token: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
     
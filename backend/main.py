@@ -2,26 +2,116 @@
 Главный модуль FastAPI приложения
 Мониторинг конкурентов - MVP ассистент
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import asyncio
+import contextvars
+import json
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pathlib import Path
-import uvicorn
+from pydantic import ValidationError
+from starlette.formparsers import MultiPartParser
 
 from backend.config import settings
+from backend.middleware import (
+    AdmissionMiddleware,
+    BodySizeLimitMiddleware,
+    CompressionMiddleware,
+    MetricsMiddleware,
+    ServerTimingMiddleware,
+)
+from backend.static_files import PrecompressedStaticFiles
 from backend.models.schemas import (
     TextAnalysisRequest,
     TextAnalysisResponse,
     ImageAnalysisResponse,
     ParseDemoRequest,
+    ParseManyRequest,
+    CrawlRequest,
+    CrawlResponse,
+    CrawledPage,
+    CompareRequest,
+    CompareResponse,
+    MonitorAnalyzeRequest,
+    MonitorStatus,
+    ComparedCompetitor,
+    RuleEvaluation,
+    RuleInfo,
+    RulesEvaluateRequest,
+    RulesEvaluateResponse,
     ParseDemoResponse,
     ParsedContent,
-    HistoryResponse
+    HistoryResponse,
+    TimelineResponse,
+    JobSubmitRequest,
+    JobInfo,
+    CapabilitiesResponse,
+    ImageLimits
 )
-from backend.services.openai_service import openai_service
+from backend.services.openai_service import ImageSource, openai_service
 from backend.services.parser_service import parser_service
+from backend.services.crawler_service import crawler_service
+from backend.services.rule_service import rule_engine
 from backend.services.history_service import history_service
+from backend.services.timeline_service import timeline_service
+from backend.services.job_service import job_service, JobQueueFullError, FINAL_STATUSES
+from backend.services.event_service import event_service
+from backend.services.admission_service import admission_controller
+from backend.services.circuit_service import OPEN, circuit_breakers
+from backend.services.cpu_service import cpu_pool
+from backend.services.monitor_service import monitor_service
+from backend.services.metrics_service import metrics
+from backend.services.profiling_service import profiling_service, run_in_threadpool
+from backend.services.shared_state import shared_state
+
+try:
+    # Сериализация ответов через orjson (в разы быстрее json из стандартной библиотеки)
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
+
+def init_services():
+    """
+    Инициализация сервисов при старте: базы SQLite, файл истории, клиент OpenAI,
+    процессы пула CPU-задач
+
+    При импорте модулей сервисы только создаются, без ввода-вывода и
+    тяжёлых импортов - импорт backend.main и запуск воркеров быстрые.
+    """
+    shared_state.init()
+    job_service.init()
+    history_service.init()
+    if openai_service:
+        # Импорт OpenAI SDK и создание клиента до первого запроса
+        openai_service.client
+    cpu_pool.start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка фоновых сервисов"""
+    await run_in_threadpool(init_services)
+    await event_service.start()
+    await job_service.start()
+    await monitor_service.start()
+    yield
+    await monitor_service.stop()
+    await job_service.stop()
+    await event_service.stop()
+    # Каждый воркер сервера держит свой Selenium драйвер - закрываем его
+    parser_service.close()
+    cpu_pool.close()
 
 
 # Инициализация приложения
@@ -30,24 +120,60 @@ app = FastAPI(
     description="MVP ассистент для анализа конкурентов с поддержкой текста и изображений",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=DefaultResponse,
+    lifespan=lifespan
 )
 
-# CORS для работы с фронтендом
+# Контроль нагрузки: при перегрузке быстрый 503 + Retry-After
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
+# Порог, после которого загружаемый файл выгружается из памяти во временный файл
+MultiPartParser.max_file_size = settings.upload_spool_size_kb * 1024
+
+# Предел размера тела запроса (снаружи admission control - слишком большие
+# загрузки отклоняются сразу, не занимая место в очереди)
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=settings.max_upload_size_mb * 1024 * 1024)
+
+# Сжатие ответов (JSON, статика) по Accept-Encoding
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_min_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality
+)
+
+# Server-Timing по этапам и профилирование по запросу администратора
+# (снаружи admission control - в total входит ожидание в очереди)
+app.add_middleware(ServerTimingMiddleware, profiler=profiling_service)
+
+# Метрики запросов (снаружи admission control - учитываются и отклонённые 503)
+app.add_middleware(MetricsMiddleware)
+
+# CORS для работы с фронтендом (добавлен последним - внешний слой, заголовки есть и у 503)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "Server-Timing", "X-Profile-Id"],
 )
 
 
 # === Эндпоинты ===
 
+# Собранный веб-интерфейс (python web/build.py): файлы с хешем в имени,
+# предсжатые варианты, долгое кеширование
+web_dist_dir = Path("web/dist")
+web_assets = PrecompressedStaticFiles(directory=str(web_dist_dir), check_dir=False)
+
+
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Главная страница - отдаём фронтенд"""
+    if (web_dist_dir / "index.html").exists():
+        return await web_assets.get_response("index.html", request.scope)
     web_index = Path("web/index.html")
     if web_index.exists():
         return FileResponse(web_index)
@@ -60,17 +186,12 @@ async def favicon():
     return Response(status_code=204)
 
 
-@app.post("/analyze_text", response_model=TextAnalysisResponse)
-async def analyze_text(request: TextAnalysisRequest):
-    """
-    Анализ текста конкурента
-    
-    Принимает текст и возвращает структурированную аналитику:
-    - Сильные стороны
-    - Слабые стороны
-    - Уникальные предложения
-    - Рекомендации по улучшению стратегии
-    """
+# === Выполнение анализов ===
+# Блокирующие функции: вызываются из эндпоинтов через пул потоков
+# и из фоновых задач, поэтому ответы синхронного и фонового режима совпадают
+
+def run_text_analysis(text: str) -> TextAnalysisResponse:
+    """Анализ текста с сохранением в историю"""
     if not openai_service:
         return TextAnalysisResponse(
             success=False,
@@ -78,16 +199,19 @@ async def analyze_text(request: TextAnalysisRequest):
         )
     
     try:
-        analysis = openai_service.analyze_text(request.text)
+        # Детерминированные факты - локальными правилами, без модели
+        facts = rule_engine.evaluate(text)
+        analysis = openai_service.analyze_text(text)
         
         if not analysis:
             return TextAnalysisResponse(
                 success=False,
+                facts=facts,
                 error="Не удалось проанализировать текст. Проверьте логи."
             )
         
         # Сохраняем в историю
-        request_summary = request.text[:100] + "..." if len(request.text) > 100 else request.text
+        request_summary = text[:100] + "..." if len(text) > 100 else text
         response_summary = analysis.summary if analysis.summary else "Анализ выполнен"
         
         history_service.add_entry(
@@ -98,7 +222,8 @@ async def analyze_text(request: TextAnalysisRequest):
         
         return TextAnalysisResponse(
             success=True,
-            analysis=analysis
+            analysis=analysis,
+            facts=facts
         )
     except Exception as e:
         return TextAnalysisResponse(
@@ -107,37 +232,17 @@ async def analyze_text(request: TextAnalysisRequest):
         )
 
 
-@app.post("/analyze_image", response_model=ImageAnalysisResponse)
-async def analyze_image(file: UploadFile = File(...)):
-    """
-    Анализ изображения конкурента
-    
-    Принимает изображение (баннер, сайт, упаковка) и возвращает:
-    - Описание изображения
-    - Маркетинговые инсайты
-    - Оценку визуального стиля
-    - Рекомендации
-    """
+def run_image_analysis(image: ImageSource, filename: Optional[str]) -> ImageAnalysisResponse:
+    """Анализ изображения (файл, путь или байты) с сохранением в историю"""
     if not openai_service:
         return ImageAnalysisResponse(
             success=False,
             error="OpenAI сервис не инициализирован. Проверьте OPENAI_API_KEY в .env файле"
         )
     
-    # Проверяем тип файла
-    allowed_types = ["image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp"]
-    if file.content_type not in allowed_types:
-        return ImageAnalysisResponse(
-            success=False,
-            error=f"Неподдерживаемый тип файла. Разрешены: {', '.join(allowed_types)}"
-        )
-    
     try:
-        # Читаем изображение
-        content = await file.read()
-        
         # Анализируем
-        analysis = openai_service.analyze_image(content, file.filename)
+        analysis = openai_service.analyze_image(image, filename)
         
         if not analysis:
             return ImageAnalysisResponse(
@@ -146,7 +251,7 @@ async def analyze_image(file: UploadFile = File(...)):
             )
         
         # Сохраняем в историю
-        request_summary = f"Изображение: {file.filename or 'uploaded_image'}"
+        request_summary = f"Изображение: {filename or 'uploaded_image'}"
         response_summary = analysis.description[:200] if analysis.description else "Анализ изображения выполнен"
         
         history_service.add_entry(
@@ -166,18 +271,20 @@ async def analyze_image(file: UploadFile = File(...)):
         )
 
 
-@app.post("/parse_demo", response_model=ParseDemoResponse)
-async def parse_demo(request: ParseDemoRequest):
-    """
-    Парсинг и анализ сайта конкурента (демо)
-    
-    Принимает URL, извлекает:
-    - Title страницы
-    - H1 заголовок
-    - Первый абзац
-    
-    И передаёт их модели для анализа
-    """
+def _parsed_analysis_text(parsed_data: dict) -> Optional[str]:
+    """Текст для анализа из извлечённых данных страницы (None - контент не найден)"""
+    analysis_text_parts = []
+    if parsed_data.get("title"):
+        analysis_text_parts.append(f"Заголовок: {parsed_data['title']}")
+    if parsed_data.get("h1"):
+        analysis_text_parts.append(f"H1: {parsed_data['h1']}")
+    if parsed_data.get("first_paragraph"):
+        analysis_text_parts.append(f"Первый абзац: {parsed_data['first_paragraph']}")
+    return "\n".join(analysis_text_parts) if analysis_text_parts else None
+
+
+def run_parse_demo(url: str) -> ParseDemoResponse:
+    """Парсинг и анализ страницы с сохранением в историю и хронологию"""
     if not openai_service:
         return ParseDemoResponse(
             success=False,
@@ -186,7 +293,7 @@ async def parse_demo(request: ParseDemoRequest):
     
     try:
         # Парсим страницу
-        parsed_data = parser_service.parse_url(request.url)
+        parsed_data = parser_service.parse_url(url)
         
         if parsed_data.get("error"):
             return ParseDemoResponse(
@@ -194,30 +301,24 @@ async def parse_demo(request: ParseDemoRequest):
                 error=parsed_data["error"]
             )
         
-        # Формируем текст для анализа из извлеченных данных
-        analysis_text_parts = []
-        if parsed_data.get("title"):
-            analysis_text_parts.append(f"Заголовок: {parsed_data['title']}")
-        if parsed_data.get("h1"):
-            analysis_text_parts.append(f"H1: {parsed_data['h1']}")
-        if parsed_data.get("first_paragraph"):
-            analysis_text_parts.append(f"Первый абзац: {parsed_data['first_paragraph']}")
-        
-        analysis_text = "\n".join(analysis_text_parts) if analysis_text_parts else "Контент не найден"
+        # Фиксируем снимок в хронологии изменений конкурента
+        timeline_service.record(parsed_data)
         
         # Анализируем извлечённый контент
-        analysis = openai_service.analyze_text(analysis_text) if analysis_text_parts else None
+        analysis_text = _parsed_analysis_text(parsed_data)
+        analysis = openai_service.analyze_text(analysis_text) if analysis_text else None
         
         parsed_content = ParsedContent(
             url=parsed_data["url"],
             title=parsed_data.get("title"),
             h1=parsed_data.get("h1"),
             first_paragraph=parsed_data.get("first_paragraph"),
-            analysis=analysis
+            analysis=analysis,
+            facts=rule_engine.evaluate(analysis_text)
         )
         
         # Сохраняем в историю
-        request_summary = f"URL: {request.url}"
+        request_summary = f"URL: {url}"
         response_summary = f"Title: {parsed_data.get('title', 'N/A')}"
         
         history_service.add_entry(
@@ -237,45 +338,847 @@ async def parse_demo(request: ParseDemoRequest):
         )
 
 
-@app.get("/history", response_model=HistoryResponse)
-async def get_history():
+def run_monitor_analysis(url: str, version: int, changed_fields: list) -> ParseDemoResponse:
+    """
+    Анализ версии страницы, изменившейся при плановой проверке
+
+    Страница уже загружена и записана в хронологию планировщиком: снимок
+    берётся оттуда. Анализ попадает в общий кеш, поэтому /parse_demo
+    той же страницы отвечает без обращения к модели.
+    """
+    if not openai_service:
+        return ParseDemoResponse(
+            success=False,
+            error="OpenAI сервис не инициализирован. Проверьте OPENAI_API_KEY в .env файле"
+        )
+    
+    snapshot = timeline_service.get_snapshot(url, version)
+    if snapshot is None:
+        return ParseDemoResponse(success=False, error=f"Версия {version} страницы {url} не найдена в хронологии")
+    
+    try:
+        parsed_data = snapshot.model_dump()
+        analysis_text = _parsed_analysis_text(parsed_data)
+        analysis = openai_service.analyze_text(analysis_text) if analysis_text else None
+        
+        history_service.add_entry(
+            request_type="monitor",
+            request_summary=f"Изменения: {url}",
+            response_summary=(f"Изменено: {', '.join(changed_fields)}. " if changed_fields else "")
+            + (analysis.summary if analysis and analysis.summary else f"Title: {snapshot.title or 'N/A'}")
+        )
+        
+        return ParseDemoResponse(
+            success=analysis is not None or not analysis_text,
+            data=ParsedContent(
+                url=url,
+                title=snapshot.title,
+                h1=snapshot.h1,
+                first_paragraph=snapshot.first_paragraph,
+                analysis=analysis,
+                facts=rule_engine.evaluate(analysis_text)
+            ),
+            error=None if analysis or not analysis_text else "Не удалось проанализировать страницу"
+        )
+    except Exception as e:
+        return ParseDemoResponse(
+            success=False,
+            error=str(e)
+        )
+
+
+# Сводный анализ сайта: сколько символов резюме страниц передавать модели
+CRAWL_REDUCE_MAX_CHARS = 12000
+
+
+def _crawl_reduce_text(url: str, pages: list) -> str:
+    """Текст для сводного анализа: резюме страниц (или заголовки, если резюме нет)"""
+    header = f"Сайт конкурента: {url}. Ниже - факты со страниц сайта."
+    parts = [header]
+    used = len(header)
+    skipped = 0
+    for page in pages:
+        notes = page.get("summary") or "\n".join(
+            page[key] for key in ("h1", "description") if page.get(key)
+        )
+        if not notes:
+            continue
+        block = f"\n\n### {page.get('title') or page['url']}\n{notes}"
+        if used + len(block) > CRAWL_REDUCE_MAX_CHARS:
+            skipped += 1
+            continue
+        parts.append(block)
+        used += len(block)
+    if skipped:
+        parts.append(f"\n\n(не вошли ещё {skipped} страниц)")
+    return "".join(parts)
+
+
+def run_crawl(
+    url: str,
+    max_pages: Optional[int] = None,
+    max_depth: Optional[int] = None,
+    cancelled: Optional[Callable[[], bool]] = None
+) -> CrawlResponse:
+    """
+    Обход сайта и сводный анализ с сохранением в историю
+    
+    map: страницы резюмируются моделью параллельно, по мере загрузки;
+    reduce: резюме объединяются в один CompetitorAnalysis.
+    cancelled: обход прекращается, когда функция вернёт True (отмена задачи).
+    """
+    if not openai_service:
+        return CrawlResponse(
+            success=False,
+            error="OpenAI сервис не инициализирован. Проверьте OPENAI_API_KEY в .env файле"
+        )
+    
+    started = time.perf_counter()
+    try:
+        result = crawler_service.crawl(url, max_pages, max_depth, summarize=openai_service.summarize_page, cancelled=cancelled)
+        pages = result["pages"]
+        loaded = [page for page in pages if not page.get("error")]
+        if not loaded:
+            return CrawlResponse(
+                success=False,
+                url=result["url"],
+                pages=[CrawledPage(**page) for page in pages],
+                error=pages[0]["error"] if pages else "Страницы сайта не найдены"
+            )
+        
+        if cancelled is not None and cancelled():
+            return CrawlResponse(success=False, url=result["url"], error="Обход отменён")
+        analysis = openai_service.analyze_text(_crawl_reduce_text(result["url"], loaded))
+        
+        history_service.add_entry(
+            request_type="crawl",
+            request_summary=f"Сайт: {result['url']}",
+            response_summary=f"Страниц: {len(loaded)}. " + (analysis.summary if analysis and analysis.summary else "")
+        )
+        
+        return CrawlResponse(
+            success=analysis is not None,
+            url=result["url"],
+            pages=[CrawledPage(**page) for page in pages],
+            pages_found=result["pages_found"],
+            from_sitemap=result["from_sitemap"],
+            analysis=analysis,
+            duration_seconds=round(time.perf_counter() - started, 2),
+            error=None if analysis else "Не удалось получить сводный анализ. Проверьте логи."
+        )
+    except Exception as e:
+        return CrawlResponse(
+            success=False,
+            error=str(e)
+        )
+
+
+def _compare_one(kind: str, value: str, number: int) -> ComparedCompetitor:
+    """Загрузить и проанализировать одного конкурента для сравнения (в пуле потоков)"""
+    if kind == "text":
+        analysis = openai_service.analyze_text(value)
+        return ComparedCompetitor(
+            name=f"Текст {number}",
+            analysis=analysis,
+            facts=rule_engine.evaluate(value),
+            error=None if analysis else "Не удалось проанализировать текст"
+        )
+    
+    parsed_data = parser_service.parse_url(value)
+    url = parsed_data["url"]
+    parsed_url = urlparse(url)
+    # Страницы одного сайта различаются путём
+    name = (parsed_url.hostname or url) + (parsed_url.path if parsed_url.path not in ("", "/") else "")
+    if parsed_data.get("error"):
+        return ComparedCompetitor(name=name, url=url, error=parsed_data["error"])
+    timeline_service.record(parsed_data)
+    # Тот же текст, что и в /parse_demo: анализ берётся из общего кеша, если сайт уже проверяли
+    analysis_text = _parsed_analysis_text(parsed_data)
+    analysis = openai_service.analyze_text(analysis_text) if analysis_text else None
+    return ComparedCompetitor(
+        name=name,
+        url=url,
+        title=parsed_data.get("title"),
+        analysis=analysis,
+        facts=rule_engine.evaluate(analysis_text),
+        error=None if analysis else ("Контент не найден" if not analysis_text else "Не удалось проанализировать страницу")
+    )
+
+
+def run_compare(urls: list, texts: list) -> CompareResponse:
+    """
+    Сравнение конкурентов с сохранением в историю
+    
+    Конкуренты загружаются и анализируются параллельно (COMPARE_CONCURRENCY),
+    затем готовые анализы сводятся в сравнительную матрицу: время ответа -
+    примерно один анализ плюс свёртка, а не N анализов подряд.
+    """
+    if not openai_service:
+        return CompareResponse(
+            success=False,
+            error="OpenAI сервис не инициализирован. Проверьте OPENAI_API_KEY в .env файле"
+        )
+    
+    started = time.perf_counter()
+    # Повторы в запросе анализируются один раз
+    inputs = [("url", url) for url in dict.fromkeys(urls)] + [("text", text) for text in dict.fromkeys(texts)]
+    try:
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(len(inputs), settings.compare_concurrency)),
+            thread_name_prefix="compare"
+        ) as executor:
+            # Потоки пула не наследуют контекст запроса: без копии этапы
+            # анализов (fetch, llm, ...) не попадут в Server-Timing
+            futures = [
+                executor.submit(contextvars.copy_context().run, _compare_one, kind, value, number)
+                for number, (kind, value) in enumerate(inputs, 1)
+            ]
+            competitors = [future.result() for future in futures]
+        
+        analysed = [(item.name, item.analysis) for item in competitors if item.analysis]
+        if len(analysed) < 2:
+            return CompareResponse(
+                success=False,
+                competitors=competitors,
+                duration_seconds=round(time.perf_counter() - started, 2),
+                error="Для сравнения нужно минимум два успешно проанализированных конкурента"
+            )
+        
+        comparison = openai_service.compare_competitors(analysed)
+        
+        if comparison:
+            history_service.add_entry(
+                request_type="compare",
+                request_summary="Сравнение: " + ", ".join(name for name, _ in analysed),
+                response_summary=comparison.summary or "Сравнение выполнено"
+            )
+        
+        return CompareResponse(
+            success=comparison is not None,
+            competitors=competitors,
+            comparison=comparison,
+            duration_seconds=round(time.perf_counter() - started, 2),
+            error=None if comparison else "Не удалось построить сравнение. Проверьте логи."
+        )
+    except Exception as e:
+        return CompareResponse(
+            success=False,
+            error=str(e)
+        )
+
+
+# === Эндпоинты анализа ===
+
+ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp"]
+
+
+@app.post("/analyze_text", response_model=TextAnalysisResponse)
+async def analyze_text(request: TextAnalysisRequest):
+    """
+    Анализ текста конкурента
+    
+    Принимает текст и возвращает структурированную аналитику:
+    - Сильные стороны
+    - Слабые стороны
+    - Уникальные предложения
+    - Рекомендации по улучшению стратегии
+    """
+    return await run_in_threadpool(run_text_analysis, request.text)
+
+
+@app.post("/analyze_image", response_model=ImageAnalysisResponse)
+async def analyze_image(file: UploadFile = File(...)):
+    """
+    Анализ изображения конкурента
+    
+    Принимает изображение (баннер, сайт, упаковка) и возвращает:
+    - Описание изображения
+    - Маркетинговые инсайты
+    - Оценку визуального стиля
+    - Рекомендации
+    """
+    # Проверяем тип файла
+    if file.content_type not in ALLOWED_IMAGE_TYPES:
+        return ImageAnalysisResponse(
+            success=False,
+            error=f"Неподдерживаемый тип файла. Разрешены: {', '.join(ALLOWED_IMAGE_TYPES)}"
+        )
+    
+    # Загрузка уже выгружена во временный файл (крупнее UPLOAD_SPOOL_SIZE_KB - на диск);
+    # в пул процессов она передаётся путём к копии на диске, а не байтами в памяти
+    return await run_in_threadpool(run_image_analysis, file.file, file.filename)
+
+
+@app.post("/parse_demo", response_model=ParseDemoResponse)
+async def parse_demo(request: ParseDemoRequest):
+    """
+    Парсинг и анализ сайта конкурента (демо)
+    
+    Принимает URL, извлекает:
+    - Title страницы
+    - H1 заголовок
+    - Первый абзац
+    
+    И передаёт их модели для анализа
     """
-    Получить историю последних 10 запросов
+    return await run_in_threadpool(run_parse_demo, request.url)
+
+
+@app.post("/compare", response_model=CompareResponse)
+async def compare(request: CompareRequest):
     """
-    items = history_service.get_history()
-    return HistoryResponse(
+    Сравнение нескольких конкурентов
+    
+    Принимает от 2 до 10 URL и/или текстов, анализирует их параллельно
+    (повторно используя кешированные анализы) и возвращает:
+    - Анализ каждого конкурента
+    - Матрицу сильных/слабых сторон и предложений, выровненную по конкурентам
+    - Относительное позиционирование
+    """
+    return await run_in_threadpool(run_compare, request.urls, request.texts)
+
+
+# === Локальные правила ===
+
+@app.get("/rules", response_model=List[RuleInfo])
+async def list_rules():
+    """Загруженные локальные правила (встроенные и из RULES_FILE)"""
+    return rule_engine.info()
+
+
+def run_rules_evaluate(texts: list, min_score: int) -> RulesEvaluateResponse:
+    """Проверить тексты правилами и отобрать интересные для анализа моделью"""
+    started = time.perf_counter()
+    items = []
+    for text in texts:
+        facts = rule_engine.evaluate(text)
+        items.append(RuleEvaluation(facts=facts, score=len(facts)))
+    return RulesEvaluateResponse(
         items=items,
-        total=len(items)
+        interesting=[index for index, item in enumerate(items) if item.score >= min_score],
+        duration_ms=round((time.perf_counter() - started) * 1000, 3)
     )
 
 
+@app.post("/rules/evaluate", response_model=RulesEvaluateResponse)
+async def evaluate_rules(request: RulesEvaluateRequest):
+    """
+    Факты из текстов локальными правилами, без обращения к модели
+    
+    Находит упоминания нормативов, цены, номера аттестатов, работу с
+    госзаказчиками и т.п. за доли миллисекунды на страницу. interesting -
+    тексты, где сработало не меньше min_score правил: только их имеет
+    смысл отправлять на анализ моделью.
+    """
+    return await run_in_threadpool(run_rules_evaluate, request.texts, request.min_score)
+
+
+# === Фоновые задачи ===
+
+def _job_analyze_text(payload: dict) -> dict:
+    return run_text_analysis(payload["text"]).model_dump(mode="json")
+
+
+def _job_parse_demo(payload: dict) -> dict:
+    return run_parse_demo(payload["url"]).model_dump(mode="json")
+
+
+def _job_parse_many(payload: dict) -> list:
+    # Параллельно, как /compare: загрузка через httpx потокобезопасна, а страницы
+    # через Selenium сервис парсинга сам загружает по одной (_driver_lock)
+    urls = payload["urls"]
+    
+    def parse_one(url: str) -> dict:
+        if job_service.cancel_requested():
+            return ParseDemoResponse(success=False, error="Задача отменена").model_dump(mode="json")
+        return run_parse_demo(url).model_dump(mode="json")
+    
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(len(urls), settings.compare_concurrency)),
+        thread_name_prefix="parse-many"
+    ) as executor:
+        # Контекст задачи (сигнал отмены, этапы Server-Timing) - в каждый поток
+        futures = [executor.submit(contextvars.copy_context().run, parse_one, url) for url in urls]
+        return [future.result() for future in futures]
+
+
+def _job_crawl(payload: dict) -> dict:
+    return run_crawl(
+        payload["url"], payload.get("max_pages"), payload.get("max_depth"),
+        cancelled=job_service.cancel_requested
+    ).model_dump(mode="json")
+
+
+def _job_compare(payload: dict) -> dict:
+    return run_compare(payload.get("urls", []), payload.get("texts", [])).model_dump(mode="json")
+
+
+def _job_monitor_analyze(payload: dict) -> dict:
+    return run_monitor_analysis(payload["url"], payload["version"], payload.get("changed_fields", [])).model_dump(mode="json")
+
+
+def _job_analyze_image(payload: dict) -> dict:
+    path = Path(payload["path"])
+    try:
+        return run_image_analysis(path, payload.get("filename")).model_dump(mode="json")
+    finally:
+        path.unlink(missing_ok=True)
+
+
+job_service.register("analyze_text", _job_analyze_text, TextAnalysisRequest)
+job_service.register("parse_demo", _job_parse_demo, ParseDemoRequest)
+job_service.register("parse_many", _job_parse_many, ParseManyRequest)
+job_service.register("crawl", _job_crawl, CrawlRequest)
+job_service.register("compare", _job_compare, CompareRequest)
+job_service.register("monitor_analyze", _job_monitor_analyze, MonitorAnalyzeRequest)
+job_service.register("analyze_image", _job_analyze_image)
+
+
+def _submit_job(job_type: str, payload: dict, priority: int) -> JobInfo:
+    """Поставить задачу в очередь, переводя ошибки в HTTP ответы"""
+    try:
+        return job_service.submit(job_type, payload, priority)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/jobs", response_model=JobInfo, status_code=202)
+async def submit_job(request: JobSubmitRequest):
+    """
+    Поставить длительную операцию в очередь
+    
+    Сразу возвращает id задачи. Типы: analyze_text ({"text"}),
+    parse_demo ({"url"}), parse_many ({"urls": [...]}),
+    crawl ({"url", "max_pages", "max_depth"}), compare ({"urls", "texts"}).
+    Результат совпадает с ответом соответствующего синхронного эндпоинта.
+    """
+    return await run_in_threadpool(_submit_job, request.type, request.payload, request.priority)
+
+
+@app.post("/crawl", response_model=JobInfo, status_code=202)
+async def crawl_site(request: CrawlRequest, priority: int = Query(5, ge=0, le=9)):
+    """
+    Обход сайта конкурента и сводный анализ
+    
+    Страницы берутся из sitemap.xml и по внутренним ссылкам (в пределах
+    max_pages и max_depth), загружаются параллельно с соблюдением
+    robots.txt, резюмируются и сводятся в один анализ. Обход выполняется
+    фоновой задачей: результат (CrawlResponse) - в GET /jobs/{id}.
+    """
+    return await run_in_threadpool(_submit_job, "crawl", request.model_dump(exclude_none=True), priority)
+
+
+@app.post("/jobs/analyze_image", response_model=JobInfo, status_code=202)
+async def submit_image_job(file: UploadFile = File(...), priority: int = Form(5, ge=0, le=9)):
+    """Поставить анализ изображения в очередь"""
+    if file.content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Неподдерживаемый тип файла. Разрешены: {', '.join(ALLOWED_IMAGE_TYPES)}"
+        )
+    
+    # Изображение сохраняется на диск, чтобы задача пережила перезапуск
+    upload_dir = Path(settings.jobs_upload_dir)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    path = upload_dir / f"{uuid.uuid4().hex}{Path(file.filename or '').suffix.lower()}"
+    
+    def save_upload():
+        with path.open("wb") as f:
+            shutil.copyfileobj(file.file, f)
+    
+    await run_in_threadpool(save_upload)
+    try:
+        return await run_in_threadpool(
+            _submit_job, "analyze_image", {"path": str(path), "filename": file.filename}, priority
+        )
+    except HTTPException:
+        path.unlink(missing_ok=True)
+        raise
+
+
+@app.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str):
+    """Статус и результат фоновой задачи"""
+    job = await run_in_threadpool(job_service.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+@app.delete("/jobs/{job_id}", response_model=JobInfo)
+async def cancel_job(job_id: str):
+    """Отменить фоновую задачу"""
+    job = await run_in_threadpool(job_service.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+@app.websocket("/jobs/{job_id}/ws")
+async def job_updates(websocket: WebSocket, job_id: str):
+    """
+    Push-уведомления об изменении статуса задачи
+    
+    Отправляет текущее состояние и каждое следующее, закрывается после
+    завершения задачи. Если задачу выполняет другой процесс, состояние
+    перечитывается из очереди раз в секунду.
+    """
+    await websocket.accept()
+    queue = job_service.subscribe(job_id)
+    try:
+        last_sent = None
+        while True:
+            try:
+                job = await asyncio.wait_for(queue.get(), timeout=job_service.poll_interval)
+            except asyncio.TimeoutError:
+                job = await run_in_threadpool(job_service.get, job_id)
+            
+            if job is None:
+                await websocket.send_json({"id": job_id, "status": "not_found"})
+                break
+            
+            state = (job.status, job.updated_at)
+            if state != last_sent:
+                await websocket.send_json(job.model_dump(mode="json"))
+                last_sent = state
+            if job.status in FINAL_STATUSES:
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job_service.unsubscribe(job_id, queue)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли ETag с заголовком If-None-Match (слабое сравнение)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+
+# Максимальный размер страницы /history
+HISTORY_PAGE_MAX = 1000
+
+
+@app.get("/history", response_model=HistoryResponse)
+async def get_history(
+    response: Response,
+    since: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_PAGE_MAX),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Получить историю запросов (от новых к старым)
+    
+    - If-None-Match с ETag прошлого ответа: 304 без тела, если история не менялась;
+    - since=<cursor из прошлого ответа>: только записи новее курсора (full=false);
+    - offset/limit: страница истории (total - размер всей истории). Новые
+      записи добавляются в начало, поэтому клиент, который вставляет их
+      по событиям history.added, продолжает загрузку с offset = число
+      записей у него.
+    """
+    if since:
+        offset, limit = 0, None
+    etag = await run_in_threadpool(history_service.current_etag, offset, limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    history, etag = await run_in_threadpool(history_service.get_changes, since, offset, limit)
+    response.headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+    return history
+
+
 @app.delete("/history")
 async def clear_history():
     """
     Очистить историю запросов
     """
-    history_service.clear_history()
+    await run_in_threadpool(history_service.clear_history)
     return {"success": True, "message": "История очищена"}
 
 
+# Интервал keepalive для ленты событий (секунды)
+EVENTS_KEEPALIVE = 15
+
+
+def _event_filter(types: Optional[str]):
+    """Фильтр событий по префиксам типов: types=history,job"""
+    prefixes = tuple(t.strip() for t in (types or "").split(",") if t.strip())
+    return lambda event: not prefixes or event["type"].startswith(prefixes)
+
+
+async def _event_stream(since: Optional[int], types: Optional[str]):
+    """
+    Поток событий для подписчика
+
+    Сначала подписка, затем досылка пропущенного из базы - события между
+    ними не теряются, а повторы отбрасываются по номеру. Первым идёт
+    событие ready с номером последнего события: после него клиент может
+    перечитать состояние, не боясь пропустить изменения.
+    Отдаёт None, если за EVENTS_KEEPALIVE событий не было.
+    """
+    accept = _event_filter(types)
+    queue = event_service.subscribe()
+    try:
+        last_id = await run_in_threadpool(event_service.last_id)
+        if since is not None:
+            for event in await run_in_threadpool(event_service.replay, since):
+                if accept(event):
+                    yield event
+            last_id = max(last_id, since)
+        yield {"id": last_id, "type": "ready", "data": {}, "ts": None}
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is None:
+                # Подписка закрыта: клиент переподключится с since
+                return
+            if event["id"] <= last_id:
+                continue
+            last_id = event["id"]
+            if accept(event):
+                yield event
+    finally:
+        event_service.unsubscribe(queue)
+
+
+@app.websocket("/ws/events")
+async def events_ws(websocket: WebSocket, since: Optional[int] = None, types: Optional[str] = None):
+    """
+    Лента событий: новые записи истории и изменения задач
+
+    Сообщения: {"id", "type", "data", "ts"}. Типы: ready, history.added,
+    history.cleared, job.updated, ping. При переподключении передайте
+    since=<id последнего полученного события>.
+    """
+    await websocket.accept()
+    try:
+        async for event in _event_stream(since, types):
+            await websocket.send_json(event if event is not None else {"type": "ping"})
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+
+
+@app.get("/events")
+async def events_sse(
+    request: Request,
+    since: Optional[int] = None,
+    types: Optional[str] = None,
+    last_event_id: Optional[int] = Header(None)
+):
+    """
+    Лента событий через Server-Sent Events (для клиентов без WebSocket)
+
+    Те же события, что и /ws/events. EventSource сам переподключается
+    и передаёт Last-Event-ID.
+    """
+    async def stream():
+        async for event in _event_stream(last_event_id if last_event_id is not None else since, types):
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            data = json.dumps(event, ensure_ascii=False, default=str)
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/monitor", response_model=MonitorStatus)
+async def monitor_status():
+    """Расписание плановых проверок COMPETITOR_URLS и их последние результаты"""
+    return await run_in_threadpool(monitor_service.status)
+
+
+@app.get("/competitors/{url:path}/timeline", response_model=TimelineResponse)
+async def get_competitor_timeline(
+    url: str,
+    limit: int = Query(100, ge=1, le=10000),
+    changes_only: bool = False,
+    details: bool = False,
+    version: Optional[int] = Query(None, ge=1)
+):
+    """
+    Хронология изменений сайта конкурента
+    
+    Каждая проверка через /parse_demo добавляет версию. Параметры:
+    - changes_only: только проверки, в которых что-то изменилось
+    - details: старые и новые значения изменённых полей
+    - version: восстановить снимок страницы на эту версию
+    """
+    normalized_url = timeline_service.normalize_url(url)
+    # Чтение файла хронологии и восстановление версий - в пуле потоков, не в event loop
+    items, total = await run_in_threadpool(
+        timeline_service.get_timeline,
+        normalized_url,
+        limit=limit,
+        changes_only=changes_only,
+        details=details
+    )
+    
+    snapshot = None
+    if version is not None:
+        snapshot = await run_in_threadpool(timeline_service.get_snapshot, normalized_url, version)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail=f"Версия {version} не найдена")
+    
+    return TimelineResponse(
+        success=True,
+        url=normalized_url,
+        total=total,
+        items=items,
+        snapshot=snapshot
+    )
+
+
+@app.get("/capabilities", response_model=CapabilitiesResponse)
+async def capabilities(response: Response):
+    """
+    Возможности и ограничения сервера
+    
+    Клиенты уменьшают и перекодируют изображения до max_dimension и
+    jpeg_quality перед загрузкой: больше сервер всё равно не использует.
+    """
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return CapabilitiesResponse(
+        version="1.0.0",
+        image=ImageLimits(
+            max_dimension=settings.image_max_dimension,
+            max_pixels=settings.image_max_pixels,
+            jpeg_quality=settings.image_jpeg_quality,
+            max_upload_size_mb=settings.max_upload_size_mb,
+            allowed_types=ALLOWED_IMAGE_TYPES
+        )
+    )
+
+
 @app.get("/health")
 async def health_check():
     """Проверка работоспособности сервиса"""
+    breakers = circuit_breakers.snapshot()
     return {
-        "status": "healthy",
+        # degraded: OpenAI недоступен, анализы сразу возвращают ошибку с причиной
+        "status": "degraded" if breakers["openai"]["state"] == OPEN else "healthy",
         "service": "Competitor Monitor",
         "version": "1.0.0",
-        "openai_configured": openai_service is not None
+        "openai_configured": openai_service is not None,
+        "admission": admission_controller.snapshot(),
+        "circuit_breakers": breakers,
+        "cpu_pool": cpu_pool.snapshot()
+    }
+
+
+def _admission_gauge(field: str):
+    """Значения ограничителей admission control для gauge по классам"""
+    return lambda: {
+        (name,): limiter_state[field]
+        for name, limiter_state in admission_controller.snapshot().items()
+    }
+
+
+metrics.callback_gauge(
+    "admission_in_flight", "Запросы в обработке по классам эндпоинтов", ("endpoint_class",),
+    _admission_gauge("in_flight")
+)
+metrics.callback_gauge(
+    "admission_queued", "Запросы в очереди admission control", ("endpoint_class",),
+    _admission_gauge("queued")
+)
+metrics.callback_gauge(
+    "admission_rejected", "Отклонённые запросы (503) с момента запуска", ("endpoint_class",),
+    _admission_gauge("rejected_total")
+)
+metrics.callback_gauge(
+    "circuit_breaker_open", "Разомкнутые circuit breaker (1 - открыт, 0.5 - пробные вызовы)", ("dependency",),
+    lambda: {
+        (name,): {"open": 1.0, "half_open": 0.5}.get(breaker.state, 0.0)
+        for name, breaker in circuit_breakers.all().items()
     }
+)
+metrics.callback_gauge(
+    "cpu_pool_in_flight", "Задачи в пуле процессов (разбор HTML, изображения)", (),
+    lambda: {(): float(cpu_pool.in_flight)}
+)
+metrics.callback_gauge(
+    "jobs", "Фоновые задачи по статусам", ("status",),
+    lambda: {(status,): count for status, count in job_service.status_counts().items()}
+)
+metrics.callback_gauge(
+    "event_subscribers", "Подключённые клиенты ленты событий", (),
+    lambda: {(): event_service.subscriber_count}
+)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """
+    Метрики в формате Prometheus
+
+    Значения относятся к процессу, обработавшему запрос: при нескольких
+    воркерах каждый процесс ведёт свои метрики.
+    """
+    content = await run_in_threadpool(metrics.render)
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
+
+
+def _require_admin(token: Optional[str]):
+    """Проверить токен администратора (403 если неверный или не задан)"""
+    if not profiling_service.is_authorized(token):
+        raise HTTPException(status_code=403, detail="Доступно только администратору")
+
+
+@app.get("/profiles", include_in_schema=False)
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """Список сохранённых профилей запросов (новые первыми)"""
+    _require_admin(x_admin_token)
+    return {"success": True, "items": await run_in_threadpool(profiling_service.list_profiles)}
+
+
+@app.get("/profiles/{profile_id}", include_in_schema=False)
+async def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Отчёт профилировщика по id из заголовка X-Profile-Id"""
+    _require_admin(x_admin_token)
+    report = await run_in_threadpool(profiling_service.load, profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return PlainTextResponse(report)
 
 
 # Статические файлы для фронтенда
 web_dir = Path("web")
 if web_dir.exists():
     app.mount("/static", StaticFiles(directory="web"), name="static")
+if web_dist_dir.exists():
+    app.mount("/assets", web_assets, name="assets")
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "backend.main:app",
         host=settings.api_host,
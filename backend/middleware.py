@@ -0,0 +1,389 @@
+"""
+ASGI middleware приложения
+"""
+import gzip
+import json
+import time
+import zlib
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from backend.services.admission_service import AdmissionController, OverloadedError
+from backend.services.metrics_service import HTTP_DURATION, HTTP_IN_FLIGHT, HTTP_REQUESTS, collect_stages, stage
+from backend.services.profiling_service import ProfilingService
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+async def _send_json(send, status: int, payload: dict, headers: List[Tuple[bytes, bytes]] = ()):
+    """Отправить JSON ответ напрямую из middleware"""
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class BodySizeLimitMiddleware:
+    """
+    Ограничение размера тела запроса
+
+    Запрос с Content-Length больше предела отклоняется сразу (413), до
+    чтения тела. Если длина не указана (chunked), тело считается по мере
+    чтения и чтение прерывается 413, как только предел превышен, - в
+    памяти и на диске никогда не оказывается больше max_body_size байт.
+    """
+
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    def _too_large_message(self) -> str:
+        return f"Размер запроса превышает {self.max_body_size // (1024 * 1024)} МБ"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_body_size <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope.get("headers", [])).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_size:
+            message = self._too_large_message()
+            await _send_json(send, 413, {"success": False, "error": message, "detail": message})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # Исключение поднимается в месте чтения тела (разбор формы)
+                    # и превращается в ответ 413 обработчиком HTTPException
+                    raise HTTPException(status_code=413, detail=self._too_large_message())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class AdmissionMiddleware:
+    """
+    Контроль нагрузки на тяжёлые эндпоинты
+
+    При перегрузке отвечает 503 с заголовком Retry-After, не дожидаясь
+    освобождения ресурсов.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.controller.classify(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            with stage("admission_wait"):
+                await limiter.acquire()
+        except OverloadedError as e:
+            await self._send_overloaded(send, e)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started)
+
+    @staticmethod
+    async def _send_overloaded(send, error: OverloadedError):
+        """Ответ 503 в формате ответов API (success/error) с Retry-After"""
+        await _send_json(
+            send,
+            503,
+            {"success": False, "error": error.reason, "detail": error.reason, "retry_after": error.retry_after},
+            [(b"retry-after", str(error.retry_after).encode())]
+        )
+
+
+class MetricsMiddleware:
+    """
+    Метрики HTTP запросов: количество, длительность, запросы в обработке
+
+    Метка handler - имя функции эндпоинта (известно после маршрутизации),
+    а не путь: пути с параметрами не раздувают число временных рядов.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _handler_name(scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        return getattr(endpoint, "__name__", type(endpoint).__name__)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.labels().inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.labels().dec()
+            handler = self._handler_name(scope)
+            method = scope["method"]
+            HTTP_DURATION.labels(method, handler).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, handler, str(status_code)).inc()
+
+
+class ServerTimingMiddleware:
+    """
+    Заголовок Server-Timing с разбивкой запроса по этапам
+
+    Этапы (fetch, parse, llm, image_encode, history_*, ...) собираются
+    через metrics_service.stage в контексте запроса; total - полное
+    время до начала ответа. По запросу администратора (X-Profile +
+    X-Admin-Token) запрос дополнительно профилируется, id отчёта
+    возвращается в заголовке X-Profile-Id.
+    """
+
+    def __init__(self, app, profiler: ProfilingService):
+        self.app = app
+        self.profiler = profiler
+
+    @staticmethod
+    def _format(stages: List[Tuple[str, float]], total: float) -> str:
+        """Значение заголовка: одноимённые этапы суммируются"""
+        durations: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        for name, duration in stages:
+            durations[name] = durations.get(name, 0.0) + duration
+            counts[name] = counts.get(name, 0) + 1
+        parts = []
+        for name, duration in durations.items():
+            part = f"{name};dur={duration * 1000:.1f}"
+            if counts[name] > 1:
+                part += f';desc="x{counts[name]}"'
+            parts.append(part)
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profiling = self.profiler.is_requested(scope)
+        if profiling:
+            token = dict(scope.get("headers", [])).get(b"x-admin-token", b"").decode("latin-1")
+            if not self.profiler.is_authorized(token):
+                await _send_json(send, 403, {
+                    "success": False,
+                    "error": "Профилирование доступно только администратору",
+                    "detail": "Профилирование доступно только администратору",
+                })
+                return
+
+        started = time.perf_counter()
+        with collect_stages() as stages, (self.profiler.capture() if profiling else nullcontext()) as profile:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    server_timing = self._format(stages, time.perf_counter() - started)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing.encode("latin-1")))
+                    if profile is not None:
+                        # Запись отчёта и очистка старых - файловый ввод-вывод, не в event loop
+                        profile_id = await run_in_threadpool(
+                            self.profiler.save, profile, scope["method"], scope["path"], server_timing
+                        )
+                        if profile_id:
+                            headers.append((b"x-profile-id", profile_id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+def parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    """
+    Разобрать Accept-Encoding: {кодировка: q}
+
+    Кодировки br и gzip, не указанные явно, получают q из "*".
+    """
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    wildcard = accepted.get("*", 0.0)
+    for encoding in ("br", "gzip"):
+        accepted.setdefault(encoding, wildcard)
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов brotli / gzip по Accept-Encoding
+
+    Сжимаются текстовые ответы (JSON, HTML, JS, CSS, SVG) от minimum_size
+    байт. Потоковые ответы (статика, StreamingResponse) сжимаются по
+    частям. Не сжимаются text/event-stream (сжатие задерживает события),
+    ответы с уже заданным Content-Encoding (предсжатые файлы) и HEAD.
+    Brotli используется, если установлен пакет brotli.
+    """
+
+    COMPRESSIBLE_TYPES = (
+        "text/", "application/json", "application/javascript", "application/xml", "image/svg+xml",
+    )
+    UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+    # Большие тела сжимаются в пуле потоков, чтобы не занимать event loop
+    THREADPOOL_THRESHOLD = 256 * 1024
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @staticmethod
+    def _negotiate(accept_encoding: str) -> Optional[str]:
+        """Выбрать кодировку по Accept-Encoding (br предпочтительнее gzip)"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in (("br", "gzip") if BROTLI_AVAILABLE else ("gzip",)):
+            if accepted.get(encoding, 0) > 0:
+                return encoding
+        return None
+
+    def _is_compressible(self, headers: Headers) -> bool:
+        content_type = headers.get("content-type", "").lower()
+        return (
+            content_type.startswith(self.COMPRESSIBLE_TYPES)
+            and not content_type.startswith(self.UNCOMPRESSIBLE_TYPES)
+        )
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        """Сжать тело ответа целиком"""
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def _stream_compressor(self, encoding: str):
+        """Потоковый компрессор: (сжать часть, завершить поток)"""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        passthrough = False
+        compress_chunk = finish_stream = None
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough, compress_chunk, finish_stream
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start_message is not None:
+                # Первая часть тела: решаем, сжимать ли ответ
+                headers = MutableHeaders(raw=list(start_message.get("headers", [])))
+                compressible = self._is_compressible(headers) and start_message["status"] not in (204, 206, 304)
+                if compressible and "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                if (
+                    not compressible
+                    or encoding is None
+                    or "content-encoding" in headers
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send({**start_message, "headers": headers.raw})
+                    start_message = None
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+                if "content-length" in headers:
+                    del headers["content-length"]
+                if not more_body:
+                    with stage("compress"):
+                        if len(body) > self.THREADPOOL_THRESHOLD:
+                            body = await run_in_threadpool(self._compress, encoding, body)
+                        else:
+                            body = self._compress(encoding, body)
+                    headers["Content-Length"] = str(len(body))
+                    await send({**start_message, "headers": headers.raw})
+                    start_message = None
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                compress_chunk, finish_stream = self._stream_compressor(encoding)
+                await send({**start_message, "headers": headers.raw})
+                start_message = None
+
+            data = compress_chunk(body)
+            if not more_body:
+                data += finish_stream()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
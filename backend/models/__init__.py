@@ -4,6 +4,7 @@
 from .schemas import (
     TextAnalysisRequest,
     ParseDemoRequest,
+    ParseManyRequest,
     CompetitorAnalysis,
     ImageAnalysis,
     ParsedContent,
@@ -12,11 +13,18 @@ from .schemas import (
     ParseDemoResponse,
     HistoryItem,
     HistoryResponse,
+    FieldChange,
+    TimelineEntry,
+    CompetitorSnapshot,
+    TimelineResponse,
+    JobSubmitRequest,
+    JobInfo,
 )
 
 __all__ = [
     "TextAnalysisRequest",
     "ParseDemoRequest",
+    "ParseManyRequest",
     "CompetitorAnalysis",
     "ImageAnalysis",
     "ParsedContent",
@@ -25,5 +33,11 @@ __all__ = [
     "ParseDemoResponse",
     "HistoryItem",
     "HistoryResponse",
+    "FieldChange",
+    "TimelineEntry",
+    "CompetitorSnapshot",
+    "TimelineResponse",
+    "JobSubmitRequest",
+    "JobInfo",
 ]
 
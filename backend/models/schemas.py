@@ -2,8 +2,8 @@
 Pydantic схемы для API
 """
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional, List
+from pydantic import BaseModel, Field, model_validator
 
 
 # === Запросы ===
@@ -18,8 +18,46 @@ class ParseDemoRequest(BaseModel):
     url: str = Field(..., description="URL для парсинга")
 
 
+class ParseManyRequest(BaseModel):
+    """Запрос на парсинг нескольких URL"""
+    urls: List[str] = Field(..., min_length=1, max_length=50, description="Список URL для парсинга")
+
+
+class CrawlRequest(BaseModel):
+    """Запрос на обход сайта"""
+    url: str = Field(..., description="Корневой URL сайта")
+    max_pages: Optional[int] = Field(None, ge=1, le=200, description="Максимум страниц (по умолчанию CRAWL_MAX_PAGES)")
+    max_depth: Optional[int] = Field(None, ge=0, le=5, description="Глубина переходов по ссылкам (по умолчанию CRAWL_MAX_DEPTH)")
+
+
+class CompareRequest(BaseModel):
+    """Запрос на сравнение конкурентов (сайты и/или тексты)"""
+    urls: List[str] = Field(default_factory=list, max_length=10, description="URL сайтов конкурентов")
+    texts: List[str] = Field(default_factory=list, max_length=10, description="Тексты конкурентов")
+
+    @model_validator(mode="after")
+    def check_count(self):
+        total = len(self.urls) + len(self.texts)
+        if not 2 <= total <= 10:
+            raise ValueError("Для сравнения нужно от 2 до 10 конкурентов (urls и texts вместе)")
+        return self
+
+
+class RulesEvaluateRequest(BaseModel):
+    """Запрос на проверку текстов локальными правилами"""
+    texts: List[str] = Field(..., min_length=1, max_length=1000, description="Тексты (страницы, реклама)")
+    min_score: int = Field(1, ge=0, description="Сколько правил должно сработать, чтобы текст считался интересным")
+
+
 # === Ответы ===
 
+class RuleFact(BaseModel):
+    """Факт, найденный локальным правилом (без LLM)"""
+    rule: str
+    label: str
+    count: int  # Число совпадений
+    matches: List[str] = Field(default_factory=list)  # Примеры совпадений
+
 class CompetitorAnalysis(BaseModel):
     """Структурированный анализ конкурента"""
     strengths: List[str] = Field(default_factory=list, description="Сильные стороны")
@@ -47,6 +85,7 @@ class ParsedContent(BaseModel):
     h1: Optional[str] = None
     first_paragraph: Optional[str] = None
     analysis: Optional[CompetitorAnalysis] = None
+    facts: List[RuleFact] = Field(default_factory=list)
     error: Optional[str] = None
 
 
@@ -54,6 +93,7 @@ class TextAnalysisResponse(BaseModel):
     """Ответ на анализ текста"""
     success: bool
     analysis: Optional[CompetitorAnalysis] = None
+    facts: List[RuleFact] = Field(default_factory=list)
     error: Optional[str] = None
 
 
@@ -71,13 +111,92 @@ class ParseDemoResponse(BaseModel):
     error: Optional[str] = None
 
 
+class CrawledPage(BaseModel):
+    """Страница, загруженная при обходе сайта"""
+    url: str
+    depth: int
+    title: Optional[str] = None
+    h1: Optional[str] = None
+    description: Optional[str] = None
+    headings: List[str] = Field(default_factory=list)
+    summary: Optional[str] = None  # Резюме страницы моделью
+    facts: List[RuleFact] = Field(default_factory=list)
+    error: Optional[str] = None
+
+
+class CrawlResponse(BaseModel):
+    """Ответ на обход сайта: страницы и сводный анализ"""
+    success: bool
+    url: Optional[str] = None
+    pages: List[CrawledPage] = Field(default_factory=list)
+    pages_found: int = 0  # Найдено внутренних страниц (обходится не больше max_pages)
+    from_sitemap: int = 0  # Сколько страниц взято из sitemap.xml
+    analysis: Optional[CompetitorAnalysis] = None
+    duration_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class ComparedCompetitor(BaseModel):
+    """Конкурент в сравнении: исходные данные и его собственный анализ"""
+    name: str  # Хост сайта или "Текст N"
+    url: Optional[str] = None
+    title: Optional[str] = None
+    analysis: Optional[CompetitorAnalysis] = None
+    facts: List[RuleFact] = Field(default_factory=list)
+    error: Optional[str] = None
+
+
+class ComparisonRow(BaseModel):
+    """Строка матрицы сравнения: один аспект у всех конкурентов"""
+    aspect: str
+    kind: str = "strength"  # "strength", "weakness" или "offer"
+    cells: List[str] = Field(default_factory=list)  # По порядку competitors; "" - не упоминается
+
+
+class CompetitorComparison(BaseModel):
+    """Сравнительная матрица конкурентов"""
+    matrix: List[ComparisonRow] = Field(default_factory=list)
+    positioning: List[str] = Field(default_factory=list)  # Позиция на рынке, по порядку competitors
+    summary: str = Field("", description="Относительное позиционирование и выводы")
+
+
+class CompareResponse(BaseModel):
+    """Ответ на сравнение конкурентов"""
+    success: bool
+    competitors: List[ComparedCompetitor] = Field(default_factory=list)
+    comparison: Optional[CompetitorComparison] = None
+    duration_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class RuleInfo(BaseModel):
+    """Локальное правило"""
+    id: str
+    label: str
+    keywords: List[str] = Field(default_factory=list)
+    patterns: List[str] = Field(default_factory=list)
+
+
+class RuleEvaluation(BaseModel):
+    """Результат правил для одного текста"""
+    facts: List[RuleFact] = Field(default_factory=list)
+    score: int = 0  # Число сработавших правил
+
+
+class RulesEvaluateResponse(BaseModel):
+    """Ответ на проверку текстов локальными правилами"""
+    items: List[RuleEvaluation] = Field(default_factory=list)  # По порядку texts
+    interesting: List[int] = Field(default_factory=list)  # Индексы текстов с score >= min_score
+    duration_ms: float = 0
+
+
 # === История ===
 
 class HistoryItem(BaseModel):
     """Элемент истории"""
     id: str
     timestamp: datetime
-    request_type: str  # "text", "image", "parse"
+    request_type: str  # "text", "image", "parse", "crawl", "compare"
     request_summary: str
     response_summary: str
 
@@ -86,4 +205,116 @@ class HistoryResponse(BaseModel):
     """Ответ со списком истории"""
     items: List[HistoryItem]
     total: int
+    # id самой новой записи: передаётся в since при следующем запросе
+    cursor: Optional[str] = None
+    # False - в items только записи новее since, их добавляют в начало списка
+    full: bool = True
+    # Позиция первой записи items в истории (для постраничной загрузки)
+    offset: int = 0
+
+
+
+# === Хронология изменений конкурентов ===
+
+class FieldChange(BaseModel):
+    """Изменение одного поля между соседними снимками"""
+    field: str
+    old: Optional[str] = None
+    new: Optional[str] = None
+
+
+class TimelineEntry(BaseModel):
+    """Запись хронологии: одна проверка страницы"""
+    version: int
+    timestamp: datetime
+    keyframe: bool = False
+    changed_fields: List[str] = Field(default_factory=list)
+    changes: Optional[List[FieldChange]] = None
+
+
+class CompetitorSnapshot(BaseModel):
+    """Восстановленный снимок страницы на момент проверки"""
+    version: int
+    timestamp: datetime
+    title: Optional[str] = None
+    h1: Optional[str] = None
+    first_paragraph: Optional[str] = None
+
+
+class TimelineResponse(BaseModel):
+    """Ответ с хронологией изменений по URL"""
+    success: bool
+    url: str
+    # Все записи хронологии (с учётом changes_only), items - не больше limit из них
+    total: int = 0
+    items: List[TimelineEntry] = Field(default_factory=list)
+    snapshot: Optional[CompetitorSnapshot] = None
+    error: Optional[str] = None
+
+
+# === Мониторинг конкурентов ===
+
+class MonitorAnalyzeRequest(BaseModel):
+    """Задача анализа изменившейся страницы (ставит планировщик мониторинга)"""
+    url: str
+    version: int = Field(..., ge=1, description="Версия страницы в хронологии")
+    changed_fields: List[str] = Field(default_factory=list)
+
+
+class MonitorTarget(BaseModel):
+    """Состояние плановой проверки одного URL конкурента"""
+    url: str
+    interval_minutes: float
+    next_run: Optional[datetime] = None
+    last_run: Optional[datetime] = None
+    last_status: Optional[str] = None  # "changed", "unchanged", "error"
+    last_error: Optional[str] = None
+    version: Optional[int] = None  # Последняя версия в хронологии
+    changed_fields: List[str] = Field(default_factory=list)
+    checks: int = 0
+
+
+class MonitorStatus(BaseModel):
+    """Состояние планировщика мониторинга"""
+    enabled: bool
+    leader: Optional[str] = None  # Процесс, который сейчас выполняет проверки
+    targets: List[MonitorTarget] = Field(default_factory=list)
+
+
+# === Фоновые задачи ===
+
+class JobSubmitRequest(BaseModel):
+    """Запрос на постановку задачи в очередь"""
+    type: str = Field(..., description="Тип задачи: analyze_text, parse_demo, parse_many, crawl, compare, monitor_analyze")
+    payload: Dict[str, Any] = Field(default_factory=dict, description="Параметры задачи")
+    priority: int = Field(5, ge=0, le=9, description="Приоритет (0 - наивысший)")
+
+
+class JobInfo(BaseModel):
+    """Состояние фоновой задачи"""
+    id: str
+    type: str
+    status: str  # "queued", "running", "done", "failed", "cancelled"
+    priority: int
+    attempts: int = 0
+    created_at: datetime
+    updated_at: datetime
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+
+# === Возможности сервера ===
+
+class ImageLimits(BaseModel):
+    """Ограничения изображений: клиенты уменьшают изображение до отправки"""
+    max_dimension: int  # Максимальная сторона в пикселях (больше сервер всё равно уменьшит)
+    max_pixels: int
+    jpeg_quality: int  # Качество JPEG, с которым изображение уходит в OpenAI
+    max_upload_size_mb: int
+    allowed_types: List[str]
+
 
+class CapabilitiesResponse(BaseModel):
+    """Параметры сервера, которые нужны клиентам"""
+    version: str
+    image: ImageLimits
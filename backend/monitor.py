@@ -0,0 +1,75 @@
+"""
+Плановый мониторинг конкурентов отдельным процессом
+
+    python -m backend.monitor            - проверки по расписанию и воркеры задач анализа
+    python -m backend.monitor --no-jobs  - только проверки; анализ выполняют воркеры сервера
+    python -m backend.monitor --once     - выполнить наступившие проверки и выйти (cron)
+
+Проверки выполняет один процесс (аренда в shared_state), поэтому
+планировщик можно запускать рядом с сервером: пока он держит аренду,
+планировщики воркеров сервера простаивают. Чтобы сервер не проверял
+сайты сам, задайте ему MONITOR_ENABLED=false.
+"""
+import argparse
+import asyncio
+import signal
+import sys
+
+# Обработчики фоновых задач (monitor_analyze и др.) регистрируются в backend.main
+from backend.main import init_services
+from backend.services.cpu_service import cpu_pool
+from backend.services.job_service import job_service
+from backend.services.monitor_service import LEASE_NAME, monitor_service
+from backend.services.shared_state import shared_state
+
+
+async def run(with_jobs: bool):
+    """Планировщик (и воркеры задач) до остановки процесса"""
+    await asyncio.to_thread(init_services)
+    if with_jobs:
+        await job_service.start()
+    await monitor_service.start(force=True)
+    stopped = asyncio.Event()
+    try:
+        # SIGTERM (systemd, docker stop): остановиться штатно и освободить аренду
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except (NotImplementedError, AttributeError):
+        pass
+    try:
+        await stopped.wait()
+    finally:
+        await monitor_service.stop()
+        if with_jobs:
+            await job_service.stop()
+        cpu_pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Плановый мониторинг сайтов конкурентов (COMPETITOR_URLS)")
+    parser.add_argument("--no-jobs", action="store_true", help="не запускать воркеры задач анализа")
+    parser.add_argument("--once", action="store_true", help="выполнить наступившие проверки и выйти")
+    args = parser.parse_args()
+
+    if not monitor_service.targets:
+        print("COMPETITOR_URLS не задан: проверять нечего")
+        sys.exit(1)
+
+    if args.once:
+        init_services()
+        try:
+            checked = monitor_service.run_due()
+        finally:
+            shared_state.release_lease(LEASE_NAME, monitor_service.owner)
+            cpu_pool.close()
+        print(f"Проверено страниц: {checked}")
+        return
+
+    print(f"Мониторинг {len(monitor_service.targets)} URL, процесс {monitor_service.owner}")
+    try:
+        asyncio.run(run(with_jobs=not args.no_jobs))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
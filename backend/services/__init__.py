@@ -3,14 +3,43 @@
 """
 from .openai_service import OpenAIService, openai_service
 from .parser_service import ParserService, parser_service
+from .crawler_service import CrawlerService, crawler_service
+from .rule_service import RuleEngine, rule_engine
+from .circuit_service import CircuitBreakerRegistry, CircuitOpenError, circuit_breakers
+from .cpu_service import CpuPool, CpuPoolError, cpu_pool
 from .history_service import HistoryService, history_service
+from .timeline_service import TimelineService, timeline_service
+from .job_service import JobService, job_service
+from .monitor_service import MonitorService, monitor_service
+from .event_service import EventService, event_service
+from .metrics_service import MetricsRegistry, metrics
 
 __all__ = [
     "OpenAIService",
     "openai_service",
     "ParserService",
     "parser_service",
+    "CrawlerService",
+    "crawler_service",
+    "RuleEngine",
+    "rule_engine",
+    "CircuitBreakerRegistry",
+    "CircuitOpenError",
+    "circuit_breakers",
+    "CpuPool",
+    "CpuPoolError",
+    "cpu_pool",
     "HistoryService",
     "history_service",
+    "TimelineService",
+    "timeline_service",
+    "JobService",
+    "job_service",
+    "MonitorService",
+    "monitor_service",
+    "EventService",
+    "event_service",
+    "MetricsRegistry",
+    "metrics",
 ]
 
@@ -0,0 +1,179 @@
+"""
+Контроль нагрузки (admission control)
+
+Тяжёлые эндпоинты разбиты на классы (llm, parse). Для каждого класса
+ограничено число одновременно выполняемых запросов и длина очереди
+ожидающих. Задержка в очереди отслеживается по схеме CoDel: если
+запросы дольше interval ждут больше target, сервер перегружен и новые
+запросы сразу получают 503 с Retry-After вместо бесконечного ожидания.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from backend.config import settings
+
+
+class OverloadedError(Exception):
+    """Сервер перегружен: запрос отклонён"""
+
+    def __init__(self, endpoint_class: str, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.endpoint_class = endpoint_class
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class EndpointClassLimiter:
+    """Ограничитель одного класса эндпоинтов"""
+
+    def __init__(self, name: str, concurrency: int, queue_limit: int, target: float, interval: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue_limit = max(0, queue_limit)
+        self.target = target
+        self.interval = interval
+
+        self.in_flight = 0
+        self.rejected = 0
+        self._waiters: Deque[Tuple[asyncio.Future, float]] = deque()
+        # Состояние CoDel
+        self._first_above_time = 0.0
+        self._dropping = False
+        # Сглаженное время обработки запроса (для оценки Retry-After)
+        self._service_time = 1.0
+
+    @property
+    def queued(self) -> int:
+        """Число запросов в очереди"""
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Оценка времени, через которое стоит повторить запрос (секунды)"""
+        drain_time = (self.queued + 1) * self._service_time / self.concurrency
+        return min(60, max(1, math.ceil(drain_time)))
+
+    def _reject(self, reason: str) -> OverloadedError:
+        self.rejected += 1
+        return OverloadedError(self.name, self.retry_after(), reason)
+
+    def _should_drop(self, sojourn: float, now: float) -> bool:
+        """CoDel: решает, отклонить ли запрос, простоявший в очереди sojourn секунд"""
+        if sojourn < self.target:
+            self._first_above_time = 0.0
+            self._dropping = False
+            return False
+        if self._first_above_time == 0.0:
+            self._first_above_time = now + self.interval
+            return False
+        if now >= self._first_above_time:
+            self._dropping = True
+            return True
+        return False
+
+    async def acquire(self):
+        """
+        Занять слот выполнения
+
+        Raises:
+            OverloadedError: Очередь заполнена или задержка в ней слишком велика
+        """
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            self._dropping = False
+            self._first_above_time = 0.0
+            return
+
+        if self._dropping:
+            raise self._reject("Сервер перегружен: задержка в очереди превышает допустимую")
+        if len(self._waiters) >= self.queue_limit:
+            raise self._reject("Сервер перегружен: очередь запросов заполнена")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, time.monotonic())
+        self._waiters.append(entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Клиент ушёл: освобождаем место в очереди или уже выданный слот
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+            elif future.done() and not future.cancelled() and future.exception() is None:
+                self.release(0.0)
+            raise
+
+    def release(self, service_time: float):
+        """Освободить слот и передать его следующему запросу из очереди"""
+        if service_time > 0:
+            self._service_time = 0.8 * self._service_time + 0.2 * service_time
+        self.in_flight = max(0, self.in_flight - 1)
+
+        now = time.monotonic()
+        while self._waiters and self.in_flight < self.concurrency:
+            future, enqueued_at = self._waiters.popleft()
+            if future.done():
+                continue
+            if self._should_drop(now - enqueued_at, now):
+                future.set_exception(self._reject("Сервер перегружен: запрос слишком долго ждал в очереди"))
+                continue
+            self.in_flight += 1
+            future.set_result(True)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Текущее состояние ограничителя"""
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "concurrency": self.concurrency,
+            "queue_limit": self.queue_limit,
+            "overloaded": self._dropping,
+            "rejected_total": self.rejected,
+            "avg_service_time": round(self._service_time, 3),
+        }
+
+
+class AdmissionController:
+    """Распределение запросов по классам эндпоинтов и их ограничение"""
+
+    # Эндпоинты под контролем нагрузки: путь -> класс. Постановка задач
+    # (/crawl, /jobs) сама по себе лёгкая, но каждая задача - это обращения
+    # к модели: при перегрузке новые задачи не принимаются
+    ENDPOINT_CLASSES = {
+        "/analyze_text": "llm",
+        "/analyze_image": "llm",
+        "/compare": "llm",
+        "/crawl": "llm",
+        "/jobs": "llm",
+        "/jobs/analyze_image": "llm",
+        "/parse_demo": "parse",
+    }
+
+    def __init__(self):
+        self.enabled = settings.admission_enabled
+        target = settings.admission_target_delay_ms / 1000
+        interval = settings.admission_interval_ms / 1000
+        self.limiters: Dict[str, EndpointClassLimiter] = {
+            "llm": EndpointClassLimiter(
+                "llm", settings.admission_llm_concurrency, settings.admission_llm_queue, target, interval
+            ),
+            "parse": EndpointClassLimiter(
+                "parse", settings.admission_parse_concurrency, settings.admission_parse_queue, target, interval
+            ),
+        }
+
+    def classify(self, method: str, path: str) -> Optional[EndpointClassLimiter]:
+        """Найти ограничитель для запроса (None - запрос не ограничивается)"""
+        if not self.enabled or method != "POST":
+            return None
+        endpoint_class = self.ENDPOINT_CLASSES.get(path.rstrip("/"))
+        return self.limiters.get(endpoint_class) if endpoint_class else None
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Состояние всех классов"""
+        return {name: limiter.snapshot() for name, limiter in self.limiters.items()}
+
+
+# Глобальный экземпляр
+admission_controller = AdmissionController()
@@ -0,0 +1,236 @@
+"""
+Circuit breaker для внешних зависимостей
+
+Если OpenAI деградирует или сайт конкурента зависает, каждый запрос
+ждал бы полный таймаут, а воркеры копились бы в ожидании. Автомат
+(отдельный для OpenAI и для каждого хоста конкурентов) отслеживает
+последние вызовы зависимости:
+- closed: вызовы проходят; если доля ошибок или медленных ответов
+  среди последних CIRCUIT_WINDOW вызовов превышает порог, автомат
+  размыкается;
+- open: вызовы сразу отклоняются (CircuitOpenError с причиной) в
+  течение CIRCUIT_OPEN_SECONDS - миллисекунды вместо таймаута;
+- half-open: пропускается несколько пробных вызовов; успех замыкает
+  автомат, ошибка снова размыкает.
+
+Состояние хранится в памяти процесса: каждый процесс сервера узнаёт о
+сбое сам, за несколько вызовов.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from backend.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Сколько автоматов хостов хранить (давно не использованные замкнутые вытесняются)
+MAX_HOST_BREAKERS = 1000
+
+
+class CircuitOpenError(Exception):
+    """Зависимость недоступна: вызов отклонён без обращения к ней"""
+
+    def __init__(self, name: str, retry_after: int, reason: str):
+        super().__init__(f"{name} временно недоступен: {reason}. Повторите через {retry_after} с")
+        self.name = name
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """Автомат одной зависимости (потокобезопасный)"""
+
+    def __init__(
+        self,
+        name: str,
+        slow_call_seconds: float,
+        failure_rate: Optional[float] = None,
+        slow_call_rate: Optional[float] = None,
+        window: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        open_seconds: Optional[float] = None,
+        half_open_calls: Optional[int] = None,
+        enabled: bool = True
+    ):
+        self.name = name
+        self.enabled = enabled
+        self.slow_call_seconds = slow_call_seconds
+        self.failure_rate = settings.circuit_failure_rate if failure_rate is None else failure_rate
+        self.slow_call_rate = settings.circuit_slow_call_rate if slow_call_rate is None else slow_call_rate
+        self.window = max(1, settings.circuit_window if window is None else window)
+        self.min_calls = max(1, settings.circuit_min_calls if min_calls is None else min_calls)
+        self.open_seconds = settings.circuit_open_seconds if open_seconds is None else open_seconds
+        self.half_open_calls = max(1, settings.circuit_half_open_calls if half_open_calls is None else half_open_calls)
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        # Последние вызовы: (ошибка, медленный)
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=self.window)
+        self._open_until = 0.0
+        self._trials = 0  # Пробные вызовы в half-open (выполняются)
+        self._trial_successes = 0
+        self.reason = ""
+        self.rejected = 0
+
+    def retry_after(self) -> int:
+        """Через сколько секунд автомат пропустит пробный вызов"""
+        return max(1, int(self._open_until - time.monotonic() + 0.999))
+
+    def allow(self) -> float:
+        """
+        Разрешить вызов зависимости
+
+        Returns:
+            Время начала вызова (передаётся в record)
+
+        Raises:
+            CircuitOpenError: Автомат разомкнут
+        """
+        now = time.monotonic()
+        if not self.enabled:
+            return now
+        with self._lock:
+            if self.state == OPEN:
+                if now < self._open_until:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.retry_after(), self.reason)
+                self.state = HALF_OPEN
+                self._trials = 0
+                self._trial_successes = 0
+            if self.state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 1, f"{self.reason} (идёт проверка восстановления)")
+                self._trials += 1
+        return now
+
+    def record(self, started: float, failed: bool, reason: str = ""):
+        """
+        Результат вызова, разрешённого allow()
+
+        Args:
+            started: Значение, которое вернул allow()
+            failed: Зависимость не ответила или ответила ошибкой сервера
+            reason: Описание ошибки (для причины размыкания)
+        """
+        if not self.enabled:
+            return
+        duration = time.monotonic() - started
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trials = max(0, self._trials - 1)
+                if failed or slow:
+                    self._open(f"пробный вызов: {reason or f'ответ дольше {self.slow_call_seconds:g} с'}")
+                    return
+                self._trial_successes += 1
+                if self._trial_successes >= self.half_open_calls:
+                    self.state = CLOSED
+                    self.reason = ""
+                    self._calls.clear()
+                return
+            if self.state == OPEN:
+                # Вызов начался до размыкания
+                return
+
+            self._calls.append((failed, slow))
+            calls = len(self._calls)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, call_slow in self._calls if call_slow)
+            if failures / calls >= self.failure_rate:
+                detail = f": {reason}" if failed and reason else ""
+                self._open(f"ошибок {failures} из {calls} последних вызовов{detail}")
+            elif slow_calls / calls >= self.slow_call_rate:
+                self._open(f"{slow_calls} из {calls} последних вызовов дольше {self.slow_call_seconds:g} с")
+
+    def _open(self, reason: str):
+        """Разомкнуть автомат (под self._lock)"""
+        self.state = OPEN
+        self.reason = reason
+        self._open_until = time.monotonic() + self.open_seconds
+        self._trials = 0
+        self._calls.clear()
+        print(f"⚠️ Circuit breaker {self.name} разомкнут: {reason}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние автомата"""
+        with self._lock:
+            calls = len(self._calls)
+            return {
+                "state": self.state,
+                "reason": self.reason or None,
+                "retry_after": self.retry_after() if self.state == OPEN else 0,
+                "calls": calls,
+                "failure_rate": round(sum(1 for failed, _ in self._calls if failed) / calls, 3) if calls else 0.0,
+                "slow_call_rate": round(sum(1 for _, slow in self._calls if slow) / calls, 3) if calls else 0.0,
+                "rejected_total": self.rejected,
+            }
+
+
+class CircuitBreakerRegistry:
+    """Автоматы зависимостей: OpenAI и хосты сайтов конкурентов"""
+
+    def __init__(self):
+        self.enabled = settings.circuit_enabled
+        self.openai = CircuitBreaker("OpenAI", settings.circuit_openai_slow_seconds, enabled=self.enabled)
+        self._hosts: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def host(self, url: str) -> CircuitBreaker:
+        """Автомат хоста URL"""
+        parsed = urlparse(url)
+        host = (parsed.hostname or url).lower()
+        if parsed.port:
+            host = f"{host}:{parsed.port}"
+        with self._lock:
+            breaker = self._hosts.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(host, settings.circuit_host_slow_seconds, enabled=self.enabled)
+                self._hosts[host] = breaker
+                self._evict()
+            else:
+                self._hosts.move_to_end(host)
+            return breaker
+
+    def _evict(self):
+        """Вытеснить давно не использованные замкнутые автоматы хостов (под self._lock)"""
+        if len(self._hosts) <= MAX_HOST_BREAKERS:
+            return
+        for host in list(self._hosts):
+            if len(self._hosts) <= MAX_HOST_BREAKERS:
+                break
+            if self._hosts[host].state == CLOSED:
+                del self._hosts[host]
+
+    def all(self) -> Dict[str, CircuitBreaker]:
+        """Все автоматы: "openai" и "host:<хост>\""""
+        with self._lock:
+            hosts = list(self._hosts.items())
+        breakers = {"openai": self.openai}
+        breakers.update({f"host:{host}": breaker for host, breaker in hosts})
+        return breakers
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние для /health: OpenAI и хосты, которые сейчас не замкнуты"""
+        hosts = {
+            name[len("host:"):]: breaker.snapshot()
+            for name, breaker in self.all().items()
+            if name.startswith("host:") and breaker.state != CLOSED
+        }
+        return {
+            "enabled": self.enabled,
+            "openai": self.openai.snapshot(),
+            "hosts_tracked": len(self._hosts),
+            "hosts_open": hosts,
+        }
+
+
+# Глобальный экземпляр
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,327 @@
+"""
+Пул процессов для CPU-задач: разбор HTML и перекодирование изображений
+
+Разбор страницы BeautifulSoup и перекодирование изображения PIL держат
+GIL: в потоке воркера сервера большая страница или фотография замедляет
+все остальные запросы этого процесса. Эти этапы выполняются в общем
+ограниченном ProcessPoolExecutor:
+- воркеры запускаются при старте сервера и заранее импортируют bs4/lxml
+  и PIL (первая задача не платит за импорт);
+- в воркер передаётся только нужное (HTML, путь к файлу или байты
+  изображения), обратно - компактный результат: словарь коротких строк
+  или байты JPEG без base64;
+- число одновременно отправленных задач ограничено (CPU_POOL_QUEUE),
+  при заполнении вызывающий поток ждёт.
+
+Функции этапов - обычные функции модуля (их можно вызвать и без пула);
+если пул выключен (CPU_POOL_ENABLED=false), этап выполняется в
+вызывающем потоке, как раньше. Если процесс пула упал (например, из-за
+нехватки памяти на огромной странице), задача не повторяется в процессе
+сервера: пул перезапускается, а вызывающий получает CpuPoolError.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
+from urllib.parse import urldefrag, urljoin
+
+from backend.config import settings
+
+T = TypeVar("T")
+
+# Элементы без полезного текста страницы (меню, подвал, скрипты)
+NOISE_TAGS = ('script', 'style', 'noscript', 'template', 'svg', 'nav', 'header', 'footer', 'form', 'iframe')
+
+
+class CpuPoolError(Exception):
+    """Процесс пула упал при выполнении задачи: пул перезапускается"""
+
+    def __init__(self, failures: int):
+        super().__init__("Обработка прервана: процесс обработки перезапускается, повторите запрос позже")
+        self.failures = failures
+
+
+# === Этапы (выполняются в процессе пула) ===
+
+def _warm_worker():
+    """Инициализация воркера пула: импорт парсеров до первой задачи"""
+    from bs4 import BeautifulSoup
+    BeautifulSoup("<html><body><p>warm</p></body></html>", "lxml")
+    try:
+        from PIL import Image
+        Image.init()
+    except ImportError:
+        pass
+
+
+def extract_content(html: str) -> Dict[str, Optional[str]]:
+    """
+    Извлечь title, h1 и первый абзац из HTML
+
+    Returns:
+        Словарь с title, h1, first_paragraph
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'lxml')
+
+    # Извлекаем title
+    title_tag = soup.find('title')
+    title = title_tag.get_text(strip=True) if title_tag else None
+
+    # Извлекаем h1
+    h1_tag = soup.find('h1')
+    h1 = h1_tag.get_text(strip=True) if h1_tag else None
+
+    # Извлекаем первый абзац (из основного контента)
+    first_paragraph = None
+
+    # Пробуем найти основной контент (article, main, или body)
+    content_selectors = ['article', 'main', '[role="main"]', 'body']
+    for selector in content_selectors:
+        content_area = soup.select_one(selector)
+        if content_area:
+            # Ищем первый параграф
+            paragraph = content_area.find('p')
+            if paragraph:
+                first_paragraph = paragraph.get_text(strip=True)
+                break
+
+    # Если не нашли, берем первый p из body
+    if not first_paragraph:
+        paragraph = soup.find('p')
+        if paragraph:
+            first_paragraph = paragraph.get_text(strip=True)
+
+    # Ограничиваем длину
+    if first_paragraph and len(first_paragraph) > 500:
+        first_paragraph = first_paragraph[:500] + "..."
+
+    return {
+        "title": title,
+        "h1": h1,
+        "first_paragraph": first_paragraph
+    }
+
+
+def extract_page(html: str, base_url: str, max_text: int = 3000) -> Dict[str, Any]:
+    """
+    Извлечь ключевое содержимое страницы для обхода сайта
+
+    Returns:
+        Словарь с title, h1, description, headings (h2/h3), text
+        (основной текст без меню и подвала) и links (абсолютные URL
+        без якорей)
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'lxml')
+
+    title_tag = soup.find('title')
+    h1_tag = soup.find('h1')
+    description_tag = soup.find('meta', attrs={'name': 'description'})
+
+    links = []
+    for anchor in soup.find_all('a', href=True):
+        href = anchor['href'].strip()
+        if not href or href.startswith(('mailto:', 'tel:', 'javascript:', '#')):
+            continue
+        link = urldefrag(urljoin(base_url, href))[0]
+        if link.startswith(('http://', 'https://')):
+            links.append(link)
+
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    content_area = soup.select_one('article') or soup.select_one('main') or soup.select_one('[role="main"]') or soup.body or soup
+    headings = [
+        heading.get_text(" ", strip=True)
+        for heading in content_area.find_all(['h2', 'h3'], limit=15)
+    ]
+    text = content_area.get_text(" ", strip=True)
+
+    return {
+        "title": title_tag.get_text(strip=True) if title_tag else None,
+        "h1": h1_tag.get_text(strip=True) if h1_tag else None,
+        "description": (description_tag.get('content', '').strip() or None) if description_tag else None,
+        "headings": [heading for heading in headings if heading],
+        "text": text[:max_text],
+        "links": links,
+    }
+
+
+def encode_image(source: Union[bytes, str], max_dimension: int, max_pixels: int, jpeg_quality: int) -> bytes:
+    """
+    Уменьшить изображение до max_dimension и перекодировать в JPEG
+
+    Изображение декодируется прямо из файла или байтов: JPEG
+    декодируется в уменьшенном масштабе (draft), поэтому память не
+    зависит от размера исходного файла.
+
+    Args:
+        source: Байты изображения или путь к файлу
+
+    Returns:
+        Байты JPEG (base64 считает вызывающая сторона - результат на
+        треть меньше при передаче из процесса пула)
+
+    Raises:
+        ValueError: Изображение слишком большое по числу пикселей
+    """
+    from PIL import Image
+
+    img = Image.open(BytesIO(source) if isinstance(source, bytes) else source)
+
+    # JPEG: декодирование сразу в уменьшенном масштабе (1/2, 1/4, 1/8)
+    max_size = (max_dimension, max_dimension)
+    img.draft("RGB", max_size)
+    if img.width * img.height > max_pixels:
+        raise ValueError(
+            f"Изображение слишком большое: {img.width}x{img.height} пикселей"
+        )
+    img.thumbnail(max_size)
+
+    # Конвертируем в RGB если нужно
+    if img.mode in ("RGBA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    buffered = BytesIO()
+    img.save(buffered, format="JPEG", quality=jpeg_quality)
+    img.close()
+    return buffered.getvalue()
+
+
+# === Пул ===
+
+def _default_workers() -> int:
+    """
+    Размер пула по умолчанию: ядра CPU, поделённые между процессами
+    сервера (в production каждый воркер uvicorn держит свой пул)
+    """
+    cpus = os.cpu_count() or 1
+    server_workers = 1
+    if settings.app_env.lower() == "production":
+        server_workers = settings.api_workers or cpus
+    return max(1, cpus // server_workers)
+
+
+class CpuPool:
+    """Общий пул процессов для CPU-задач"""
+
+    def __init__(self):
+        self.enabled = settings.cpu_pool_enabled
+        self.workers = settings.cpu_pool_workers or _default_workers()
+        self.max_pending = settings.cpu_pool_queue or self.workers * 4
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.in_flight = 0
+        self.tasks = 0
+        self.inline = 0
+        self.failures = 0
+
+    def _mp_context(self):
+        """forkserver на POSIX (fork из процесса с потоками небезопасен), иначе spawn"""
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        return multiprocessing.get_context(method)
+
+    def start(self) -> Optional[ProcessPoolExecutor]:
+        """
+        Запустить воркеры пула (при старте сервера)
+
+        Задачи-пустышки по одной на воркер: процессы стартуют и импортируют
+        парсеры до первого запроса, не задерживая сам старт.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._mp_context(),
+                    initializer=_warm_worker
+                )
+                for _ in range(self.workers):
+                    self._executor.submit(int)
+            return self._executor
+
+    def close(self):
+        """Остановить воркеры пула (при остановке сервера)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _reset(self, executor: ProcessPoolExecutor) -> int:
+        """
+        Процесс пула упал: следующий вызов запустит пул заново
+
+        Returns:
+            Число сбоев пула с момента запуска
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.failures += 1
+                print(f"⚠️ Пул процессов CPU-задач перезапускается после сбоя воркера ({self.failures})")
+            failures = self.failures
+        executor.shutdown(wait=False, cancel_futures=True)
+        return failures
+
+    def run(self, fn: Callable[..., T], *args) -> T:
+        """
+        Выполнить этап в процессе пула и дождаться результата
+
+        Блокирует вызывающий поток (вызывается из пула потоков сервера,
+        для кода в event loop - run_async). Исключения этапа пробрасываются.
+
+        Raises:
+            CpuPoolError: Процесс пула упал во время задачи - задача не
+                повторяется (в процессе сервера она уронила бы и его)
+        """
+        executor = self.start()
+        if executor is None:
+            self.inline += 1
+            return fn(*args)
+        with self._slots:
+            with self._lock:
+                self.in_flight += 1
+                self.tasks += 1
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                raise CpuPoolError(self._reset(executor)) from None
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+    async def run_async(self, fn: Callable[..., T], *args) -> T:
+        """Выполнить этап в процессе пула, не блокируя event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.run, fn, *args))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние пула для /health"""
+        return {
+            "enabled": self.enabled,
+            "running": self._executor is not None,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "tasks_total": self.tasks,
+            "inline_total": self.inline,
+            "failures_total": self.failures,
+        }
+
+
+# Глобальный экземпляр (процессы запускаются в start())
+cpu_pool = CpuPool()
@@ -0,0 +1,401 @@
+"""
+Обход сайта конкурента
+
+Начиная с корневого URL, находит внутренние страницы (сначала из
+sitemap.xml, затем по ссылкам на страницах) в пределах глубины и числа
+страниц, загружает их параллельно и извлекает ключевое содержимое.
+
+Вежливость к сайту: соблюдается robots.txt (Disallow и Crawl-delay),
+к одному хосту одновременно идёт не больше crawl_per_host_concurrency
+запросов с интервалом не меньше crawl_delay_ms между их началом.
+
+HTML страниц разбирается в пуле процессов (cpu_service). Резюме
+страниц (map) считаются в пуле потоков по мере загрузки, поэтому
+обход и обращения к модели идут одновременно; сводный анализ (reduce)
+выполняет вызывающая сторона.
+"""
+import asyncio
+import contextvars
+import gzip
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from backend.config import settings
+from backend.services.circuit_service import CircuitOpenError, circuit_breakers
+from backend.services.cpu_service import cpu_pool, extract_page
+from backend.services.metrics_service import stage
+from backend.services.parser_service import parser_service
+from backend.services.rule_service import rule_engine
+
+# Ссылки на файлы, которые не являются страницами
+SKIP_EXTENSIONS = (
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".zip", ".rar", ".7z",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".ico", ".bmp", ".tif", ".tiff",
+    ".mp3", ".mp4", ".avi", ".mov", ".webm", ".css", ".js", ".json", ".xml", ".txt",
+)
+# Сколько файлов sitemap читать (индекс sitemap может ссылаться на десятки)
+MAX_SITEMAPS = 5
+# Страницы больше этого размера не разбираются
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+
+# Резюме страницы: (url, извлечённое содержимое) -> текст
+Summarizer = Callable[[str, Dict[str, Any]], Optional[str]]
+
+
+def site_key(url: str) -> str:
+    """Хост без www: страницы www.site.by и site.by - один сайт"""
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def normalize_url(url: str) -> str:
+    """URL без якоря, с хостом в нижнем регистре и непустым путём"""
+    url = urldefrag(url)[0]
+    parsed = urlparse(url)
+    return parsed._replace(netloc=parsed.netloc.lower(), path=parsed.path or "/").geturl()
+
+
+class HostPoliteness:
+    """Ограничение одновременных запросов и интервала между запросами к хосту"""
+
+    def __init__(self, concurrency: int, delay: float):
+        self.delay = delay
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+
+
+class SiteCrawl:
+    """Один обход сайта (состояние живёт в event loop обхода)"""
+
+    def __init__(
+        self,
+        root_url: str,
+        max_pages: int,
+        max_depth: int,
+        summarize: Optional[Summarizer],
+        executor: Optional[ThreadPoolExecutor],
+        cancelled: Optional[Callable[[], bool]] = None
+    ):
+        self.root_url = normalize_url(root_url)
+        self.site = site_key(self.root_url)
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.summarize = summarize
+        self.executor = executor
+        self.cancelled = cancelled
+        self.user_agent = parser_service.user_agent
+        self.robots: Optional[RobotFileParser] = None
+        self.politeness: Dict[str, HostPoliteness] = {}
+        self.delay = settings.crawl_delay_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # Найденные внутренние страницы и те из них, что поставлены в очередь
+        self.found: set = set()
+        self.seen: set = set()
+        self.pages: List[Dict[str, Any]] = []
+        self.summaries: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self.from_sitemap = 0
+
+    def _host_limit(self, url: str) -> HostPoliteness:
+        host = (urlparse(url).hostname or "").lower()
+        if host not in self.politeness:
+            self.politeness[host] = HostPoliteness(settings.crawl_per_host_concurrency, self.delay)
+        return self.politeness[host]
+
+    def _allowed(self, url: str) -> bool:
+        """Внутренняя страница, разрешённая robots.txt"""
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or site_key(url) != self.site:
+            return False
+        if parsed.path.lower().endswith(SKIP_EXTENSIONS):
+            return False
+        return self.robots is None or self.robots.can_fetch(self.user_agent, url)
+
+    def _schedule(self, url: str, depth: int) -> bool:
+        """Поставить страницу в очередь, если она новая и лимит не исчерпан"""
+        url = normalize_url(url)
+        if url in self.found or not self._allowed(url):
+            return False
+        self.found.add(url)
+        if len(self.seen) >= self.max_pages:
+            return False
+        self.seen.add(url)
+        self.queue.put_nowait((url, depth))
+        return True
+
+    async def _get(self, client: httpx.AsyncClient, url: str, stream: bool = False) -> httpx.Response:
+        """
+        GET с ограничениями хоста и через его circuit breaker
+
+        Args:
+            stream: Вернуть ответ после заголовков, тело читает (и ответ
+                закрывает) вызывающая сторона
+
+        Raises:
+            CircuitOpenError: Хост недавно не отвечал - без ожидания таймаута
+        """
+        breaker = circuit_breakers.host(url)
+        started = breaker.allow()
+        failure = None
+        try:
+            async with self._host_limit(url):
+                # Ожидание очереди к хосту не считается временем ответа
+                started = time.monotonic()
+                response = await client.send(client.build_request("GET", url), stream=stream)
+            if response.status_code >= 500:
+                failure = f"HTTP {response.status_code}"
+            return response
+        except httpx.TimeoutException:
+            failure = "таймаут"
+            raise
+        except httpx.TransportError as e:
+            failure = f"ошибка соединения ({type(e).__name__})"
+            raise
+        finally:
+            breaker.record(started, failure is not None, failure or "")
+
+    # === Поиск страниц ===
+
+    async def _load_robots(self, client: httpx.AsyncClient) -> List[str]:
+        """Прочитать robots.txt; вернуть адреса sitemap"""
+        robots_url = urljoin(self.root_url, "/robots.txt")
+        sitemaps = [urljoin(self.root_url, "/sitemap.xml")]
+        try:
+            response = await self._get(client, robots_url)
+        except (httpx.HTTPError, CircuitOpenError):
+            return sitemaps
+        if response.status_code != 200:
+            return sitemaps
+        robots = RobotFileParser(robots_url)
+        robots.parse(response.text.splitlines())
+        self.robots = robots
+        crawl_delay = robots.crawl_delay(self.user_agent)
+        if crawl_delay:
+            self.delay = max(self.delay, float(crawl_delay))
+            for limit in self.politeness.values():
+                limit.delay = self.delay
+        return robots.site_maps() or sitemaps
+
+    async def _read_sitemaps(self, client: httpx.AsyncClient, sitemaps: List[str]) -> List[str]:
+        """URL страниц из sitemap (индекс sitemap разворачивается)"""
+        pending = list(sitemaps)
+        urls: List[str] = []
+        fetched = 0
+        while pending and fetched < MAX_SITEMAPS and len(urls) < self.max_pages * 4:
+            sitemap_url = pending.pop(0)
+            fetched += 1
+            try:
+                response = await self._get(client, sitemap_url)
+                if response.status_code != 200:
+                    continue
+                content = response.content
+                if content[:2] == b"\x1f\x8b":
+                    content = gzip.decompress(content)
+                root = ET.fromstring(content)
+            except (httpx.HTTPError, CircuitOpenError, ET.ParseError, OSError):
+                continue
+            locations = [
+                element.text.strip()
+                for element in root.iter()
+                if element.tag.endswith("loc") and element.text
+            ]
+            if root.tag.endswith("sitemapindex"):
+                pending.extend(locations)
+            else:
+                urls.extend(locations)
+        return urls
+
+    # === Загрузка страниц ===
+
+    @staticmethod
+    async def _read_html(response: httpx.Response) -> Optional[str]:
+        """
+        Тело страницы не больше MAX_PAGE_BYTES (None - страница больше)
+
+        Размер проверяется по Content-Length до загрузки и по мере чтения:
+        огромная страница не загружается в память целиком.
+        """
+        length = response.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_PAGE_BYTES:
+            return None
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) > MAX_PAGE_BYTES:
+                return None
+        return bytes(body).decode(response.encoding or "utf-8", errors="replace")
+
+    async def _fetch_page(self, client: httpx.AsyncClient, url: str, depth: int) -> Dict[str, Any]:
+        """
+        Загрузить и разобрать страницу
+
+        Любая ошибка записывается в page["error"]: исключение не должно
+        остановить воркер обхода (иначе queue.join() не дождётся страниц).
+        """
+        page: Dict[str, Any] = {"url": url, "depth": depth}
+        try:
+            response = await self._get(client, url, stream=True)
+            try:
+                response.raise_for_status()
+                if "html" not in response.headers.get("content-type", "html"):
+                    page["error"] = "Не HTML-страница"
+                    return page
+                html = await self._read_html(response)
+            finally:
+                await response.aclose()
+            if html is None:
+                page["error"] = "Страница слишком большая"
+                return page
+            final_url = str(response.url)
+            # Разбор в пуле процессов: event loop обхода не занят разбором HTML
+            with stage("parse"):
+                page.update(await cpu_pool.run_async(extract_page, html, final_url))
+            page["facts"] = rule_engine.evaluate("\n".join(
+                [page.get("title") or "", page.get("h1") or "", page.get("description") or ""]
+                + page.get("headings", []) + [page.get("text") or ""]
+            ))
+            if site_key(final_url) != self.site:
+                # Перенаправление на другой сайт: ссылки с него не обходим
+                page["links"] = []
+        except httpx.HTTPStatusError as e:
+            page["error"] = f"HTTP ошибка {e.response.status_code}"
+        except httpx.TimeoutException:
+            page["error"] = "Timeout при загрузке страницы"
+        except httpx.HTTPError as e:
+            page["error"] = f"Ошибка загрузки: {e}"
+        except CircuitOpenError as e:
+            page["error"] = str(e)
+        except Exception as e:
+            # Разбор в пуле процессов, правила и т.п.
+            page["error"] = f"Ошибка обработки страницы: {e}"
+        return page
+
+    async def _worker(self, client: httpx.AsyncClient):
+        loop = asyncio.get_running_loop()
+        while True:
+            url, depth = await self.queue.get()
+            try:
+                if self.cancelled is not None and self.cancelled():
+                    # Обход отменён: оставшиеся страницы очереди не загружаются
+                    continue
+                page = await self._fetch_page(client, url, depth)
+                links = page.pop("links", [])
+                if depth < self.max_depth:
+                    for link in links:
+                        self._schedule(link, depth + 1)
+                self.pages.append(page)
+                if self.summarize is not None and not page.get("error"):
+                    # Резюме считается в пуле, пока обход продолжается; копия контекста -
+                    # чтобы этапы резюме (llm) попали в Server-Timing запроса
+                    future = loop.run_in_executor(
+                        self.executor, contextvars.copy_context().run, self.summarize, url, page
+                    )
+                    self.summaries.append((page, future))
+            finally:
+                self.queue.task_done()
+
+    async def run(self) -> Dict[str, Any]:
+        async with httpx.AsyncClient(
+            timeout=parser_service.timeout,
+            follow_redirects=True,
+            headers=parser_service.request_headers(),
+            limits=httpx.Limits(max_connections=settings.crawl_concurrency)
+        ) as client:
+            sitemaps = await self._load_robots(client)
+            self._schedule(self.root_url, 0)
+            if self.max_depth > 0:
+                # Страницы из sitemap занимают лимит первыми (как глубина 1),
+                # ссылки со страниц - оставшиеся места
+                for url in await self._read_sitemaps(client, sitemaps):
+                    if self._schedule(url, 1):
+                        self.from_sitemap += 1
+            workers = [asyncio.create_task(self._worker(client)) for _ in range(max(1, settings.crawl_concurrency))]
+            try:
+                await self.queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        # Порядок обхода в ширину: корень, затем страницы по глубине
+        self.pages.sort(key=lambda page: page["depth"])
+        for page, future in self.summaries:
+            try:
+                page["summary"] = await future
+            except Exception as e:
+                print(f"⚠️ Ошибка резюме страницы {page['url']}: {e}")
+        return {
+            "url": self.root_url,
+            "pages": self.pages,
+            "pages_found": len(self.found),
+            "from_sitemap": self.from_sitemap,
+        }
+
+
+class CrawlerService:
+    """Обход сайтов конкурентов"""
+
+    def __init__(self):
+        self.max_pages = settings.crawl_max_pages
+        self.max_depth = settings.crawl_max_depth
+        self.summary_workers = settings.crawl_summary_workers
+
+    def crawl(
+        self,
+        url: str,
+        max_pages: Optional[int] = None,
+        max_depth: Optional[int] = None,
+        summarize: Optional[Summarizer] = None,
+        cancelled: Optional[Callable[[], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        Обойти сайт (блокирующий вызов: из пула потоков или фоновой задачи)
+
+        Args:
+            url: Корневой URL
+            max_pages, max_depth: Лимиты обхода (по умолчанию из настроек)
+            summarize: Резюме страницы (map), вызывается в пуле потоков
+            cancelled: Обход прекращается, когда функция вернёт True
+
+        Returns:
+            Словарь с url, pages (url, depth, title, h1, description,
+            headings, text, summary, error), pages_found, from_sitemap
+        """
+        if not urlparse(url).scheme:
+            url = f"https://{url}"
+        executor = ThreadPoolExecutor(max_workers=max(1, self.summary_workers), thread_name_prefix="crawl-summary")
+        crawl = SiteCrawl(
+            url,
+            max_pages or self.max_pages,
+            self.max_depth if max_depth is None else max_depth,
+            summarize,
+            executor,
+            cancelled
+        )
+        try:
+            with stage("crawl"):
+                return asyncio.run(crawl.run())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Глобальный экземпляр
+crawler_service = CrawlerService()
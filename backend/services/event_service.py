@@ -0,0 +1,147 @@
+"""
+Лента событий для клиентов
+
+Новые записи истории и изменения состояния задач рассылаются
+подписчикам (WebSocket /ws/events и SSE /events), чтобы клиенты
+обновляли списки по событиям, а не перезапрашивали их целиком.
+
+События записываются в общую SQLite базу (shared_state): номер события
+общий для всех процессов сервера, а клиент может переподключиться и
+получить пропущенное (since / Last-Event-ID). Свои события процесс
+рассылает сразу, события других процессов подхватывает фоновая задача.
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime
+from typing import Any, List, Optional, Set
+
+from backend.services.shared_state import shared_state
+
+
+class EventService:
+    """Публикация событий и подписки в рамках процесса"""
+
+    # Как часто проверять события других процессов (секунды)
+    poll_interval = 0.5
+    # Размер очереди подписчика; медленный клиент отключается при переполнении
+    queue_size = 256
+
+    def __init__(self):
+        self.origin = ""
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_id = 0
+
+    def _origin(self) -> str:
+        """Идентификатор процесса-источника события"""
+        if not self.origin:
+            self.origin = f"{socket.gethostname()}:{os.getpid()}"
+        return self.origin
+
+    def publish(self, event_type: str, data: Any) -> int:
+        """
+        Опубликовать событие (можно вызывать из любого потока)
+
+        Вне сервера (CLI, отдельные процессы) событие только сохраняется:
+        подписчикам его доставит процесс сервера.
+
+        Returns:
+            Номер события
+        """
+        ts = datetime.now().isoformat()
+        event_id = shared_state.append_event(event_type, data, self._origin(), ts)
+        if self._loop is not None:
+            event = {"id": event_id, "type": event_type, "data": data, "ts": ts}
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+        return event_id
+
+    def _dispatch(self, event: dict):
+        """Разослать событие подписчикам (в event loop)"""
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Клиент не успевает читать: отключаем, он переподключится с since
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    # === Подписки ===
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Подписаться на события
+
+        Из очереди приходят словари {id, type, data, ts};
+        None означает, что подписка закрыта (переполнение очереди).
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Отписаться от событий"""
+        self._subscribers.discard(queue)
+
+    @staticmethod
+    def replay(since: int, limit: int = 500) -> List[dict]:
+        """События после номера since (для переподключившихся клиентов)"""
+        return [
+            {"id": row["id"], "type": row["type"], "data": row["data"], "ts": row["ts"]}
+            for row in shared_state.events_after(since, limit)
+        ]
+
+    @staticmethod
+    def last_id() -> int:
+        """Номер последнего опубликованного события"""
+        return shared_state.last_event_id()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    # === События других процессов ===
+
+    async def start(self):
+        """Начать доставку событий (вызывается при старте приложения)"""
+        self._loop = asyncio.get_running_loop()
+        self._last_id = await asyncio.to_thread(shared_state.last_event_id)
+        self._task = asyncio.create_task(self._relay())
+
+    async def stop(self):
+        """Остановить доставку и закрыть подписки"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        self._subscribers.clear()
+        self._loop = None
+
+    async def _relay(self):
+        """Подхватывать события, опубликованные другими процессами"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._subscribers:
+                # Никто не слушает: просто сдвигаем позицию
+                self._last_id = await asyncio.to_thread(shared_state.last_event_id)
+                continue
+            try:
+                rows = await asyncio.to_thread(shared_state.events_after, self._last_id)
+            except Exception as e:
+                print(f"⚠️ Ошибка чтения событий: {e}")
+                continue
+            for row in rows:
+                self._last_id = max(self._last_id, row["id"])
+                if row["origin"] != self._origin():
+                    self._dispatch({"id": row["id"], "type": row["type"], "data": row["data"], "ts": row["ts"]})
+
+
+# Глобальный экземпляр
+event_service = EventService()
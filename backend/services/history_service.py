@@ -2,13 +2,17 @@
 Сервис для работы с историей запросов
 """
 import json
+import threading
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 
 from backend.config import settings
-from backend.models.schemas import HistoryItem
+from backend.models.schemas import HistoryItem, HistoryResponse
+from backend.services.event_service import event_service
+from backend.services.metrics_service import stage
+from backend.services.shared_state import atomic_write_text, file_lock
 
 
 class HistoryService:
@@ -17,27 +21,45 @@ class HistoryService:
     def __init__(self):
         self.history_file = Path(settings.history_file)
         self.max_items = settings.max_history_items
-        self._ensure_file_exists()
+        # Разобранный файл истории и его (inode, mtime, size): файл перечитывается,
+        # только если его изменил этот или другой процесс (запись атомарная -
+        # через замену файла, поэтому меняется и inode)
+        self._cache: Optional[Tuple[Tuple[int, int, int], List[dict]]] = None
+        self._cache_lock = threading.Lock()
     
-    def _ensure_file_exists(self):
-        """Создать файл истории если его нет"""
-        if not self.history_file.exists():
-            self.history_file.write_text("[]", encoding="utf-8")
+    def init(self):
+        """Создать файл истории если его нет (вызывается при старте сервера)"""
+        with file_lock(self.history_file):
+            if not self.history_file.exists():
+                atomic_write_text(self.history_file, "[]")
     
     def _load_history(self) -> List[dict]:
-        """Загрузить историю из файла"""
+        """Загрузить историю из файла (из кеша, если файл не менялся)"""
         try:
-            content = self.history_file.read_text(encoding="utf-8")
-            return json.loads(content)
+            stat = self.history_file.stat()
+        except FileNotFoundError:
+            return []
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._cache_lock:
+            if self._cache is not None and self._cache[0] == key:
+                return list(self._cache[1])
+        try:
+            with stage("history_read"):
+                content = self.history_file.read_text(encoding="utf-8")
+                history = json.loads(content)
         except (json.JSONDecodeError, FileNotFoundError):
             return []
+        with self._cache_lock:
+            self._cache = (key, history)
+        return list(history)
     
     def _save_history(self, history: List[dict]):
-        """Сохранить историю в файл"""
-        self.history_file.write_text(
-            json.dumps(history, ensure_ascii=False, indent=2, default=str),
-            encoding="utf-8"
-        )
+        """Сохранить историю в файл (атомарно, вызывать под file_lock)"""
+        with stage("history_write"):
+            atomic_write_text(
+                self.history_file,
+                json.dumps(history, ensure_ascii=False, indent=2, default=str)
+            )
     
     def add_entry(
         self,
@@ -46,8 +68,6 @@ class HistoryService:
         response_summary: str
     ) -> HistoryItem:
         """Добавить запись в историю"""
-        history = self._load_history()
-        
         item = {
             "id": str(uuid.uuid4()),
             "timestamp": datetime.now().isoformat(),
@@ -56,14 +76,20 @@ class HistoryService:
             "response_summary": response_summary[:500]
         }
         
-        # Добавляем в начало
-        history.insert(0, item)
-        
-        # Оставляем только последние N записей
-        history = history[:self.max_items]
-        
-        self._save_history(history)
+        # Чтение и запись под межпроцессной блокировкой: несколько воркеров
+        # сервера не должны затирать записи друг друга
+        with file_lock(self.history_file):
+            history = self._load_history()
+            
+            # Добавляем в начало
+            history.insert(0, item)
+            
+            # Оставляем только последние N записей
+            history = history[:self.max_items]
+            
+            self._save_history(history)
         
+        event_service.publish("history.added", item)
         return HistoryItem(**item)
     
     def get_history(self) -> List[HistoryItem]:
@@ -71,9 +97,68 @@ class HistoryService:
         history = self._load_history()
         return [HistoryItem(**item) for item in history]
     
+    @staticmethod
+    def _etag(history: List[dict], offset: int = 0, limit: Optional[int] = None) -> str:
+        """
+        ETag состояния истории (для страницы - с её границами)
+        
+        Записи только добавляются в начало (с новым uuid) или удаляются
+        целиком, поэтому id первой записи и количество однозначно
+        определяют содержимое.
+        """
+        newest = history[0]["id"] if history else "empty"
+        if limit is None and not offset:
+            return f'W/"{newest}-{len(history)}"'
+        return f'W/"{newest}-{len(history)}-{offset}-{limit}"'
+    
+    def get_changes(
+        self,
+        since: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Tuple[HistoryResponse, str]:
+        """
+        История целиком, страница или только записи новее курсора
+        
+        Args:
+            since: Курсор - id самой новой записи, которая уже есть у клиента
+            offset, limit: Страница истории (от новых к старым); без since
+        
+        Returns:
+            (ответ, ETag). Если курсора уже нет в истории (очистка или
+            вытеснение старых записей), возвращается полный список.
+        """
+        history = self._load_history()
+        cursor = history[0]["id"] if history else None
+        items, full = history, True
+        if since:
+            offset, limit = 0, None
+            for index, item in enumerate(history):
+                if item["id"] == since:
+                    items, full = history[:index], False
+                    break
+        elif offset or limit is not None:
+            # В модель разбираются только записи страницы
+            end = offset + limit if limit is not None else None
+            items = history[offset:end]
+        response = HistoryResponse(
+            items=[HistoryItem(**item) for item in items],
+            total=len(history),
+            cursor=cursor,
+            full=full,
+            offset=offset
+        )
+        return response, self._etag(history, offset, limit)
+    
+    def current_etag(self, offset: int = 0, limit: Optional[int] = None) -> str:
+        """ETag текущего состояния истории (без разбора записей)"""
+        return self._etag(self._load_history(), offset, limit)
+    
     def clear_history(self):
         """Очистить историю"""
-        self._save_history([])
+        with file_lock(self.history_file):
+            self._save_history([])
+        event_service.publish("history.cleared", {})
 
 
 # Глобальный экземпляр
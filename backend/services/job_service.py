@@ -0,0 +1,417 @@
+"""
+Сервис фоновых задач
+
+Очередь хранится в SQLite, поэтому задачи переживают перезапуск сервера.
+Пул asyncio-воркеров забирает задачи в порядке приоритета и выполняет
+блокирующие обработчики в потоках, не занимая event loop.
+
+Пока обработчик выполняется, воркер продлевает аренду задачи
+(lease_until): долгую задачу не заберёт другой воркер. Если задачу
+отменили (в любом процессе сервера) или аренду всё же забрал другой
+воркер, обработчик получает сигнал отмены - долгие обработчики
+проверяют job_service.cancel_requested() между шагами.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from pydantic import BaseModel
+
+from backend.config import settings
+from backend.models.schemas import JobInfo
+from backend.services.event_service import event_service
+
+# Статусы, после которых задача больше не меняется
+FINAL_STATUSES = ("done", "failed", "cancelled")
+
+# Сигнал отмены задачи, которую выполняет текущий обработчик
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("job_cancel_event", default=None)
+
+
+class JobQueueFullError(Exception):
+    """Очередь задач переполнена"""
+
+
+class JobService:
+    """Очередь фоновых задач с пулом воркеров"""
+
+    # Как часто воркер проверяет очередь, если его не разбудили
+    poll_interval = 1.0
+
+    def __init__(self):
+        self.db_file = Path(settings.jobs_db_file)
+        self.upload_dir = Path(settings.jobs_upload_dir)
+        self.workers = max(1, settings.job_workers)
+        self.queue_limit = settings.job_queue_limit
+        self.lease_seconds = settings.job_lease_seconds
+        self.max_attempts = settings.job_max_attempts
+        self.retention = timedelta(hours=settings.job_retention_hours)
+
+        self._handlers: Dict[str, Callable[[dict], Any]] = {}
+        self._payload_models: Dict[str, Optional[Type[BaseModel]]] = {}
+        self._listeners: Dict[str, List[asyncio.Queue]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Сигналы отмены задач, выполняющихся в этом процессе: id -> событие
+        self._running: Dict[str, threading.Event] = {}
+
+        # База создаётся при старте сервера (init) или при первом обращении,
+        # а не при импорте модуля
+        self._db_ready = False
+
+    # === Хранилище ===
+
+    @contextmanager
+    def _connect(self):
+        """Открыть соединение с базой задач"""
+        conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._db_ready:
+                self._init_db(conn)
+            yield conn
+        finally:
+            conn.close()
+
+    def init(self):
+        """Подготовить базу задач (вызывается при старте сервера)"""
+        with self._connect():
+            pass
+
+    def _init_db(self, conn: sqlite3.Connection):
+        """Создать таблицу задач если её нет"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at)")
+        self._db_ready = True
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> JobInfo:
+        """Преобразовать строку таблицы в JobInfo"""
+        return JobInfo(
+            id=row["id"],
+            type=row["type"],
+            status=row["status"],
+            priority=row["priority"],
+            attempts=row["attempts"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"]
+        )
+
+    def _cleanup(self):
+        """Удалить завершённые задачи старше срока хранения"""
+        threshold = (datetime.now() - self.retention).isoformat()
+        placeholders = ",".join("?" * len(FINAL_STATUSES))
+        with self._connect() as conn:
+            conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?",
+                (*FINAL_STATUSES, threshold)
+            )
+
+        # Загрузки отменённых до запуска задач
+        if self.upload_dir.exists():
+            expire_before = time.time() - self.retention.total_seconds()
+            for path in self.upload_dir.iterdir():
+                if path.is_file() and path.stat().st_mtime < expire_before:
+                    path.unlink(missing_ok=True)
+
+    # === Регистрация и постановка задач ===
+
+    def register(self, job_type: str, handler: Callable[[dict], Any], payload_model: Optional[Type[BaseModel]] = None):
+        """
+        Зарегистрировать обработчик задач
+
+        Args:
+            job_type: Тип задачи
+            handler: Блокирующая функция payload -> JSON-совместимый результат
+            payload_model: Pydantic модель для проверки payload при постановке
+        """
+        self._handlers[job_type] = handler
+        self._payload_models[job_type] = payload_model
+
+    @property
+    def job_types(self) -> List[str]:
+        """Зарегистрированные типы задач"""
+        return sorted(self._handlers)
+
+    def submit(self, job_type: str, payload: Dict[str, Any], priority: int = 5) -> JobInfo:
+        """
+        Поставить задачу в очередь
+
+        Raises:
+            ValueError: Неизвестный тип задачи или некорректный payload
+            JobQueueFullError: В очереди уже job_queue_limit задач
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"Неизвестный тип задачи: {job_type}. Доступны: {', '.join(self.job_types)}")
+
+        payload_model = self._payload_models.get(job_type)
+        if payload_model is not None:
+            payload = payload_model(**payload).model_dump()
+
+        now = datetime.now().isoformat()
+        job_id = str(uuid.uuid4())
+        with self._connect() as conn:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.queue_limit:
+                raise JobQueueFullError(f"Очередь задач заполнена ({queued}). Повторите позже")
+            conn.execute(
+                "INSERT INTO jobs (id, type, status, priority, payload, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, job_type, priority, json.dumps(payload, ensure_ascii=False), now, now)
+            )
+
+        job = self.get(job_id)
+        self._notify(job)
+        self._wake_workers()
+        return job
+
+    def get(self, job_id: str) -> Optional[JobInfo]:
+        """Получить состояние задачи"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def status_counts(self) -> Dict[str, int]:
+        """Количество задач по статусам"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def cancel(self, job_id: str) -> Optional[JobInfo]:
+        """
+        Отменить задачу
+
+        Задача в очереди не будет запущена; выполняющаяся задача получает
+        сигнал отмены (в другом процессе - при продлении аренды), её
+        результат будет отброшен.
+        """
+        placeholders = ",".join("?" * len(FINAL_STATUSES))
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status NOT IN ({placeholders})",
+                (datetime.now().isoformat(), job_id, *FINAL_STATUSES)
+            )
+        event = self._running.get(job_id)
+        if event is not None:
+            event.set()
+        job = self.get(job_id)
+        if job:
+            self._notify(job)
+        return job
+
+    def cancel_requested(self) -> bool:
+        """
+        Отменена ли задача, которую выполняет текущий обработчик
+
+        Вызывается из обработчика (в его потоке); вне задачи - False.
+        """
+        event = _cancel_event.get()
+        return event is not None and event.is_set()
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """
+        Атомарно забрать следующую задачу из очереди
+
+        Задачи со статусом running и истёкшей арендой (воркер упал или
+        сервер был перезапущен) снова становятся доступны.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY priority, created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+
+                if row["attempts"] >= self.max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                        ("Превышено число попыток выполнения", datetime.now().isoformat(), row["id"])
+                    )
+                    conn.execute("COMMIT")
+                    return self._claim_next()
+
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (now + self.lease_seconds, datetime.now().isoformat(), row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+    def _renew(self, job_id: str, attempt: int) -> bool:
+        """
+        Продлить аренду выполняющейся задачи
+
+        Returns:
+            False, если задачу отменили или её забрал другой воркер
+            (попытка сменилась)
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (time.time() + self.lease_seconds, job_id, attempt)
+            )
+        return cursor.rowcount > 0
+
+    def _finish(self, job_id: str, attempt: int, status: str, result: Any = None, error: Optional[str] = None):
+        """Сохранить результат задачи (если её не отменили и не забрали во время выполнения)"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = 0, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND attempts = ?",
+                (
+                    status,
+                    json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                    error,
+                    datetime.now().isoformat(),
+                    job_id,
+                    attempt
+                )
+            )
+
+    # === Пул воркеров ===
+
+    async def start(self):
+        """Запустить воркеры (вызывается при старте приложения)"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self._cleanup)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Остановить воркеры; незавершённые задачи вернутся в очередь по истечении аренды"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _wake_workers(self):
+        """Разбудить воркеры после постановки задачи (потокобезопасно)"""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _heartbeat(self, job_id: str, attempt: int, cancel_event: threading.Event):
+        """Продлевать аренду, пока обработчик выполняется; задача отменена или забрана - сигнал отмены"""
+        interval = max(0.1, self.lease_seconds / 3)
+        while not cancel_event.is_set():
+            await asyncio.sleep(interval)
+            try:
+                renewed = await asyncio.to_thread(self._renew, job_id, attempt)
+            except sqlite3.Error as e:
+                # База занята: повтор на следующем шаге, до истечения аренды их ещё два
+                print(f"⚠️ Не удалось продлить аренду задачи {job_id}: {e}")
+                continue
+            if not renewed:
+                cancel_event.set()
+
+    async def _worker(self):
+        """Цикл воркера: забрать задачу, выполнить, сохранить результат"""
+        while True:
+            row = await asyncio.to_thread(self._claim_next)
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job = self._row_to_job(row)
+            await asyncio.to_thread(self._notify, job)
+
+            handler = self._handlers.get(job.type)
+            attempt = row["attempts"]
+            cancel_event = threading.Event()
+            self._running[job.id] = cancel_event
+            # Контекст копируется в поток обработчика (asyncio.to_thread)
+            context_token = _cancel_event.set(cancel_event)
+            heartbeat = asyncio.create_task(self._heartbeat(job.id, attempt, cancel_event))
+            try:
+                if handler is None:
+                    raise ValueError(f"Нет обработчика для задачи типа {job.type}")
+                result = await asyncio.to_thread(handler, json.loads(row["payload"]))
+                await asyncio.to_thread(self._finish, job.id, attempt, "done", result)
+            except asyncio.CancelledError:
+                # Остановка сервера: задача вернётся в очередь по истечении аренды
+                cancel_event.set()
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self._finish, job.id, attempt, "failed", None, str(e) or type(e).__name__)
+            finally:
+                heartbeat.cancel()
+                _cancel_event.reset(context_token)
+                self._running.pop(job.id, None)
+
+            updated = await asyncio.to_thread(self.get, job.id)
+            if updated:
+                await asyncio.to_thread(self._notify, updated)
+
+    # === Подписки на изменения ===
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Подписаться на изменения задачи в этом процессе"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        """Отписаться от изменений задачи"""
+        listeners = self._listeners.get(job_id, [])
+        if queue in listeners:
+            listeners.remove(queue)
+        if not listeners:
+            self._listeners.pop(job_id, None)
+
+    def _notify(self, job: JobInfo):
+        """
+        Разослать новое состояние задачи подписчикам
+
+        Пишет событие в общую базу, поэтому из event loop вызывается
+        через asyncio.to_thread.
+        """
+        # В ленту событий - без результата: он может быть большим,
+        # клиент заберёт его через GET /jobs/{id}
+        event_service.publish("job.updated", job.model_dump(mode="json", exclude={"result"}))
+        if self._loop is None:
+            return
+        for queue in self._listeners.get(job.id, []):
+            self._loop.call_soon_threadsafe(queue.put_nowait, job)
+
+
+# Глобальный экземпляр
+job_service = JobService()
@@ -0,0 +1,283 @@
+"""
+Метрики в формате Prometheus
+
+Счётчики, gauge и гистограммы с заранее выделенными бакетами.
+Запись значения - поиск индекса бакета и инкремент элемента списка,
+без блокировок: под GIL редкая потеря инкремента при гонке потоков
+допустима для метрик и дешевле блокировки на каждом запросе.
+Блокировка берётся только при первом появлении нового набора меток.
+
+Метрики собираются в каждом процессе сервера отдельно.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Бакеты длительностей (секунды): от быстрых операций до долгих LLM вызовов
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    """Экранировать значение метки"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Сформировать {label="value",...}"""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """Базовый класс метрики с набором меток"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str, **labels: str):
+        """Получить дочернюю метрику для набора меток"""
+        key = values if values else tuple(labels[name] for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _ValueChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _ValueChild()
+
+
+class Gauge(_Metric):
+    """Текущее значение (может расти и уменьшаться)"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _ValueChild()
+
+
+class CallbackGauge(_Metric):
+    """Gauge, значения которого вычисляются в момент сбора метрик"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str], callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        try:
+            values = self.callback()
+        except Exception:
+            values = {}
+        for key, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Последний элемент - бакет +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными бакетами"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, key, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        counts = list(child.counts)
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ("le", str(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        cumulative += counts[-1]
+        labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+        lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {child.sum}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback_gauge(self, name: str, documentation: str, labelnames: Iterable[str], callback) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, labelnames, callback))
+
+    def render(self) -> str:
+        """Текст в формате Prometheus exposition"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Глобальный реестр и метрики приложения
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.counter(
+    "http_requests_total", "Количество HTTP запросов", ("method", "handler", "status")
+)
+HTTP_DURATION = metrics.histogram(
+    "http_request_duration_seconds", "Длительность HTTP запросов", ("method", "handler")
+)
+HTTP_IN_FLIGHT = metrics.gauge(
+    "http_requests_in_flight", "HTTP запросы в обработке"
+)
+STAGE_DURATION = metrics.histogram(
+    "stage_duration_seconds", "Длительность внутренних этапов обработки", ("stage",)
+)
+OPENAI_TOKENS = metrics.counter(
+    "openai_tokens_total", "Токены OpenAI", ("model", "kind")
+)
+CACHE_REQUESTS = metrics.counter(
+    "cache_requests_total", "Обращения к кешам", ("cache", "result")
+)
+
+
+def _cache_hit_ratios() -> Dict[Tuple[str, ...], float]:
+    """Доля попаданий по каждому кешу"""
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), child in list(CACHE_REQUESTS._children.items()):
+        hits_total = totals.setdefault(cache, [0.0, 0.0])
+        if result == "hit":
+            hits_total[0] += child.value
+        hits_total[1] += child.value
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+metrics.callback_gauge("cache_hit_ratio", "Доля попаданий в кеш", ("cache",), _cache_hit_ratios)
+
+# Этапы текущего HTTP запроса (для заголовка Server-Timing).
+# Контекст копируется в run_in_threadpool, а список общий - этапы
+# из потоков пула попадают в запрос, который их запустил
+_request_stages: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_stages", default=None)
+
+
+@contextmanager
+def collect_stages():
+    """Собирать этапы, выполненные в текущем контексте (запросе)"""
+    stages: List[Tuple[str, float]] = []
+    token = _request_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _request_stages.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Замерить длительность этапа обработки"""
+    child = STAGE_DURATION.labels(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        child.observe(duration)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((name, duration))
+
+
+def record_cache(cache: str, hit: bool):
+    """Учесть обращение к кешу"""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_tokens(model: str, usage) -> None:
+    """Учесть токены из ответа OpenAI (response.usage)"""
+    if usage is None:
+        return
+    OPENAI_TOKENS.labels(model, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+    OPENAI_TOKENS.labels(model, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
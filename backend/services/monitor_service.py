@@ -0,0 +1,270 @@
+"""
+Плановый мониторинг сайтов конкурентов (COMPETITOR_URLS)
+
+Планировщик сам проверяет страницы конкурентов по расписанию, поэтому
+к приходу аналитиков свежие снимки, хронология и анализы изменений
+уже готовы и не считаются во время запроса:
+- у каждого URL свой интервал (MONITOR_INTERVAL_MINUTES или суффикс
+  "|минуты" в COMPETITOR_URLS); новые URL равномерно распределяются по
+  интервалу, а время каждой проверки смещается на случайную долю
+  интервала (MONITOR_JITTER) - проверки не собираются в одну минуту;
+- проверка - только загрузка страницы и запись в хронологию; анализ
+  моделью ставится в очередь фоновых задач (monitor_analyze) лишь
+  для изменившихся страниц;
+- расписание хранится в MONITOR_STATE_FILE: после перезапуска проверки
+  продолжаются по прежнему расписанию, а пропущенные за время простоя
+  снова распределяются по интервалу, а не выполняются все сразу;
+- в production планировщик запущен в каждом воркере сервера (и, если
+  нужно, отдельным процессом python -m backend.monitor), но проверки
+  выполняет только держатель аренды в shared_state.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.config import settings
+from backend.models.schemas import MonitorStatus, MonitorTarget
+from backend.services.job_service import JobQueueFullError, job_service
+from backend.services.parser_service import parser_service
+from backend.services.shared_state import atomic_write_text, file_lock, shared_state
+from backend.services.timeline_service import timeline_service
+
+# Имя аренды в shared_state: проверки выполняет один процесс
+LEASE_NAME = "monitor"
+# Тип фоновой задачи анализа изменившейся страницы (обработчик в backend.main)
+ANALYZE_JOB_TYPE = "monitor_analyze"
+
+
+def parse_targets(value: str, default_minutes: float) -> List[Tuple[str, float]]:
+    """
+    URL и интервалы проверки (секунды) из COMPETITOR_URLS
+
+    Формат: "https://a.by|60,https://b.by" - интервал в минутах
+    необязателен; неверный интервал заменяется интервалом по умолчанию.
+    """
+    targets: Dict[str, float] = {}
+    for entry in value.split(","):
+        url, _, minutes = entry.partition("|")
+        url = url.strip()
+        if not url:
+            continue
+        try:
+            interval = float(minutes) if minutes.strip() else default_minutes
+        except ValueError:
+            print(f"⚠️ Мониторинг: неверный интервал {minutes!r} для {url}, используется {default_minutes:g} мин")
+            interval = default_minutes
+        targets[timeline_service.normalize_url(url if "://" in url else f"https://{url}")] = max(1.0, interval) * 60
+    return list(targets.items())
+
+
+class MonitorService:
+    """Планировщик проверок сайтов конкурентов"""
+
+    def __init__(self):
+        self.enabled = settings.monitor_enabled
+        self.targets = parse_targets(settings.competitor_urls, settings.monitor_interval_minutes)
+        self.jitter = min(max(settings.monitor_jitter, 0.0), 0.5)
+        self.state_file = Path(settings.monitor_state_file)
+        self.tick_seconds = max(1, settings.monitor_tick_seconds)
+        self.job_priority = settings.monitor_job_priority
+        # Аренда переживает одну проверку (таймаут парсера) и несколько шагов планировщика
+        self.lease_seconds = max(self.tick_seconds * 3, parser_service.timeout * 3, 60)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+
+    # === Расписание ===
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        """Расписание по URL (пустое, если файла нет или он повреждён)"""
+        if not self.state_file.exists():
+            return {}
+        try:
+            state = json.loads(self.state_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Мониторинг: не удалось прочитать {self.state_file}: {e}")
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def _save_state(self, state: Dict[str, Dict[str, Any]]):
+        atomic_write_text(self.state_file, json.dumps(state, ensure_ascii=False, indent=2))
+
+    def _jittered(self, slot: float, interval: float) -> float:
+        """Время проверки: слот расписания со случайным смещением"""
+        return slot + random.uniform(-self.jitter, self.jitter) * interval
+
+    def _plan(self, state: Dict[str, Dict[str, Any]], now: float) -> Dict[str, Dict[str, Any]]:
+        """
+        Согласовать расписание с COMPETITOR_URLS
+
+        Новые URL и URL, проверка которых пропущена (сервер был
+        остановлен), получают слоты, равномерно распределённые по
+        интервалу начиная с текущего момента.
+        """
+        intervals = dict(self.targets)
+        planned = {url: entry for url, entry in state.items() if url in intervals}
+        fresh = []
+        for url, interval in self.targets:
+            entry = planned.setdefault(url, {"checks": 0})
+            if entry.get("interval") != interval:
+                entry["interval"] = interval
+                entry.pop("next_run", None)
+            if "next_run" not in entry or entry["next_run"] < now - 2 * self.tick_seconds:
+                fresh.append(url)
+        for index, url in enumerate(sorted(fresh, key=lambda url: planned[url].get("next_run", 0))):
+            interval = planned[url]["interval"]
+            slot = now + interval * index / len(fresh)
+            planned[url]["slot"] = slot
+            planned[url]["next_run"] = max(now, self._jittered(slot, interval))
+        return planned
+
+    # === Проверка ===
+
+    def check(self, url: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Проверить URL: загрузить страницу, записать в хронологию и, если
+        страница изменилась, отметить версию для анализа (pending)
+
+        Returns:
+            Обновлённая запись расписания
+        """
+        now = time.time()
+        entry["last_run"] = now
+        entry["checks"] = entry.get("checks", 0) + 1
+        parsed_data = parser_service.parse_url(url)
+        if parsed_data.get("error"):
+            entry.update(last_status="error", last_error=parsed_data["error"], changed_fields=[])
+        else:
+            timeline_entry = timeline_service.record(parsed_data)
+            changed = timeline_entry.version == 1 or bool(timeline_entry.changed_fields)
+            entry.update(
+                last_status="changed" if changed else "unchanged",
+                last_error=None,
+                version=timeline_entry.version,
+                changed_fields=timeline_entry.changed_fields
+            )
+            if changed:
+                entry["pending"] = {"version": timeline_entry.version, "changed_fields": timeline_entry.changed_fields}
+
+        # Следующий слот отсчитывается от расписания, а не от времени проверки:
+        # URL не смещаются друг к другу, случайный разброс не накапливается
+        interval = entry["interval"]
+        slot = entry.get("slot", now) + interval
+        if slot <= now:
+            slot = now + interval
+        entry["slot"] = slot
+        entry["next_run"] = self._jittered(slot, interval)
+        return entry
+
+    def _submit_analysis(self, url: str, entry: Dict[str, Any]):
+        """Поставить анализ изменившейся версии; при заполненной очереди - повтор на следующем шаге"""
+        pending = entry.get("pending")
+        if pending is None:
+            return
+        try:
+            job_service.submit(ANALYZE_JOB_TYPE, {"url": url, **pending}, self.job_priority)
+        except JobQueueFullError as e:
+            print(f"⚠️ Мониторинг: анализ {url} отложен: {e}")
+            return
+        except ValueError as e:
+            # Обработчик не зарегистрирован (процесс без backend.main) - анализ не ставится
+            print(f"⚠️ Мониторинг: анализ {url} не поставлен: {e}")
+        entry.pop("pending", None)
+
+    def run_due(self) -> int:
+        """
+        Выполнить проверки, время которых наступило (блокирующий вызов)
+
+        Returns:
+            Число выполненных проверок (0, если аренду держит другой процесс)
+        """
+        if not self.targets or not shared_state.acquire_lease(LEASE_NAME, self.owner, self.lease_seconds):
+            return 0
+        with file_lock(self.state_file):
+            state = self._plan(self._load_state(), time.time())
+            # Анализы, не поставленные раньше (очередь была заполнена)
+            for url, entry in state.items():
+                self._submit_analysis(url, entry)
+            self._save_state(state)
+
+        checked = 0
+        while True:
+            now = time.time()
+            due = sorted(
+                (url for url, entry in state.items() if entry["next_run"] <= now),
+                key=lambda url: state[url]["next_run"]
+            )
+            if not due:
+                break
+            # Аренда продлевается перед каждой проверкой; потеряли - проверки продолжит другой процесс
+            if not shared_state.acquire_lease(LEASE_NAME, self.owner, self.lease_seconds):
+                break
+            url = due[0]
+            state[url] = self.check(url, state[url])
+            self._submit_analysis(url, state[url])
+            checked += 1
+            with file_lock(self.state_file):
+                self._save_state(state)
+        return checked
+
+    def status(self) -> MonitorStatus:
+        """Расписание и результаты последних проверок"""
+        state = self._load_state()
+        targets = []
+        for url, interval in self.targets:
+            entry = state.get(url, {})
+            targets.append(MonitorTarget(
+                url=url,
+                interval_minutes=round(interval / 60, 2),
+                next_run=datetime.fromtimestamp(entry["next_run"]) if entry.get("next_run") else None,
+                last_run=datetime.fromtimestamp(entry["last_run"]) if entry.get("last_run") else None,
+                last_status=entry.get("last_status"),
+                last_error=entry.get("last_error"),
+                version=entry.get("version"),
+                changed_fields=entry.get("changed_fields", []),
+                checks=entry.get("checks", 0)
+            ))
+        return MonitorStatus(
+            enabled=self.enabled,
+            leader=shared_state.lease_owner(LEASE_NAME),
+            targets=targets
+        )
+
+    # === Фоновая задача ===
+
+    async def start(self, force: bool = False):
+        """
+        Запустить планировщик (при старте приложения)
+
+        Args:
+            force: Запустить, даже если MONITOR_ENABLED=false (python -m backend.monitor)
+        """
+        if not (self.enabled or force) or not self.targets:
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Остановить планировщик и освободить аренду"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await asyncio.to_thread(shared_state.release_lease, LEASE_NAME, self.owner)
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_due)
+            except Exception as e:
+                print(f"⚠️ Мониторинг: ошибка планировщика: {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+
+# Глобальный экземпляр
+monitor_service = MonitorService()
@@ -2,16 +2,26 @@
 Сервис для работы с OpenAI API
 """
 import base64
+import hashlib
 import json
+import os
 import re
-from typing import Optional
-from io import BytesIO
-
-from openai import OpenAI
-from PIL import Image
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Tuple, Union
 
 from backend.config import settings
-from backend.models.schemas import CompetitorAnalysis, ImageAnalysis
+from backend.models.schemas import CompetitorAnalysis, CompetitorComparison, ComparisonRow, ImageAnalysis
+from backend.services.circuit_service import CircuitOpenError, circuit_breakers
+from backend.services.cpu_service import cpu_pool, encode_image
+from backend.services.metrics_service import record_cache, record_tokens, stage
+from backend.services.shared_state import shared_state
+
+# Изображение: байты, путь к файлу или открытый файловый объект
+ImageSource = Union[bytes, str, Path, BinaryIO]
 
 
 class OpenAIService:
@@ -20,9 +30,81 @@ class OpenAIService:
     def __init__(self):
         if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY не установлен в .env файле")
-        self.client = OpenAI(api_key=settings.openai_api_key)
+        # Клиент создаётся при старте сервера или при первом запросе:
+        # импорт OpenAI SDK - самая долгая часть импорта backend
+        self._client = None
+        self._client_lock = threading.Lock()
         self.model = settings.openai_model
         self.vision_model = settings.openai_vision_model
+        self.cache_ttl = settings.analysis_cache_ttl
+        self.requests_per_minute = settings.openai_requests_per_minute
+        self.image_max_dimension = settings.image_max_dimension
+        self.image_max_pixels = settings.image_max_pixels
+        self.image_jpeg_quality = settings.image_jpeg_quality
+    
+    @property
+    def client(self):
+        """Клиент OpenAI"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(
+                        api_key=settings.openai_api_key,
+                        base_url=settings.openai_base_url or None,
+                        timeout=settings.openai_timeout,
+                        max_retries=settings.openai_max_retries
+                    )
+        return self._client
+    
+    def _acquire_budget(self, max_wait: float = 30.0):
+        """
+        Дождаться свободного места в лимите запросов к OpenAI
+        
+        Лимит общий для всех процессов сервера (хранится в shared_state).
+        """
+        if self.requests_per_minute <= 0:
+            return
+        deadline = time.monotonic() + max_wait
+        while not shared_state.consume_budget("openai", self.requests_per_minute, 60):
+            if time.monotonic() > deadline:
+                raise RuntimeError("Превышен лимит запросов к OpenAI. Повторите позже")
+            time.sleep(0.5)
+    
+    @staticmethod
+    def _is_outage(error: Exception) -> bool:
+        """Ошибка говорит о сбое OpenAI (а не о неверном запросе)"""
+        from openai import APIConnectionError, APIStatusError
+        if isinstance(error, APIStatusError):
+            return error.status_code >= 500 or error.status_code == 429
+        # APITimeoutError - подкласс APIConnectionError
+        return isinstance(error, APIConnectionError)
+    
+    def _create_completion(self, stage_name: str, **kwargs):
+        """
+        Запрос к OpenAI через circuit breaker и общий лимит запросов
+        
+        Raises:
+            CircuitOpenError: OpenAI недоступен - запрос отклонён сразу, без ожидания таймаута
+        """
+        breaker = circuit_breakers.openai
+        started = breaker.allow()
+        failed, reason = False, ""
+        try:
+            self._acquire_budget()
+            with stage(stage_name):
+                response = self.client.chat.completions.create(**kwargs)
+        except Exception as e:
+            failed, reason = self._is_outage(e), type(e).__name__
+            raise
+        finally:
+            breaker.record(started, failed, reason)
+        record_tokens(kwargs["model"], getattr(response, "usage", None))
+        return response
+    
+    def _cache_key(self, text: str) -> str:
+        """Ключ кеша анализа текста"""
+        return hashlib.sha256(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
     
     def analyze_text(self, text: str) -> Optional[CompetitorAnalysis]:
         """
@@ -34,6 +116,13 @@ class OpenAIService:
         Returns:
             CompetitorAnalysis или None при ошибке
         """
+        cache_key = self._cache_key(text)
+        if self.cache_ttl > 0:
+            cached = shared_state.cache_get("text_analysis", cache_key)
+            record_cache("text_analysis", cached is not None)
+            if cached is not None:
+                return CompetitorAnalysis(**cached)
+        
         prompt = f"""Проанализируй следующий текст конкурента в сфере авторского надзора за строительством объектов в Республике Беларусь и предоставь структурированный анализ в формате JSON.
 
 Текст для анализа:
@@ -59,7 +148,8 @@ class OpenAIService:
 Важно: верни ТОЛЬКО валидный JSON, без дополнительного текста."""
 
         try:
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
+                "llm",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "Ты эксперт по маркетинговому анализу и конкурентной разведке в сфере строительства и авторского надзора в Республике Беларусь. Знаешь специфику белорусского строительного рынка, нормативную базу (СНБ, ТКП), требования к лицензированию и особенности работы с государственными заказчиками. Всегда отвечай только валидным JSON."},
@@ -78,48 +168,230 @@ class OpenAIService:
             
             analysis_data = json.loads(content)
             
-            return CompetitorAnalysis(**analysis_data)
+            analysis = CompetitorAnalysis(**analysis_data)
+            if self.cache_ttl > 0:
+                shared_state.cache_set("text_analysis", cache_key, analysis.model_dump(), self.cache_ttl)
+            return analysis
             
         except json.JSONDecodeError as e:
             print(f"Ошибка парсинга JSON от OpenAI: {e}")
             print(f"Полученный ответ: {content[:500]}")
             return None
+        except CircuitOpenError:
+            raise
         except Exception as e:
             print(f"Ошибка при анализе текста: {e}")
             return None
     
-    def _image_to_base64(self, image_data: bytes) -> str:
-        """Конвертировать изображение в base64"""
-        # Проверяем и оптимизируем изображение
-        img = Image.open(BytesIO(image_data))
-        
-        # Конвертируем в RGB если нужно
-        if img.mode in ("RGBA", "P"):
-            background = Image.new("RGB", img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
-            img = background
-        
-        # Сохраняем в bytes
-        buffered = BytesIO()
-        img.save(buffered, format="JPEG", quality=85)
-        img_bytes = buffered.getvalue()
-        
-        return base64.b64encode(img_bytes).decode('utf-8')
+    def summarize_page(self, url: str, page: dict) -> Optional[str]:
+        """
+        Краткое резюме страницы сайта (этап map при обходе сайта)
+        
+        Args:
+            url: Адрес страницы
+            page: Извлечённое содержимое (title, h1, description, headings, text)
+            
+        Returns:
+            Несколько строк с ключевыми фактами или None при ошибке
+        """
+        parts = [
+            f"{label}: {page[key]}"
+            for label, key in (("Заголовок", "title"), ("H1", "h1"), ("Описание", "description"))
+            if page.get(key)
+        ]
+        if page.get("headings"):
+            parts.append("Разделы: " + "; ".join(page["headings"]))
+        if page.get("text"):
+            parts.append(f"Текст: {page['text']}")
+        if not parts:
+            return None
+        content = "\n".join(parts)
+        
+        cache_key = hashlib.sha256(f"{self.model}\npage\n{content}".encode("utf-8")).hexdigest()
+        if self.cache_ttl > 0:
+            cached = shared_state.cache_get("page_summary", cache_key)
+            record_cache("page_summary", cached is not None)
+            if cached is not None:
+                return cached
+        
+        prompt = f"""Страница сайта компании в сфере авторского надзора за строительством в Республике Беларусь: {url}
+
+{content}
+
+Выпиши 2-5 коротких пунктов с фактами о компании, которые есть на этой странице: услуги, цены и сроки, опыт и объекты, лицензии и аттестаты, гарантии, регионы работы, преимущества. Без вступления. Если полезных фактов нет, ответь одним словом: нет."""
+        
+        try:
+            response = self._create_completion(
+                "llm",
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "Ты аналитик, который кратко и точно извлекает факты о конкурентах из текста их сайтов."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+                max_tokens=300
+            )
+            summary = (response.choices[0].message.content or "").strip()
+            if summary.lower().rstrip(".") == "нет":
+                summary = ""
+            if self.cache_ttl > 0:
+                shared_state.cache_set("page_summary", cache_key, summary, self.cache_ttl)
+            return summary or None
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            print(f"Ошибка при резюме страницы {url}: {e}")
+            return None
     
-    def analyze_image(self, image_data: bytes, filename: str = "image.jpg") -> Optional[ImageAnalysis]:
+    def compare_competitors(self, competitors: List[Tuple[str, CompetitorAnalysis]]) -> Optional[CompetitorComparison]:
+        """
+        Сравнительная матрица по готовым анализам конкурентов (этап reduce)
+        
+        Args:
+            competitors: (имя, анализ) в порядке столбцов матрицы
+            
+        Returns:
+            CompetitorComparison (ячейки и позиции по порядку competitors) или None при ошибке
+        """
+        blocks = []
+        for number, (name, analysis) in enumerate(competitors, 1):
+            blocks.append(
+                f"[{number}] {name}\n"
+                f"Сильные стороны: {'; '.join(analysis.strengths) or '-'}\n"
+                f"Слабые стороны: {'; '.join(analysis.weaknesses) or '-'}\n"
+                f"Уникальные предложения: {'; '.join(analysis.unique_offers) or '-'}\n"
+                f"Резюме: {analysis.summary or '-'}"
+            )
+        content = "\n\n".join(blocks)
+        
+        cache_key = hashlib.sha256(f"{self.model}\ncompare\n{content}".encode("utf-8")).hexdigest()
+        if self.cache_ttl > 0:
+            cached = shared_state.cache_get("comparison", cache_key)
+            record_cache("comparison", cached is not None)
+            if cached is not None:
+                return CompetitorComparison(**cached)
+        
+        keys = ", ".join(f'"{number}"' for number in range(1, len(competitors) + 1))
+        prompt = f"""Сравни конкурентов в сфере авторского надзора за строительством в Республике Беларусь по их анализам.
+
+{content}
+
+Сопоставь сильные и слабые стороны и уникальные предложения: объедини похожие пункты разных конкурентов в один аспект (например, "Опыт с госзаказчиками") и для каждого конкурента кратко укажи, как у него обстоит дело с этим аспектом (пустая строка, если нет данных).
+
+Верни JSON объект со следующей структурой (ключи конкурентов: {keys}):
+{{
+    "matrix": [
+        {{"aspect": "аспект", "kind": "strength | weakness | offer", "cells": {{"1": "как у конкурента 1", "2": "как у конкурента 2"}}}}
+    ],
+    "positioning": {{"1": "позиция конкурента 1 на рынке относительно остальных", "2": "..."}},
+    "summary": "относительное позиционирование: кто лидирует и в чём, где свободные ниши"
+}}
+
+Важно: верни ТОЛЬКО валидный JSON, без дополнительного текста."""
+        
+        try:
+            response = self._create_completion(
+                "llm",
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "Ты эксперт по конкурентной разведке на строительном рынке Республики Беларусь. Сравниваешь компании объективно и по существу. Всегда отвечай только валидным JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.4,
+                max_tokens=3000
+            )
+            
+            content = response.choices[0].message.content.strip()
+            json_match = re.search(r'\{.*\}', content, re.DOTALL)
+            if json_match:
+                content = json_match.group(0)
+            data = json.loads(content)
+            
+            # Ячейки и позиции по номерам конкурентов -> списки по порядку столбцов
+            numbers = [str(number) for number in range(1, len(competitors) + 1)]
+            matrix = []
+            for row in data.get("matrix") or []:
+                cells = row.get("cells") or {}
+                if not isinstance(cells, dict) or not row.get("aspect"):
+                    continue
+                matrix.append(ComparisonRow(
+                    aspect=str(row["aspect"]),
+                    kind=row.get("kind") if row.get("kind") in ("strength", "weakness", "offer") else "strength",
+                    cells=[str(cells.get(number) or "") for number in numbers]
+                ))
+            positioning = data.get("positioning") or {}
+            if not isinstance(positioning, dict):
+                positioning = {}
+            comparison = CompetitorComparison(
+                matrix=matrix,
+                positioning=[str(positioning.get(number) or "") for number in numbers],
+                summary=str(data.get("summary") or "")
+            )
+            if self.cache_ttl > 0:
+                shared_state.cache_set("comparison", cache_key, comparison.model_dump(), self.cache_ttl)
+            return comparison
+            
+        except json.JSONDecodeError as e:
+            print(f"Ошибка парсинга JSON от OpenAI: {e}")
+            print(f"Полученный ответ: {content[:500]}")
+            return None
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            print(f"Ошибка при сравнении конкурентов: {e}")
+            return None
+    
+    def _image_to_base64(self, image: ImageSource) -> str:
+        """
+        Подготовить изображение для OpenAI и конвертировать в base64
+        
+        Уменьшение до image_max_dimension и перекодирование в JPEG
+        выполняются в пуле процессов (cpu_service.encode_image): путь к
+        файлу передаётся как есть, файловый объект (загрузка) копируется
+        блоками во временный файл, и в воркер передаётся его путь -
+        загрузка не читается в память целиком.
+        
+        Raises:
+            ValueError: Изображение слишком большое по числу пикселей
+            CpuPoolError: Процесс пула упал при перекодировании
+        """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return self._encode_image(bytes(image))
+        if isinstance(image, (str, Path)):
+            return self._encode_image(str(image))
+        
+        with tempfile.NamedTemporaryFile(prefix="upload_", delete=False) as f:
+            shutil.copyfileobj(image, f)
+        try:
+            return self._encode_image(f.name)
+        finally:
+            os.unlink(f.name)
+    
+    def _encode_image(self, source: Union[bytes, str]) -> str:
+        """Перекодировать изображение в пуле процессов и вернуть base64"""
+        with stage("image_encode"):
+            jpeg = cpu_pool.run(
+                encode_image, source,
+                self.image_max_dimension, self.image_max_pixels, self.image_jpeg_quality
+            )
+            return base64.b64encode(jpeg).decode('ascii')
+    
+    def analyze_image(self, image: ImageSource, filename: str = "image.jpg") -> Optional[ImageAnalysis]:
         """
         Анализ изображения
         
         Args:
-            image_data: Байты изображения
+            image: Изображение - байты, путь к файлу или файловый объект
             filename: Имя файла (для определения формата)
             
         Returns:
             ImageAnalysis или None при ошибке
+            
+        Raises:
+            ValueError: Изображение слишком большое
         """
+        base64_image = self._image_to_base64(image)
         try:
-            base64_image = self._image_to_base64(image_data)
-            
             prompt = """Проанализируй это изображение с точки зрения маркетинга и визуального стиля конкурента в сфере авторского надзора за строительством объектов в Республике Беларусь.
 
 Изображение может содержать:
@@ -149,7 +421,8 @@ class OpenAIService:
 - animation_potential - это текстовая оценка потенциала
 - Верни ТОЛЬКО валидный JSON, без дополнительного текста"""
 
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
+                "llm_vision",
                 model=self.vision_model,
                 messages=[
                     {
@@ -191,6 +464,8 @@ class OpenAIService:
             print(f"Ошибка парсинга JSON от OpenAI: {e}")
             print(f"Полученный ответ: {content[:500]}")
             return None
+        except CircuitOpenError:
+            raise
         except Exception as e:
             print(f"Ошибка при анализе изображения: {e}")
             return None
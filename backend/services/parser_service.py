@@ -1,27 +1,52 @@
 """
 Сервис для парсинга веб-страниц
 """
+import importlib.util
+import threading
+from types import SimpleNamespace
+
 import httpx
-from bs4 import BeautifulSoup
-from typing import Optional, Dict, List
-from urllib.parse import urljoin, urlparse
+from typing import Optional, Dict, List, Any
+from urllib.parse import urlparse
 
 from backend.config import settings
+from backend.services.circuit_service import CLOSED, CircuitOpenError, circuit_breakers
+from backend.services.cpu_service import cpu_pool, extract_content, extract_page
+from backend.services.metrics_service import stage
+
+# Selenium (опционально) импортируется при первом использовании: selenium
+# и webdriver_manager заметно замедляют импорт сервиса и старт воркеров
+SELENIUM_AVAILABLE = (
+    importlib.util.find_spec("selenium") is not None
+    and importlib.util.find_spec("webdriver_manager") is not None
+)
+_selenium: Optional[SimpleNamespace] = None
 
-# Selenium импорты (опционально)
-try:
-    from selenium import webdriver
-    from selenium.webdriver.chrome.service import Service
-    from selenium.webdriver.chrome.options import Options
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    from selenium.common.exceptions import TimeoutException, WebDriverException
-    from webdriver_manager.chrome import ChromeDriverManager
-    SELENIUM_AVAILABLE = True
-except ImportError:
-    SELENIUM_AVAILABLE = False
-    print("Предупреждение: Selenium не установлен. Установите: pip install selenium webdriver-manager")
+
+def _load_selenium() -> SimpleNamespace:
+    """Импортировать Selenium (один раз на процесс)"""
+    global _selenium
+    if _selenium is None:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        from webdriver_manager.chrome import ChromeDriverManager
+        _selenium = SimpleNamespace(
+            webdriver=webdriver,
+            Service=Service,
+            Options=Options,
+            By=By,
+            WebDriverWait=WebDriverWait,
+            EC=EC,
+            TimeoutException=TimeoutException,
+            WebDriverException=WebDriverException,
+            ChromeDriverManager=ChromeDriverManager,
+        )
+    return _selenium
 
 
 class ParserService:
@@ -34,10 +59,19 @@ class ParserService:
         self.selenium_timeout = settings.selenium_timeout
         self.selenium_headless = settings.selenium_headless
         self.selenium_wait_time = settings.selenium_wait_time
-        self.competitor_urls = [url.strip() for url in settings.competitor_urls.split(",") if url.strip()] if settings.competitor_urls else []
+        # Суффикс "|минуты" - интервал плановой проверки (monitor_service)
+        self.competitor_urls = [
+            entry.split("|", 1)[0].strip()
+            for entry in settings.competitor_urls.split(",")
+            if entry.split("|", 1)[0].strip()
+        ]
+        if settings.use_selenium and not SELENIUM_AVAILABLE:
+            print("Предупреждение: Selenium не установлен. Установите: pip install selenium webdriver-manager")
         
         # Инициализация Selenium драйвера (ленивая загрузка)
         self._driver = None
+        # Драйвер один на процесс и не потокобезопасен: страницы через него грузятся по очереди
+        self._driver_lock = threading.Lock()
     
     def _get_selenium_driver(self):
         """Получить или создать Selenium WebDriver"""
@@ -45,7 +79,8 @@ class ParserService:
             raise RuntimeError("Selenium не установлен")
         
         if self._driver is None:
-            chrome_options = Options()
+            selenium = _load_selenium()
+            chrome_options = selenium.Options()
             if self.selenium_headless:
                 chrome_options.add_argument("--headless")
             chrome_options.add_argument("--no-sandbox")
@@ -56,8 +91,8 @@ class ParserService:
             chrome_options.add_experimental_option('useAutomationExtension', False)
             
             try:
-                service = Service(ChromeDriverManager().install())
-                self._driver = webdriver.Chrome(service=service, options=chrome_options)
+                service = selenium.Service(selenium.ChromeDriverManager().install())
+                self._driver = selenium.webdriver.Chrome(service=service, options=chrome_options)
                 self._driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
             except Exception as e:
                 print(f"Ошибка инициализации Selenium: {e}")
@@ -65,6 +100,10 @@ class ParserService:
         
         return self._driver
     
+    def close(self):
+        """Освободить ресурсы (Selenium драйвер этого процесса)"""
+        self._close_selenium_driver()
+    
     def _close_selenium_driver(self):
         """Закрыть Selenium WebDriver"""
         if self._driver:
@@ -74,6 +113,36 @@ class ParserService:
                 pass
             self._driver = None
     
+    def _extract_content(self, html: str) -> Dict[str, Optional[str]]:
+        """
+        Извлечь title, h1 и первый абзац из HTML (в пуле процессов)
+        
+        Returns:
+            Словарь с title, h1, first_paragraph
+        """
+        with stage("parse"):
+            return cpu_pool.run(extract_content, html)
+    
+    def extract_page(self, html: str, base_url: str, max_text: int = 3000) -> Dict[str, Any]:
+        """
+        Извлечь ключевое содержимое страницы для обхода сайта (в пуле процессов)
+        
+        Returns:
+            Словарь с title, h1, description, headings (h2/h3), text
+            (основной текст без меню и подвала) и links (абсолютные URL
+            без якорей)
+        """
+        with stage("parse"):
+            return cpu_pool.run(extract_page, html, base_url, max_text)
+    
+    def request_headers(self) -> Dict[str, str]:
+        """Заголовки запросов к сайтам конкурентов"""
+        return {
+            "User-Agent": self.user_agent,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
+        }
+    
     def parse_url_with_selenium(self, url: str) -> Dict[str, Optional[str]]:
         """
         Парсинг веб-страницы с использованием Selenium (для JS-контента)
@@ -84,55 +153,25 @@ class ParserService:
         Returns:
             Словарь с title, h1, first_paragraph
         """
+        selenium = _load_selenium()
         driver = None
         try:
-            driver = self._get_selenium_driver()
-            driver.set_page_load_timeout(self.selenium_timeout)
-            driver.get(url)
-            
-            # Ждем загрузки контента
-            WebDriverWait(driver, self.selenium_wait_time).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # Получаем HTML после выполнения JavaScript
-            page_source = driver.page_source
-            soup = BeautifulSoup(page_source, 'lxml')
-            
-            # Извлекаем данные
-            title_tag = soup.find('title')
-            title = title_tag.get_text(strip=True) if title_tag else None
-            
-            h1_tag = soup.find('h1')
-            h1 = h1_tag.get_text(strip=True) if h1_tag else None
-            
-            first_paragraph = None
-            content_selectors = ['article', 'main', '[role="main"]', 'body']
-            for selector in content_selectors:
-                content_area = soup.select_one(selector)
-                if content_area:
-                    paragraph = content_area.find('p')
-                    if paragraph:
-                        first_paragraph = paragraph.get_text(strip=True)
-                        if len(first_paragraph) > 500:
-                            first_paragraph = first_paragraph[:500] + "..."
-                        break
-            
-            if not first_paragraph:
-                paragraph = soup.find('p')
-                if paragraph:
-                    first_paragraph = paragraph.get_text(strip=True)
-                    if len(first_paragraph) > 500:
-                        first_paragraph = first_paragraph[:500] + "..."
+            with stage("selenium_fetch"), self._driver_lock:
+                driver = self._get_selenium_driver()
+                driver.set_page_load_timeout(self.selenium_timeout)
+                driver.get(url)
+                
+                # Ждем загрузки контента
+                selenium.WebDriverWait(driver, self.selenium_wait_time).until(
+                    selenium.EC.presence_of_element_located((selenium.By.TAG_NAME, "body"))
+                )
+                
+                # Получаем HTML после выполнения JavaScript
+                page_source = driver.page_source
             
-            return {
-                "url": url,
-                "title": title,
-                "h1": h1,
-                "first_paragraph": first_paragraph
-            }
+            return {"url": url, **self._extract_content(page_source)}
             
-        except TimeoutException:
+        except selenium.TimeoutException:
             return {
                 "url": url,
                 "title": None,
@@ -140,7 +179,7 @@ class ParserService:
                 "first_paragraph": None,
                 "error": "Timeout при загрузке страницы через Selenium"
             }
-        except WebDriverException as e:
+        except selenium.WebDriverException as e:
             return {
                 "url": url,
                 "title": None,
@@ -176,84 +215,59 @@ class ParserService:
         # Определяем, использовать ли Selenium
         should_use_selenium = use_selenium if use_selenium is not None else self.use_selenium
         
+        # Хост недавно не отвечал: ошибка сразу, без ожидания таймаута
+        breaker = circuit_breakers.host(url)
+        try:
+            started = breaker.allow()
+        except CircuitOpenError as e:
+            return {
+                "url": url,
+                "title": None,
+                "h1": None,
+                "first_paragraph": None,
+                "error": str(e)
+            }
+        
         # Если нужно использовать Selenium и он доступен
         if should_use_selenium and SELENIUM_AVAILABLE:
-            return self.parse_url_with_selenium(url)
+            result = self.parse_url_with_selenium(url)
+            breaker.record(started, bool(result.get("error")), result.get("error") or "")
+            return result
         
         # Иначе используем httpx (стандартный метод)
-        headers = {
-            "User-Agent": self.user_agent,
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
-        }
+        headers = self.request_headers()
+        # Сбой хоста (таймаут, соединение, 5xx) - для circuit breaker
+        failure = None
         
         try:
-            with httpx.Client(timeout=self.timeout, follow_redirects=True) as client:
-                response = client.get(url, headers=headers)
-                response.raise_for_status()
-                
-                # httpx автоматически декодирует response.text на основе заголовков
-                # Если кодировка не указана, использует utf-8 по умолчанию
-                soup = BeautifulSoup(response.text, 'lxml')
-                
-                # Извлекаем title
-                title_tag = soup.find('title')
-                title = title_tag.get_text(strip=True) if title_tag else None
-                
-                # Извлекаем h1
-                h1_tag = soup.find('h1')
-                h1 = h1_tag.get_text(strip=True) if h1_tag else None
-                
-                # Извлекаем первый абзац (из основного контента)
-                first_paragraph = None
-                
-                # Пробуем найти основной контент (article, main, или body)
-                content_selectors = ['article', 'main', '[role="main"]', 'body']
-                for selector in content_selectors:
-                    content_area = soup.select_one(selector)
-                    if content_area:
-                        # Ищем первый параграф
-                        paragraph = content_area.find('p')
-                        if paragraph:
-                            first_paragraph = paragraph.get_text(strip=True)
-                            # Ограничиваем длину
-                            if len(first_paragraph) > 500:
-                                first_paragraph = first_paragraph[:500] + "..."
-                            break
-                
-                # Если не нашли, берем первый p из body
-                if not first_paragraph:
-                    paragraph = soup.find('p')
-                    if paragraph:
-                        first_paragraph = paragraph.get_text(strip=True)
-                        if len(first_paragraph) > 500:
-                            first_paragraph = first_paragraph[:500] + "..."
-                
-                return {
-                    "url": url,
-                    "title": title,
-                    "h1": h1,
-                    "first_paragraph": first_paragraph
-                }
+            with stage("fetch"):
+                with httpx.Client(timeout=self.timeout, follow_redirects=True) as client:
+                    response = client.get(url, headers=headers)
+            if response.status_code >= 500:
+                failure = f"HTTP {response.status_code}"
+            response.raise_for_status()
+            # httpx автоматически декодирует response.text на основе заголовков
+            # Если кодировка не указана, использует utf-8 по умолчанию
+            return {"url": url, **self._extract_content(response.text)}
                 
         except httpx.TimeoutException:
-            # Если httpx не сработал и Selenium доступен, пробуем Selenium как fallback
-            if SELENIUM_AVAILABLE and not should_use_selenium:
-                return self.parse_url_with_selenium(url)
+            failure = "таймаут"
+        except httpx.HTTPStatusError as e:
             return {
                 "url": url,
                 "title": None,
                 "h1": None,
                 "first_paragraph": None,
-                "error": "Timeout при загрузке страницы"
+                "error": f"HTTP ошибка {e.response.status_code}"
             }
-        except httpx.HTTPStatusError as e:
+        except httpx.TransportError as e:
+            failure = f"ошибка соединения ({type(e).__name__})"
             return {
                 "url": url,
                 "title": None,
                 "h1": None,
                 "first_paragraph": None,
-                "error": f"HTTP ошибка {e.response.status_code}"
+                "error": f"Ошибка парсинга: {str(e)}"
             }
         except Exception as e:
             return {
@@ -263,6 +277,19 @@ class ParserService:
                 "first_paragraph": None,
                 "error": f"Ошибка парсинга: {str(e)}"
             }
+        finally:
+            breaker.record(started, failure is not None, failure or "")
+        
+        # Таймаут: пробуем Selenium как fallback, пока хост не признан недоступным
+        if SELENIUM_AVAILABLE and not should_use_selenium and breaker.state == CLOSED:
+            return self.parse_url_with_selenium(url)
+        return {
+            "url": url,
+            "title": None,
+            "h1": None,
+            "first_paragraph": None,
+            "error": "Timeout при загрузке страницы"
+        }
     
     def parse_competitor_urls(self) -> List[Dict[str, Optional[str]]]:
         """
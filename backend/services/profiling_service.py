@@ -0,0 +1,179 @@
+"""
+Профилирование отдельных запросов
+
+По запросу администратора (заголовок X-Profile или параметр ?profile=1
+вместе с X-Admin-Token) работа запроса в пуле потоков выполняется под
+профилировщиком: pyinstrument, если установлен, иначе cProfile.
+Отчёт сохраняется в PROFILES_DIR, его id возвращается в X-Profile-Id.
+Медленный запрос можно разобрать, не воспроизводя его.
+
+Профилируемые вызовы выполняются по одному: с Python 3.12 cProfile
+работает через sys.monitoring, где профилировщик один на процесс, и
+второй одновременный запрос не смог бы его включить.
+"""
+import cProfile
+import hmac
+import io
+import pstats
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+from backend.config import settings
+from backend.services.shared_state import atomic_write_text
+
+try:
+    from pyinstrument import Profiler
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+    PYINSTRUMENT_AVAILABLE = False
+
+# Сколько строк статистики cProfile попадает в отчёт
+CPROFILE_LINES = 60
+
+_PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Профилируемые вызовы разных запросов не пересекаются
+_profiler_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Отчёты профилировщика, собранные за один запрос"""
+
+    def __init__(self):
+        self.reports: List[str] = []
+        self._lock = threading.Lock()
+
+    def add(self, title: str, report: str):
+        with self._lock:
+            self.reports.append(f"=== {title} ===\n{report}")
+
+
+# Профиль текущего запроса (None - профилирование не запрошено)
+_active_profile: ContextVar[Optional[RequestProfile]] = ContextVar("active_profile", default=None)
+
+
+class ProfilingService:
+    """Профилирование запросов по требованию администратора"""
+
+    def __init__(self):
+        self.admin_token = settings.admin_token
+        self.profiles_dir = Path(settings.profiles_dir)
+        self.keep = max(1, settings.profiles_keep)
+
+    @property
+    def enabled(self) -> bool:
+        """Профилирование доступно только при заданном ADMIN_TOKEN"""
+        return bool(self.admin_token)
+
+    def is_authorized(self, token: Optional[str]) -> bool:
+        """Проверить токен администратора"""
+        if not self.enabled or not token:
+            return False
+        return hmac.compare_digest(token.encode("utf-8"), self.admin_token.encode("utf-8"))
+
+    @staticmethod
+    def is_requested(scope) -> bool:
+        """Запрошено ли профилирование (заголовок X-Profile или ?profile=1)"""
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile" and value not in (b"", b"0", b"false"):
+                return True
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get("profile", ["0"])[0] not in ("", "0", "false")
+
+    @contextmanager
+    def capture(self):
+        """Профилировать работу текущего запроса в пуле потоков"""
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        try:
+            yield profile
+        finally:
+            _active_profile.reset(token)
+
+    @staticmethod
+    def _call_profiled(profile: RequestProfile, func, *args, **kwargs):
+        """Выполнить функцию под профилировщиком и сохранить отчёт"""
+        title = getattr(func, "__name__", repr(func))
+        with _profiler_lock:
+            if PYINSTRUMENT_AVAILABLE:
+                profiler = Profiler()
+                profiler.start()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    profiler.stop()
+                    profile.add(title, profiler.output_text(unicode=True, color=False))
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                stream = io.StringIO()
+                pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(CPROFILE_LINES)
+                profile.add(title, stream.getvalue())
+
+    async def run_in_threadpool(self, func, *args, **kwargs):
+        """run_in_threadpool, который профилирует вызов, если это запрошено"""
+        profile = _active_profile.get()
+        if profile is None:
+            return await _run_in_threadpool(func, *args, **kwargs)
+        return await _run_in_threadpool(self._call_profiled, profile, func, *args, **kwargs)
+
+    # === Хранение отчётов ===
+
+    def save(self, profile: RequestProfile, method: str, path: str, server_timing: str) -> Optional[str]:
+        """
+        Сохранить отчёт запроса
+
+        Returns:
+            id отчёта или None, если в запросе не было работы в пуле потоков
+        """
+        if not profile.reports:
+            return None
+        profile_id = uuid.uuid4().hex
+        header = (
+            f"{method} {path}\n"
+            f"time: {datetime.now().isoformat()}\n"
+            f"profiler: {'pyinstrument' if PYINSTRUMENT_AVAILABLE else 'cProfile'}\n"
+            f"server-timing: {server_timing}\n\n"
+        )
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(self.profiles_dir / f"{profile_id}.txt", header + "\n\n".join(profile.reports))
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        """Оставить только последние PROFILES_KEEP отчётов"""
+        files = sorted(self.profiles_dir.glob("*.txt"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in files[self.keep:]:
+            old.unlink(missing_ok=True)
+
+    def list_profiles(self) -> List[str]:
+        """id сохранённых отчётов (новые первыми)"""
+        if not self.profiles_dir.exists():
+            return []
+        files = sorted(self.profiles_dir.glob("*.txt"), key=lambda p: p.stat().st_mtime, reverse=True)
+        return [p.stem for p in files]
+
+    def load(self, profile_id: str) -> Optional[str]:
+        """Текст отчёта по id"""
+        if not _PROFILE_ID_RE.match(profile_id):
+            return None
+        path = self.profiles_dir / f"{profile_id}.txt"
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+
+# Глобальный экземпляр
+profiling_service = ProfilingService()
+run_in_threadpool = profiling_service.run_in_threadpool
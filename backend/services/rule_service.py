@@ -0,0 +1,284 @@
+"""
+Локальные правила: факты о конкуренте без обращения к модели
+
+Детерминированные факты ("ссылается на СНБ/ТКП", "указаны цены",
+"есть номер аттестата", "работает с госзаказчиками") не требуют LLM.
+Однословные ключевые слова всех правил компилируются в один автомат
+(один проход по тексту независимо от числа правил). Regex-правила и
+ключевые фразы из нескольких слов компилируются в одно выражение на
+правило: совпадения разных правил могут перекрываться, и каждое
+правило должно увидеть свои.
+
+Ключевые слова - основы слов: "лиценз" находит "лицензия", "лицензии"
+и т.д. (совпадение должно начинаться с начала слова); в фразах основой
+может быть каждое слово: "государственн заказчик" находит
+"государственными заказчиками". Текст перед
+проверкой нормализуется (нижний регистр, ё -> е, одиночные пробелы),
+поэтому и ключевые слова, и regex-правила пишутся в нижнем регистре.
+Дополнительные правила загружаются из JSON-файла RULES_FILE:
+[{"id": "bim", "label": "BIM", "keywords": ["bim", "revit"], "patterns": []}]
+"""
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.config import settings
+from backend.models.schemas import RuleFact, RuleInfo
+
+logger = logging.getLogger(__name__)
+
+# Сколько примеров совпадений возвращать по каждому правилу
+MAX_MATCHES_PER_RULE = 5
+
+# Встроенные правила: специфика авторского надзора и строительства в Беларуси
+DEFAULT_RULES = [
+    {
+        "id": "norms",
+        "label": "Ссылается на нормативы (СНБ, ТКП, СН, СТБ)",
+        "keywords": ["снб", "ткп", "снип", "стб", "нормативн", "технический кодекс", "строительные нормы"],
+        "patterns": [r"\b(?:снб|ткп|снип|сн|стб)\s*(?:en\s*)?\d[\d.\-/]*"],
+    },
+    {
+        "id": "prices",
+        "label": "Указаны цены",
+        "keywords": ["цена", "цены", "ценам", "ценах", "ценой", "ценообраз", "стоимост", "прайс", "тариф", "смет"],
+        "patterns": [r"\d[\d\s]*(?:[.,]\d+)?\s*(?:руб\b|руб\.|р\.|byn|бел\.\s*руб)"],
+    },
+    {
+        "id": "license",
+        "label": "Лицензии и аттестаты",
+        "keywords": ["лиценз", "аттестат", "допуск", "свидетельство о", "квалификационн"],
+        "patterns": [r"(?:аттестат\w*|лицензи\w*|свидетельств\w*)\s+(?:соответствия\s+)?№\s*[\w\-/.]+"],
+    },
+    {
+        "id": "state_customers",
+        "label": "Работа с государственными заказчиками",
+        "keywords": [
+            "госзаказ", "государственн заказчик", "государственных заказчик", "бюджетн",
+            "госпрограмм", "тендер", "госзакуп", "icetrade", "государственн программ",
+        ],
+        "patterns": [],
+    },
+    {
+        "id": "experience",
+        "label": "Опыт работы",
+        "keywords": ["опыт работы", "лет на рынке", "лет опыта", "реализованн объект", "выполненн объект"],
+        "patterns": [r"(?:более|свыше|опыт\w*)\s+\d+\s*(?:лет|год)", r"\b(?:с|since)\s+(?:19|20)\d{2}\s*(?:года|г\.)"],
+    },
+    {
+        "id": "guarantees",
+        "label": "Гарантии",
+        "keywords": ["гарант", "страхован"],
+        "patterns": [],
+    },
+    {
+        "id": "deadlines",
+        "label": "Указаны сроки",
+        "keywords": ["срок"],
+        "patterns": [r"\d+\s*(?:рабочих\s+|календарных\s+)?(?:дн(?:я|ей|и)?|недел[ьию]|месяц(?:а|ев)?)\b"],
+    },
+    {
+        "id": "regions",
+        "label": "Регионы работы",
+        "keywords": [
+            "минск", "брест", "гродн", "гомел", "могил", "витебск",
+            "по всей беларус", "по всей республик", "по всей стране",
+        ],
+        "patterns": [],
+    },
+    {
+        "id": "certification",
+        "label": "Сертификация системы менеджмента",
+        "keywords": ["iso 9001", "стб iso", "система менеджмента качества", "смк"],
+        "patterns": [],
+    },
+    {
+        "id": "bim",
+        "label": "BIM и цифровые технологии",
+        "keywords": ["bim", "revit", "информационн моделир", "цифров модел", "archicad"],
+        "patterns": [],
+    },
+    {
+        "id": "contacts",
+        "label": "Контактный телефон",
+        "keywords": [],
+        "patterns": [r"\+375\s*\(?\d{2}\)?\s*\d{3}[\s\-]?\d{2}[\s\-]?\d{2}"],
+    },
+]
+
+_WORD_TAIL = re.compile(r"\w*")
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е, пробельные символы -> один пробел"""
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+def phrase_pattern(phrase: str) -> str:
+    """
+    Регулярное выражение ключевой фразы: после каждой основы допускается
+    окончание слова
+
+    Начало слова проверяется ретроспективой после первой основы, а не
+    перед ней: выражение начинается с литерала, и re ищет его быстро.
+    """
+    first, *rest = phrase.split()
+    return (
+        re.escape(first) + rf"(?<!\w.{{{len(first)}}})"
+        + "".join(r"\w*\s+" + re.escape(word) for word in rest) + r"\w*"
+    )
+
+
+class KeywordAutomaton:
+    """
+    Все ключевые слова за один проход по тексту
+
+    Ключевые слова собираются в префиксное дерево, а дерево - в одно
+    регулярное выражение с привязкой к началу слова: проход по тексту
+    выполняет C-движок re (автомат Aho-Corasick на чистом Python
+    в несколько раз медленнее). Выражение находит самое длинное ключевое
+    слово в позиции, остальные с тем же началом ("смет" для "сметн")
+    берутся из заранее построенной таблицы префиксов.
+    """
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = keywords
+        # Узел дерева: символ -> узел; ключ "" - слово заканчивается здесь
+        trie: Dict[str, Any] = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        # Ключевое слово -> индексы всех ключевых слов, которые являются его префиксами
+        self._prefixes: Dict[str, List[int]] = {
+            keyword: [index for index, other in enumerate(keywords) if keyword.startswith(other)]
+            for keyword in keywords
+        }
+        # Просмотр вперёд: совпадения, начинающиеся внутри другого, тоже находятся
+        self._pattern = re.compile(r"(?<!\w)(?=(" + self._trie_regex(trie) + "))") if keywords else None
+
+    @classmethod
+    def _trie_regex(cls, node: Dict[str, Any]) -> str:
+        """Регулярное выражение поддерева: общие префиксы не повторяются"""
+        branches = [re.escape(char) + cls._trie_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Жадный необязательный хвост: предпочитается самое длинное слово
+        return f"(?:{body})?" if "" in node else body
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """(индекс ключевого слова, начало) для всех вхождений с начала слова"""
+        if self._pattern is None:
+            return
+        prefixes = self._prefixes
+        for match in self._pattern.finditer(text):
+            start = match.start()
+            for index in prefixes[match.group(1)]:
+                yield index, start
+
+
+class RuleEngine:
+    """Скомпилированный набор правил"""
+
+    def __init__(self, rules: Optional[List[dict]] = None):
+        self.rules = rules if rules is not None else DEFAULT_RULES + self._load_rules_file(settings.rules_file)
+        keywords: List[str] = []
+        # Правило каждого ключевого слова (по индексу в автомате)
+        self._keyword_rule: List[int] = []
+        # (индекс правила, выражение): regex-правила и ключевые фразы
+        self._patterns: List[Tuple[int, "re.Pattern[str]"]] = []
+        for rule_index, rule in enumerate(self.rules):
+            patterns = []
+            for keyword in rule.get("keywords", []):
+                keyword = normalize(keyword)
+                if " " in keyword:
+                    patterns.append(phrase_pattern(keyword))
+                elif keyword:
+                    keywords.append(keyword)
+                    self._keyword_rule.append(rule_index)
+            for pattern in rule.get("patterns", []):
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    logger.warning("Правило %s: неверное регулярное выражение %r пропущено: %s", rule["id"], pattern, e)
+                    continue
+                patterns.append(pattern)
+            if patterns:
+                # Текст уже в нижнем регистре: без IGNORECASE regex заметно быстрее
+                self._patterns.append((rule_index, re.compile("|".join(f"(?:{pattern})" for pattern in patterns))))
+        self._keywords = KeywordAutomaton(keywords)
+
+    @staticmethod
+    def _load_rules_file(path: str) -> List[dict]:
+        """Дополнительные правила из JSON-файла (список правил)"""
+        if not path:
+            return []
+        try:
+            rules = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось загрузить правила из %s: %s", path, e)
+            return []
+        return [rule for rule in rules if isinstance(rule, dict) and rule.get("id")]
+
+    def info(self) -> List[RuleInfo]:
+        """Описание загруженных правил"""
+        return [
+            RuleInfo(
+                id=rule["id"],
+                label=rule.get("label") or rule["id"],
+                keywords=list(rule.get("keywords", [])),
+                patterns=list(rule.get("patterns", []))
+            )
+            for rule in self.rules
+        ]
+
+    def evaluate(self, text: Optional[str]) -> List[RuleFact]:
+        """
+        Найти факты в тексте
+
+        Args:
+            text: Извлечённый текст (страница, реклама и т.п.)
+
+        Returns:
+            Сработавшие правила в порядке их объявления: число совпадений
+            и до MAX_MATCHES_PER_RULE различных примеров
+        """
+        if not text:
+            return []
+        counts: Dict[int, int] = {}
+        examples: Dict[int, List[str]] = {}
+
+        def found(rule_index: int, value: str):
+            counts[rule_index] = counts.get(rule_index, 0) + 1
+            values = examples.setdefault(rule_index, [])
+            if len(values) < MAX_MATCHES_PER_RULE and value not in values:
+                values.append(value)
+
+        normalized = normalize(text)
+        keywords = self._keywords.keywords
+        for keyword_index, start in self._keywords.iter_matches(normalized):
+            # Основа слова -> слово целиком
+            end = _WORD_TAIL.match(normalized, start + len(keywords[keyword_index])).end()
+            found(self._keyword_rule[keyword_index], normalized[start:end])
+
+        for rule_index, pattern in self._patterns:
+            for match in pattern.finditer(normalized):
+                found(rule_index, match.group().strip())
+
+        return [
+            RuleFact(
+                rule=self.rules[rule_index]["id"],
+                label=self.rules[rule_index].get("label") or self.rules[rule_index]["id"],
+                count=counts[rule_index],
+                matches=examples[rule_index]
+            )
+            for rule_index in sorted(counts)
+        ]
+
+
+# Глобальный экземпляр
+rule_engine = RuleEngine()
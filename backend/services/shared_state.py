@@ -0,0 +1,263 @@
+"""
+Разделяемое между процессами состояние
+
+В production-режиме сервер работает в нескольких процессах, поэтому
+кеши и лимиты запросов хранятся не в памяти процесса, а в SQLite,
+а запись файлов выполняется под межпроцессной блокировкой.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, List, Optional
+
+from backend.config import settings
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# Блокировки потоков по пути lock-файла
+_thread_locks: dict = {}
+
+
+@contextmanager
+def file_lock(path: Path):
+    """
+    Межпроцессная блокировка на основе lock-файла
+
+    Также сериализует потоки одного процесса: flock не различает
+    потоки, поэтому дополнительно используется threading.Lock.
+    """
+    lock_path = Path(f"{path}.lock")
+    thread_lock = _thread_locks.setdefault(str(lock_path), threading.Lock())
+    with thread_lock:
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "a+b") as f:
+            if os.name == "nt":
+                f.seek(0)
+                # LK_LOCK повторяет попытку в течение ~10 секунд
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+                try:
+                    yield
+                finally:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write_text(path: Path, content: str):
+    """Записать файл атомарно: читатели видят либо старую, либо новую версию"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(content, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+class SharedState:
+    """Кеш и лимиты запросов, общие для всех процессов сервера"""
+
+    def __init__(self):
+        self.db_file = Path(settings.shared_state_file)
+        # База создаётся при старте сервера (init) или при первом обращении,
+        # а не при импорте модуля
+        self._db_ready = False
+
+    @contextmanager
+    def _connect(self):
+        """Открыть соединение с базой состояния"""
+        conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+        try:
+            if not self._db_ready:
+                self._init_db(conn)
+            yield conn
+        finally:
+            conn.close()
+
+    def init(self):
+        """Подготовить базу состояния (вызывается при старте сервера)"""
+        with self._connect():
+            pass
+
+    def _init_db(self, conn: sqlite3.Connection):
+        """Создать таблицы если их нет"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS budgets (
+                name TEXT PRIMARY KEY,
+                window_start REAL NOT NULL,
+                used INTEGER NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                ts TEXT NOT NULL
+            )
+        """)
+        self._db_ready = True
+
+    # === Кеш ===
+
+    def cache_get(self, namespace: str, key: str) -> Optional[Any]:
+        """Получить значение из кеша (None если нет или истекло)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def cache_set(self, namespace: str, key: str, value: Any, ttl: int):
+        """Сохранить значение в кеш на ttl секунд"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False, default=str), now + ttl)
+            )
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+
+    # === Лимиты запросов ===
+
+    def consume_budget(self, name: str, limit: int, window_seconds: float) -> bool:
+        """
+        Израсходовать единицу лимита в фиксированном окне
+
+        Returns:
+            True если лимит не исчерпан
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT window_start, used FROM budgets WHERE name = ?", (name,)).fetchone()
+                if row is None or now - row[0] >= window_seconds:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO budgets (name, window_start, used) VALUES (?, ?, 1)",
+                        (name, now)
+                    )
+                    allowed = True
+                elif row[1] < limit:
+                    conn.execute("UPDATE budgets SET used = used + 1 WHERE name = ?", (name,))
+                    allowed = True
+                else:
+                    allowed = False
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return allowed
+
+    # === Аренда (одна фоновая задача на все процессы) ===
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Взять или продлить аренду на ttl секунд
+
+        Аренда свободна, если её никто не брал, её держит owner или срок
+        истёк (процесс-владелец упал, не освободив её).
+
+        Returns:
+            True если аренда принадлежит owner
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+                acquired = row is None or row[0] == owner or row[1] < now
+                if acquired:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                        (name, owner, now + ttl)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return acquired
+
+    def release_lease(self, name: str, owner: str):
+        """Освободить аренду, если её держит owner"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def lease_owner(self, name: str) -> Optional[str]:
+        """Текущий владелец аренды (None если свободна)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None and row[1] >= time.time() else None
+
+    # === События ===
+
+    # Сколько последних событий хранится (для переподключения клиентов)
+    events_keep = 1000
+
+    def append_event(self, event_type: str, data: Any, origin: str, ts: str) -> int:
+        """Записать событие, вернуть его номер (общий для всех процессов)"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO events (type, data, origin, ts) VALUES (?, ?, ?, ?)",
+                (event_type, json.dumps(data, ensure_ascii=False, default=str), origin, ts)
+            )
+            event_id = cursor.lastrowid
+            if event_id % 100 == 0:
+                conn.execute("DELETE FROM events WHERE id <= ?", (event_id - self.events_keep,))
+        return event_id
+
+    def events_after(self, last_id: int, limit: int = 500) -> List[dict]:
+        """События с номером больше last_id (по возрастанию)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, type, data, origin, ts FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, limit)
+            ).fetchall()
+        return [
+            {"id": row[0], "type": row[1], "data": json.loads(row[2]), "origin": row[3], "ts": row[4]}
+            for row in rows
+        ]
+
+    def last_event_id(self) -> int:
+        """Номер последнего события (0 если событий нет)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+
+# Глобальный экземпляр
+shared_state = SharedState()
@@ -0,0 +1,271 @@
+"""
+Сервис хронологии изменений сайтов конкурентов
+
+Каждая проверка URL сохраняется строкой в JSONL-файле этого URL.
+Полный снимок (keyframe) пишется раз в N проверок, остальные строки
+хранят только дельту относительно предыдущего снимка: изменённые поля
+и, для текстов, компактный патч. Поэтому годы ежедневных проверок
+занимают на диске килобайты, а любая версия восстанавливается
+применением не более N дельт к ближайшему keyframe.
+"""
+import difflib
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+
+from backend.config import settings
+from backend.models.schemas import CompetitorSnapshot, FieldChange, TimelineEntry
+from backend.services.metrics_service import stage
+from backend.services.shared_state import file_lock
+
+# Поля, изменения которых отслеживаются
+TRACKED_FIELDS = ("title", "h1", "first_paragraph")
+
+
+class TimelineService:
+    """Хранение и восстановление снимков страниц конкурентов"""
+
+    def __init__(self):
+        self.timeline_dir = Path(settings.timeline_dir)
+        self.keyframe_interval = max(1, settings.timeline_keyframe_interval)
+        # Последний снимок по URL: избавляет от чтения файла при каждой записи.
+        # Проверяется по размеру файла, поэтому записи других процессов не теряются
+        self._tail_cache: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """Привести URL к единому виду (ключ хронологии)"""
+        url = url.strip()
+        if not urlparse(url).scheme:
+            url = f"https://{url}"
+        parsed = urlparse(url)
+        path = parsed.path.rstrip("/")
+        return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), path, "", parsed.query, ""))
+
+    def _timeline_file(self, url: str) -> Path:
+        """Файл хронологии для нормализованного URL"""
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+        return self.timeline_dir / f"{digest}.jsonl"
+
+    def _load_records(self, path: Path) -> List[dict]:
+        """Прочитать все записи хронологии"""
+        if not path.exists():
+            return []
+        records = []
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Оборванная последняя строка (например, при аварийной остановке)
+                    continue
+        return records
+
+    # === Дельты ===
+
+    @staticmethod
+    def _text_patch(old: str, new: str) -> List[list]:
+        """Компактный патч: список [начало, конец, замена] по индексам старого текста"""
+        matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+        return [
+            [i1, i2, new[j1:j2]]
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+            if tag != "equal"
+        ]
+
+    @staticmethod
+    def _apply_patch(old: str, patch: List[list]) -> str:
+        """Применить патч к тексту"""
+        parts = []
+        position = 0
+        for start, end, replacement in patch:
+            parts.append(old[position:start])
+            parts.append(replacement)
+            position = end
+        parts.append(old[position:])
+        return "".join(parts)
+
+    def _make_delta(self, previous: Dict[str, Optional[str]], current: Dict[str, Optional[str]]) -> Dict[str, dict]:
+        """Построить дельту между двумя снимками"""
+        delta = {}
+        for field in TRACKED_FIELDS:
+            old_value = previous.get(field)
+            new_value = current.get(field)
+            if old_value == new_value:
+                continue
+            if isinstance(old_value, str) and isinstance(new_value, str):
+                patch = self._text_patch(old_value, new_value)
+                # Патч выгоден только если он короче нового значения
+                if len(json.dumps(patch, ensure_ascii=False)) < len(json.dumps(new_value, ensure_ascii=False)):
+                    delta[field] = {"patch": patch}
+                    continue
+            delta[field] = {"set": new_value}
+        return delta
+
+    def _apply_delta(self, snapshot: Dict[str, Optional[str]], delta: Dict[str, dict]) -> Dict[str, Optional[str]]:
+        """Применить дельту к снимку"""
+        result = dict(snapshot)
+        for field, operation in delta.items():
+            if "patch" in operation:
+                result[field] = self._apply_patch(result.get(field) or "", operation["patch"])
+            else:
+                result[field] = operation.get("set")
+        return result
+
+    def _replay(self, records: List[dict]):
+        """Последовательно восстановить снимки (генератор пар запись/снимок)"""
+        snapshot: Dict[str, Optional[str]] = {field: None for field in TRACKED_FIELDS}
+        for record in records:
+            if "keyframe" in record:
+                snapshot = dict(record["keyframe"])
+            else:
+                snapshot = self._apply_delta(snapshot, record.get("delta", {}))
+            yield record, snapshot
+
+    def _tail_state(self, url: str, path: Path) -> Dict[str, Any]:
+        """Состояние конца хронологии: версия, снимок, число дельт после keyframe"""
+        size = path.stat().st_size if path.exists() else 0
+        cached = self._tail_cache.get(url)
+        if cached and cached["size"] == size:
+            return cached
+
+        state = {"version": 0, "snapshot": {field: None for field in TRACKED_FIELDS}, "since_keyframe": 0, "size": size}
+        for record, snapshot in self._replay(self._load_records(path)):
+            state["version"] = record["v"]
+            state["snapshot"] = snapshot
+            state["since_keyframe"] = 0 if "keyframe" in record else state["since_keyframe"] + 1
+        self._tail_cache[url] = state
+        return state
+
+    # === Публичный API ===
+
+    def record(self, parsed_data: Dict[str, Optional[str]]) -> TimelineEntry:
+        """
+        Сохранить результат парсинга как новую версию в хронологии URL
+
+        Args:
+            parsed_data: Результат ParserService.parse_url
+
+        Returns:
+            TimelineEntry с перечнем изменённых полей
+        """
+        url = self.normalize_url(parsed_data["url"])
+        current = {field: parsed_data.get(field) for field in TRACKED_FIELDS}
+        path = self._timeline_file(url)
+
+        self.timeline_dir.mkdir(parents=True, exist_ok=True)
+        with stage("timeline_write"), file_lock(path):
+            state = self._tail_state(url, path)
+            version = state["version"] + 1
+            delta = self._make_delta(state["snapshot"], current)
+            changed_fields = list(delta.keys())
+            timestamp = datetime.now().isoformat()
+
+            record: Dict[str, Any] = {"v": version, "ts": timestamp}
+            is_keyframe = version == 1 or state["since_keyframe"] + 1 >= self.keyframe_interval
+            if is_keyframe:
+                record["url"] = url
+                record["keyframe"] = current
+                record["changed"] = changed_fields
+            else:
+                record["delta"] = delta
+
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+            with path.open("a", encoding="utf-8") as f:
+                f.write(line)
+
+            self._tail_cache[url] = {
+                "version": version,
+                "snapshot": current,
+                "since_keyframe": 0 if is_keyframe else state["since_keyframe"] + 1,
+                "size": path.stat().st_size,
+            }
+
+        return TimelineEntry(
+            version=version,
+            timestamp=timestamp,
+            keyframe=is_keyframe,
+            changed_fields=changed_fields
+        )
+
+    def get_timeline(
+        self,
+        url: str,
+        limit: int = 100,
+        changes_only: bool = False,
+        details: bool = False
+    ) -> Tuple[List[TimelineEntry], int]:
+        """
+        Получить хронологию проверок URL (новые записи первыми)
+
+        Args:
+            url: URL конкурента
+            limit: Максимальное количество записей
+            changes_only: Пропускать проверки без изменений
+            details: Добавить старые и новые значения изменённых полей
+
+        Returns:
+            (не больше limit записей, число всех записей с учётом changes_only)
+        """
+        url = self.normalize_url(url)
+        records = self._load_records(self._timeline_file(url))
+
+        entries = []
+        previous: Dict[str, Optional[str]] = {field: None for field in TRACKED_FIELDS}
+        for record, snapshot in self._replay(records):
+            changed = record["changed"] if "keyframe" in record else list(record.get("delta", {}).keys())
+            if changed or not changes_only:
+                entry = TimelineEntry(
+                    version=record["v"],
+                    timestamp=record["ts"],
+                    keyframe="keyframe" in record,
+                    changed_fields=changed
+                )
+                if details:
+                    entry.changes = [
+                        FieldChange(field=field, old=previous.get(field), new=snapshot.get(field))
+                        for field in changed
+                    ]
+                entries.append(entry)
+            previous = snapshot
+
+        entries.reverse()
+        return entries[:limit], len(entries)
+
+    def get_snapshot(self, url: str, version: Optional[int] = None) -> Optional[CompetitorSnapshot]:
+        """
+        Восстановить снимок страницы на указанную версию (по умолчанию последнюю)
+
+        Дельты применяются только начиная с ближайшего предшествующего keyframe.
+        """
+        url = self.normalize_url(url)
+        records = self._load_records(self._timeline_file(url))
+        if not records:
+            return None
+        if version is None:
+            version = records[-1]["v"]
+
+        target_index = next((i for i, r in enumerate(records) if r["v"] == version), None)
+        if target_index is None:
+            return None
+
+        start = target_index
+        while start > 0 and "keyframe" not in records[start]:
+            start -= 1
+
+        snapshot = None
+        record = records[target_index]
+        for record, snapshot in self._replay(records[start:target_index + 1]):
+            pass
+
+        return CompetitorSnapshot(version=record["v"], timestamp=record["ts"], **snapshot)
+
+
+# Глобальный экземпляр
+timeline_service = TimelineService()
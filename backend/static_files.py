@@ -0,0 +1,68 @@
+"""
+Раздача собранного веб-интерфейса (web/dist, см. web/build.py)
+"""
+import mimetypes
+import os
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from backend.middleware import parse_accept_encoding
+
+# Имя с хешем содержимого: app.<10 hex>.js (см. HASH_LENGTH в web/build.py)
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{10}\.[A-Za-z0-9]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Файлы без хеша (index.html) браузер перепроверяет по ETag при каждой загрузке
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    Статика с предсжатыми вариантами и долгим кешированием
+
+    - если клиент принимает br/gzip и рядом лежит file.br / file.gz,
+      отдаётся он с Content-Encoding (без сжатия на лету);
+    - файлы с хешем в имени кешируются навсегда (immutable): при изменении
+      содержимого меняется имя, и index.html ссылается на новое;
+    - остальные файлы перепроверяются по ETag (304 без тела).
+    """
+
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200):
+        full_path = str(full_path)
+        request_headers = Headers(scope=scope)
+        accepted = parse_accept_encoding(request_headers.get("accept-encoding", ""))
+
+        served_path, served_stat, content_encoding = full_path, stat_result, None
+        for encoding, suffix in self.ENCODINGS:
+            if accepted[encoding] <= 0:
+                continue
+            try:
+                served_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            served_path, content_encoding = full_path + suffix, encoding
+            break
+
+        # ETag FileResponse строится по размеру и mtime отдаваемого файла -
+        # у каждого варианта сжатия свой
+        response = FileResponse(
+            served_path,
+            status_code=status_code,
+            stat_result=served_stat,
+            method=scope["method"],
+            media_type=mimetypes.guess_type(full_path)[0] or "application/octet-stream",
+        )
+        if content_encoding:
+            response.headers["Content-Encoding"] = content_encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        is_hashed = HASHED_NAME_RE.search(os.path.basename(full_path))
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if is_hashed else REVALIDATE_CACHE_CONTROL
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
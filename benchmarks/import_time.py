@@ -0,0 +1,96 @@
+"""
+Бюджет времени импорта backend
+
+    python benchmarks/import_time.py                  - проверка с бюджетом по умолчанию
+    python benchmarks/import_time.py --budget-ms 900  - свой бюджет
+    python benchmarks/import_time.py --top 20         - показать самые медленные модули
+
+Импорт backend.main замеряется через `python -X importtime` в отдельном
+процессе несколько раз, берётся минимум (меньше всего шума). Скрипт
+завершается с кодом 1, если время превышает бюджет или при импорте
+загружаются тяжёлые зависимости, которые должны подгружаться лениво.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+project_root = Path(__file__).resolve().parent.parent
+
+# Бюджет по умолчанию (мс); переопределяется IMPORT_TIME_BUDGET_MS или --budget-ms
+DEFAULT_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+# Модули, которые импортируются только при первом использовании
+LAZY_MODULES = ("openai", "PIL", "selenium", "webdriver_manager", "uvicorn")
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def measure(module: str) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    """
+    Импортировать модуль в новом процессе
+
+    Returns:
+        (время импорта модуля в мс, {модуль: (self мкс, cumulative мкс)})
+    """
+    env = dict(os.environ)
+    # Ключ нужен, чтобы сервис OpenAI создавался так же, как в рабочей конфигурации
+    env.setdefault("OPENAI_API_KEY", "sk-import-time-benchmark")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=project_root,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Не удалось импортировать {module}")
+
+    modules: Dict[str, Tuple[int, int]] = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        modules[name] = (self_us, cumulative_us)
+        if name == module and not indent:
+            total_us = cumulative_us
+    return total_us / 1000, modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Проверка времени импорта backend")
+    parser.add_argument("--module", default="backend.main", help="Импортируемый модуль")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Допустимое время импорта, мс")
+    parser.add_argument("--runs", type=int, default=5, help="Количество замеров")
+    parser.add_argument("--top", type=int, default=10, help="Сколько самых медленных модулей показать")
+    args = parser.parse_args()
+
+    runs: List[Tuple[float, Dict[str, Tuple[int, int]]]] = [measure(args.module) for _ in range(max(1, args.runs))]
+    best_ms, modules = min(runs, key=lambda run: run[0])
+
+    print(f"Импорт {args.module}: {best_ms:.0f} мс (минимум из {len(runs)}), бюджет {args.budget_ms:.0f} мс")
+    print("\nСамые медленные модули (собственное время):")
+    for name, (self_us, cumulative_us) in sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} мс  (всего {cumulative_us / 1000:8.1f} мс)  {name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in modules]
+    if eager:
+        print(f"\nОШИБКА: при импорте загружаются ленивые зависимости: {', '.join(eager)}")
+        failed = True
+    if best_ms > args.budget_ms:
+        print(f"\nОШИБКА: время импорта {best_ms:.0f} мс превышает бюджет {args.budget_ms:.0f} мс")
+        failed = True
+    if not failed:
+        print("\nOK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
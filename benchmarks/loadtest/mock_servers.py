@@ -0,0 +1,199 @@
+"""
+Mock-серверы для нагрузочного тестирования
+
+Один HTTP сервер отдаёт:
+- /site/{n}  - страницы конкурентов (title, h1, навигация, статья, подвал);
+- /js/{n}    - JS-only вариант: контент появляется только после выполнения скрипта;
+- /v1/chat/completions - имитация OpenAI Chat Completions (текст и vision).
+
+Задержка и размер страниц задаются параметрами запуска или в query
+(?delay_ms=...&kb=...), задержка ответа LLM - параметром --llm-latency-ms.
+
+    python benchmarks/loadtest/mock_servers.py --port 8900 --llm-latency-ms 300
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse
+from starlette.routing import Route
+
+# Параметры по умолчанию (переопределяются аргументами запуска)
+CONFIG = {
+    "site_latency_ms": 50,
+    "page_kb": 40,
+    "llm_latency_ms": 300,
+    "jitter": 0.2,
+}
+
+COMPANIES = [
+    "СтройНадзор Плюс", "Технадзор БЕЛ", "АрхКонтроль", "Минск Инжиниринг",
+    "ГородПроект", "НадзорСервис", "БелСтройЭксперт", "КапСтрой Контроль",
+]
+SERVICES = [
+    "авторский надзор за строительством объектов",
+    "технический надзор на всех этапах строительства",
+    "экспертиза проектной документации по СНБ и ТКП",
+    "сопровождение государственных заказчиков",
+    "контроль качества строительных материалов",
+    "обследование зданий и сооружений",
+]
+SENTENCES = [
+    "Работаем по всей территории Республики Беларусь с 2008 года.",
+    "Все специалисты имеют аттестаты и допуски к ответственным работам.",
+    "Контролируем соответствие работ проектной документации и требованиям ТКП.",
+    "Фиксируем отступления от проекта и согласовываем изменения с заказчиком.",
+    "Ведём журнал авторского надзора и готовим отчёты для приёмочной комиссии.",
+    "Сопровождаем объекты жилого, социального и промышленного назначения.",
+    "Стоимость услуг рассчитывается индивидуально по составу работ.",
+]
+
+
+def _jittered(ms: float) -> float:
+    """Задержка в секундах со случайным разбросом"""
+    return max(0.0, ms * random.uniform(1 - CONFIG["jitter"], 1 + CONFIG["jitter"])) / 1000
+
+
+def _page_parts(n: int, kb: int):
+    """Детерминированный контент страницы с номером n"""
+    rng = random.Random(n)
+    company = COMPANIES[n % len(COMPANIES)]
+    service = SERVICES[n % len(SERVICES)]
+    title = f"{company} - {service}"
+    h1 = f"{service.capitalize()} от компании {company}"
+    paragraphs = []
+    size = 0
+    while size < kb * 1024:
+        paragraph = " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 8)))
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 7
+    return title, h1, paragraphs
+
+
+def _chrome(body: str, title: str, scripts: str = "") -> str:
+    """Обвязка страницы: head, навигация, подвал"""
+    nav = "".join(f'<li><a href="/site/{i}">{s}</a></li>' for i, s in enumerate(SERVICES))
+    return (
+        "<!DOCTYPE html><html lang=\"ru\"><head><meta charset=\"utf-8\">"
+        f"<title>{title}</title><meta name=\"description\" content=\"{title}\">"
+        "<link rel=\"stylesheet\" href=\"/static/site.css\"></head><body>"
+        f"<header><nav><ul>{nav}</ul></nav></header>{body}"
+        "<footer><p>© Все права защищены. УНП 190000000</p></footer>"
+        f"{scripts}</body></html>"
+    )
+
+
+async def site_page(request: Request):
+    """Обычная страница конкурента"""
+    n = int(request.path_params["n"])
+    delay_ms = float(request.query_params.get("delay_ms", CONFIG["site_latency_ms"]))
+    kb = int(request.query_params.get("kb", CONFIG["page_kb"]))
+    await asyncio.sleep(_jittered(delay_ms))
+    title, h1, paragraphs = _page_parts(n, kb)
+    article = "".join(f"<p>{p}</p>" for p in paragraphs)
+    return HTMLResponse(_chrome(f"<main><article><h1>{h1}</h1>{article}</article></main>", title))
+
+
+async def js_page(request: Request):
+    """Страница, контент которой формируется скриптом (без JS - пустая)"""
+    n = int(request.path_params["n"])
+    delay_ms = float(request.query_params.get("delay_ms", CONFIG["site_latency_ms"]))
+    kb = int(request.query_params.get("kb", CONFIG["page_kb"]))
+    await asyncio.sleep(_jittered(delay_ms))
+    title, h1, paragraphs = _page_parts(n, kb)
+    data = json.dumps({"h1": h1, "paragraphs": paragraphs}, ensure_ascii=False)
+    script = (
+        f"<script>const data = {data};"
+        "const root = document.getElementById('app');"
+        "root.innerHTML = '<h1>' + data.h1 + '</h1>' + data.paragraphs.map(p => '<p>' + p + '</p>').join('');"
+        "</script>"
+    )
+    return HTMLResponse(_chrome('<div id="app"></div>', title, script))
+
+
+TEXT_ANALYSIS = {
+    "strengths": ["Опыт работы с государственными заказчиками", "Аттестованные специалисты"],
+    "weaknesses": ["Нет прозрачных цен", "Мало кейсов на сайте"],
+    "unique_offers": ["Сопровождение по всей Беларуси"],
+    "recommendations": ["Опубликовать примеры отчётов", "Добавить калькулятор стоимости"],
+    "summary": "Компания делает упор на опыт и соответствие ТКП, но слабо раскрывает стоимость и кейсы.",
+}
+
+IMAGE_ANALYSIS = {
+    "description": "Фотография строящегося жилого дома с баннером компании",
+    "marketing_insights": ["Акцент на масштабе объекта", "Логотип хорошо заметен"],
+    "visual_style_score": 7,
+    "visual_style_analysis": "Сдержанная корпоративная палитра, читаемая типографика.",
+    "design_score": 6,
+    "animation_potential": "Подходит для таймлапса этапов строительства.",
+    "recommendations": ["Добавить инфографику этапов", "Использовать единый стиль фото"],
+}
+
+
+async def chat_completions(request: Request):
+    """Имитация POST /v1/chat/completions"""
+    body = await request.json()
+    messages = body.get("messages", [])
+    is_vision = any(isinstance(m.get("content"), list) for m in messages)
+    prompt_chars = sum(len(json.dumps(m.get("content"), ensure_ascii=False)) for m in messages)
+
+    await asyncio.sleep(_jittered(CONFIG["llm_latency_ms"] * (1.5 if is_vision else 1.0)))
+
+    content = json.dumps(IMAGE_ANALYSIS if is_vision else TEXT_ANALYSIS, ensure_ascii=False)
+    return JSONResponse({
+        "id": f"chatcmpl-mock-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_chars // 4 + len(content) // 4,
+        },
+    })
+
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok"})
+
+
+app = Starlette(routes=[
+    Route("/site/{n:int}", site_page),
+    Route("/js/{n:int}", js_page),
+    Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+    Route("/health", health),
+])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock сайты конкурентов и mock OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--site-latency-ms", type=float, default=CONFIG["site_latency_ms"])
+    parser.add_argument("--page-kb", type=int, default=CONFIG["page_kb"])
+    parser.add_argument("--llm-latency-ms", type=float, default=CONFIG["llm_latency_ms"])
+    parser.add_argument("--jitter", type=float, default=CONFIG["jitter"], help="Разброс задержек (доля)")
+    args = parser.parse_args()
+
+    CONFIG.update(
+        site_latency_ms=args.site_latency_ms,
+        page_kb=args.page_kb,
+        llm_latency_ms=args.llm_latency_ms,
+        jitter=args.jitter,
+    )
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
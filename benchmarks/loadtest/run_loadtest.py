@@ -0,0 +1,481 @@
+"""
+Нагрузочный тест backend без доступа в интернет
+
+Запускает mock-сервер (сайты конкурентов + OpenAI) и backend.main:app
+во временной рабочей директории, прогоняет сценарии с заданной
+конкурентностью и сохраняет JSON с пропускной способностью,
+перцентилями задержек и потреблением памяти (RSS) - базовую линию,
+которую можно сравнивать между релизами.
+
+    python benchmarks/loadtest/run_loadtest.py --concurrency 16 --requests 200 --out baseline.json
+    python benchmarks/loadtest/run_loadtest.py --out new.json --compare baseline.json
+    python benchmarks/loadtest/run_loadtest.py --compare baseline.json new.json
+
+Сценарии: analyze_text, analyze_image, parse_demo, history, mixed.
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+project_root = Path(__file__).resolve().parent.parent.parent
+mock_script = Path(__file__).resolve().parent / "mock_servers.py"
+
+SCENARIOS = ("analyze_text", "analyze_image", "parse_demo", "history", "mixed")
+
+# Доли запросов в смешанном сценарии
+MIXED_WEIGHTS = {"history": 5, "analyze_text": 3, "parse_demo": 2, "analyze_image": 1}
+
+# Формат результата (увеличивается при несовместимых изменениях)
+RESULT_VERSION = 1
+
+
+# === Процессы ===
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    """Дождаться, пока сервер начнёт отвечать"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Процесс завершился при запуске (код {process.returncode}): {url}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Сервер не ответил за {timeout:.0f} с: {url}")
+
+
+def _children(pid: int) -> List[int]:
+    """Дочерние процессы (Linux /proc, без psutil)"""
+    result = []
+    task_dir = Path(f"/proc/{pid}/task")
+    if not task_dir.exists():
+        return result
+    for task in task_dir.iterdir():
+        try:
+            children = (task / "children").read_text().split()
+        except OSError:
+            continue
+        for child in children:
+            result.append(int(child))
+            result.extend(_children(int(child)))
+    return result
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """RSS процесса вместе с дочерними (воркерами uvicorn), МБ"""
+    if PSUTIL_AVAILABLE:
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except psutil.Error:
+            return None
+
+    total_kb = 0
+    found = False
+    for process_id in [pid] + _children(pid):
+        try:
+            for line in Path(f"/proc/{process_id}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total_kb += int(line.split()[1])
+                    found = True
+        except OSError:
+            continue
+    return total_kb / 1024 if found else None
+
+
+class RssSampler:
+    """Периодический замер RSS backend во время нагрузки"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            value = rss_mb(self.pid)
+            if value is not None:
+                self.samples.append(value)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+# === Нагрузка ===
+
+def _sample_image(index: int) -> bytes:
+    """Тестовое изображение (~1-2 МБ в JPEG)"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (3000, 2000), (200, 210, 220))
+    draw = ImageDraw.Draw(image)
+    rng = random.Random(index)
+    for _ in range(400):
+        x, y = rng.randint(0, 2900), rng.randint(0, 1900)
+        draw.rectangle([x, y, x + rng.randint(10, 200), y + rng.randint(10, 200)],
+                       fill=(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+class RequestFactory:
+    """Запросы сценариев к backend"""
+
+    def __init__(self, mock_url: str, js_share: float, corpus_size: int):
+        self.mock_url = mock_url
+        self.js_share = js_share
+        self.corpus_size = corpus_size
+        self.images = [_sample_image(i) for i in range(3)]
+
+    async def analyze_text(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        # Уникальный текст: кеш анализа не должен искажать результат
+        text = f"Компания №{i}: авторский и технический надзор за строительством. " * 8
+        return await client.post("/analyze_text", json={"text": text})
+
+    async def analyze_image(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        image = self.images[i % len(self.images)]
+        return await client.post("/analyze_image", files={"file": (f"banner_{i}.jpg", image, "image/jpeg")})
+
+    async def parse_demo(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        variant = "js" if random.random() < self.js_share else "site"
+        url = f"{self.mock_url}/{variant}/{i % self.corpus_size}"
+        return await client.post("/parse_demo", json={"url": url})
+
+    async def history(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.get("/history")
+
+    async def mixed(self, client: httpx.AsyncClient, i: int) -> httpx.Response:
+        names = list(MIXED_WEIGHTS)
+        name = random.choices(names, weights=[MIXED_WEIGHTS[n] for n in names])[0]
+        return await getattr(self, name)(client, i)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(
+    base_url: str,
+    request: Callable[[httpx.AsyncClient, int], "asyncio.Future"],
+    total: int,
+    concurrency: int,
+    timeout: float
+) -> dict:
+    """Выполнить total запросов с заданной конкурентностью"""
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    errors = 0
+    counter = iter(range(total))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    response = await request(client, i)
+                    code = str(response.status_code)
+                    ok = response.status_code == 200 and response.json().get("success", True) is not False
+                except (httpx.HTTPError, ValueError) as e:
+                    code = type(e).__name__
+                    ok = False
+                latencies.append((time.perf_counter() - started) * 1000)
+                status_codes[code] = status_codes.get(code, 0) + 1
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "status_codes": status_codes,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(total / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "min": round(latencies[0], 1) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(latencies[-1], 1) if latencies else 0.0,
+        },
+    }
+
+
+async def run_load(args, base_url: str, mock_url: str, backend_pid: int) -> Tuple[dict, dict]:
+    """Прогнать все сценарии, вернуть результаты и замеры памяти"""
+    factory = RequestFactory(mock_url, args.js_share, args.corpus_size)
+    idle_rss = rss_mb(backend_pid)
+
+    # Прогрев: первые запросы инициализируют клиентов и пулы соединений
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        for i in range(args.warmup):
+            for name in args.scenarios:
+                if name != "mixed":
+                    await getattr(factory, name)(client, -1 - i)
+
+    sampler = RssSampler(backend_pid)
+    sampler.start()
+    results = {}
+    try:
+        for name in args.scenarios:
+            print(f"  {name}: {args.requests} запросов, конкурентность {args.concurrency}...", flush=True)
+            results[name] = await run_scenario(
+                base_url, getattr(factory, name), args.requests, args.concurrency, args.timeout
+            )
+            latency = results[name]["latency_ms"]
+            print(
+                f"    {results[name]['throughput_rps']} rps, p50 {latency['p50']} мс, "
+                f"p95 {latency['p95']} мс, p99 {latency['p99']} мс, ошибок {results[name]['errors']}",
+                flush=True
+            )
+    finally:
+        await sampler.stop()
+
+    memory = {
+        "idle": round(idle_rss, 1) if idle_rss is not None else None,
+        "peak": round(max(sampler.samples), 1) if sampler.samples else None,
+        "end": round(sampler.samples[-1], 1) if sampler.samples else None,
+    }
+    return results, memory
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    """Запустить серверы, нагрузку и собрать результат"""
+    mock_port = args.mock_port or _free_port()
+    backend_port = args.port or _free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    base_url = f"http://127.0.0.1:{backend_port}"
+
+    workdir = Path(tempfile.mkdtemp(prefix="loadtest_"))
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": str(project_root) + os.pathsep + env.get("PYTHONPATH", ""),
+        "OPENAI_API_KEY": "sk-loadtest-mock",
+        "OPENAI_BASE_URL": f"{mock_url}/v1",
+        "ANALYSIS_CACHE_TTL": "0",
+        "USE_SELENIUM": "false",
+        "APP_ENV": "production",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    processes = []
+    try:
+        mock = subprocess.Popen(
+            [sys.executable, str(mock_script), "--port", str(mock_port),
+             "--site-latency-ms", str(args.site_latency_ms), "--page-kb", str(args.page_kb),
+             "--llm-latency-ms", str(args.llm_latency_ms)],
+            cwd=workdir, env=env
+        )
+        processes.append(mock)
+        _wait_ready(f"{mock_url}/health", mock)
+
+        backend = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+             "--port", str(backend_port), "--workers", str(args.workers), "--log-level", "warning",
+             "--no-access-log"],
+            cwd=workdir, env=env
+        )
+        processes.append(backend)
+        _wait_ready(f"{base_url}/health", backend)
+
+        print(f"backend: {base_url} (воркеров: {args.workers}), mock: {mock_url}, рабочая директория: {workdir}")
+        scenarios, memory = asyncio.run(run_load(args, base_url, mock_url, backend.pid))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "version": RESULT_VERSION,
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "workers": args.workers,
+            "site_latency_ms": args.site_latency_ms,
+            "page_kb": args.page_kb,
+            "llm_latency_ms": args.llm_latency_ms,
+            "js_share": args.js_share,
+            "env": args.env,
+        },
+        "scenarios": scenarios,
+        "rss_mb": memory,
+    }
+
+
+# === Сравнение ===
+
+def _change(old: Optional[float], new: Optional[float]) -> str:
+    if old is None or new is None:
+        return "n/a"
+    if not old:
+        return "+0.0%" if not new else "new"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(old: dict, new: dict, max_regression: Optional[float]) -> int:
+    """
+    Сравнить два результата
+
+    Returns:
+        1 если p95 какого-либо сценария вырос больше max_regression (доля), иначе 0
+    """
+    print(f"\nСравнение: {old['meta'].get('commit')} ({old['meta']['timestamp']}) -> "
+          f"{new['meta'].get('commit')} ({new['meta']['timestamp']})")
+    if old.get("config") != new.get("config"):
+        print("Внимание: конфигурации прогонов отличаются")
+
+    header = f"{'сценарий':<15}{'метрика':<16}{'было':>12}{'стало':>12}{'изменение':>12}"
+    print(header)
+    print("-" * len(header))
+    regressions = []
+    for name in new["scenarios"]:
+        if name not in old["scenarios"]:
+            continue
+        before, after = old["scenarios"][name], new["scenarios"][name]
+        rows = [("throughput_rps", before["throughput_rps"], after["throughput_rps"])]
+        rows += [(f"{q} мс", before["latency_ms"][q], after["latency_ms"][q]) for q in ("p50", "p95", "p99")]
+        rows.append(("errors", before["errors"], after["errors"]))
+        for metric, was, now in rows:
+            print(f"{name:<15}{metric:<16}{was:>12}{now:>12}{_change(was, now):>12}")
+        if max_regression is not None and before["latency_ms"]["p95"]:
+            growth = (after["latency_ms"]["p95"] - before["latency_ms"]["p95"]) / before["latency_ms"]["p95"]
+            if growth > max_regression:
+                regressions.append(f"{name}: p95 {growth * 100:+.1f}%")
+
+    for key in ("idle", "peak", "end"):
+        was, now = old["rss_mb"].get(key), new["rss_mb"].get(key)
+        print(f"{'rss':<15}{key + ' МБ':<16}{str(was):>12}{str(now):>12}{_change(was, now):>12}")
+
+    if regressions:
+        print(f"\nРЕГРЕССИЯ (порог {max_regression * 100:.0f}%): " + "; ".join(regressions))
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест backend с mock-сайтами и mock LLM")
+    parser.add_argument("--scenarios", default="analyze_text,analyze_image,parse_demo,history",
+                        help=f"Сценарии через запятую: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на сценарий")
+    parser.add_argument("--warmup", type=int, default=2, help="Прогревочных запросов на сценарий")
+    parser.add_argument("--workers", type=int, default=1, help="Воркеров uvicorn")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--site-latency-ms", type=float, default=50)
+    parser.add_argument("--page-kb", type=int, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--js-share", type=float, default=0.2, help="Доля JS-only страниц в parse_demo")
+    parser.add_argument("--corpus-size", type=int, default=50, help="Количество разных страниц")
+    parser.add_argument("--port", type=int, default=0, help="Порт backend (0 - свободный)")
+    parser.add_argument("--mock-port", type=int, default=0, help="Порт mock-сервера (0 - свободный)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Дополнительные переменные окружения backend")
+    parser.add_argument("--keep-workdir", action="store_true", help="Не удалять рабочую директорию backend")
+    parser.add_argument("--out", help="Файл для JSON результата")
+    parser.add_argument("--compare", nargs="+", metavar="JSON",
+                        help="Базовый результат (или два файла - сравнить без прогона)")
+    parser.add_argument("--max-regression", type=float, help="Допустимый рост p95, доля (например 0.2)")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        old, new = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare)
+        return compare(old, new, args.max_regression)
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    result = run(args)
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(output, encoding="utf-8")
+        print(f"\nРезультат сохранён: {args.out}")
+    else:
+        print(output)
+
+    if args.compare:
+        old = json.loads(Path(args.compare[0]).read_text(encoding="utf-8"))
+        return compare(old, result, args.max_regression)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
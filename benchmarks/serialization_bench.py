@@ -0,0 +1,152 @@
+"""
+Сериализация и сжатие ответов API
+
+    python benchmarks/serialization_bench.py                    - история и хронология по умолчанию
+    python benchmarks/serialization_bench.py --history-items 5000 --timeline-items 20000
+
+Для больших ответов (история, хронология изменений с деталями - самый
+объёмный "выгружаемый" ответ API) замеряется:
+- время сериализации: json из стандартной библиотеки (JSONResponse),
+  orjson (ORJSONResponse, используется в backend по умолчанию) и
+  model_dump_json pydantic - тем же путём, что и FastAPI (serialize + render);
+- размер на проводе: без сжатия, gzip и brotli (если установлен), и время сжатия.
+"""
+import argparse
+import gzip
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from backend.config import settings  # noqa: E402
+from backend.models.schemas import (  # noqa: E402
+    FieldChange,
+    HistoryItem,
+    HistoryResponse,
+    TimelineEntry,
+    TimelineResponse,
+)
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+def make_history(count: int) -> HistoryResponse:
+    """История из count записей"""
+    now = datetime.now()
+    items = [
+        HistoryItem(
+            id=f"{i:08x}-0000-4000-8000-000000000000",
+            timestamp=now - timedelta(minutes=i),
+            request_type=("text", "image", "parse")[i % 3],
+            request_summary=f"URL: https://competitor-{i % 50}.by/uslugi/tehnicheskij-nadzor?page={i}",
+            response_summary="Компания делает упор на опыт и соответствие ТКП, но слабо раскрывает стоимость и кейсы. " * 4,
+        )
+        for i in range(count)
+    ]
+    return HistoryResponse(items=items, total=count, cursor=items[0].id if items else None)
+
+
+def make_timeline(count: int) -> TimelineResponse:
+    """Хронология из count проверок с деталями изменений"""
+    start = datetime.now() - timedelta(days=count)
+    items = []
+    for version in range(1, count + 1):
+        changes = [
+            FieldChange(field="title", old=f"Технадзор в Минске - версия {version - 1}", new=f"Технадзор в Минске - версия {version}"),
+            FieldChange(
+                field="first_paragraph",
+                old="Работаем по всей территории Республики Беларусь с 2008 года. " * 3,
+                new="Все специалисты имеют аттестаты и допуски к ответственным работам. " * 3,
+            ),
+        ] if version % 3 == 0 else []
+        items.append(TimelineEntry(
+            version=version,
+            timestamp=start + timedelta(days=version),
+            keyframe=version % 50 == 1,
+            changed_fields=[change.field for change in changes],
+            changes=changes or None,
+        ))
+    return TimelineResponse(success=True, url="https://competitor.by", total=count, items=items)
+
+
+def best_time(func: Callable[[], bytes], runs: int) -> Tuple[float, bytes]:
+    """Минимальное время вызова (мс) и результат"""
+    best = float("inf")
+    result = b""
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def bench_payload(name: str, model, runs: int) -> List[str]:
+    """Строки отчёта для одного ответа"""
+    adapter = TypeAdapter(type(model))
+
+    def serialize():
+        # Как FastAPI: валидация по response_model, serialize в JSON-совместимые
+        # объекты, затем render класса ответа
+        return adapter.dump_python(adapter.validate_python(model), mode="json")
+
+    serializers = [("json (JSONResponse)", lambda: JSONResponse(serialize()).body)]
+    if ORJSON_AVAILABLE:
+        serializers.append(("orjson (ORJSONResponse)", lambda: ORJSONResponse(serialize()).body))
+    serializers.append(("pydantic model_dump_json", lambda: model.model_dump_json().encode("utf-8")))
+
+    lines = [f"\n{name}"]
+    body = b""
+    for label, func in serializers:
+        elapsed, body = best_time(func, runs)
+        lines.append(f"  {label:28} {elapsed:8.2f} мс  {len(body) / 1024:9.1f} КБ")
+
+    compressors = [(f"gzip (уровень {settings.compression_gzip_level})", lambda: gzip.compress(body, settings.compression_gzip_level, mtime=0))]
+    if BROTLI_AVAILABLE:
+        compressors.append((f"brotli (качество {settings.compression_brotli_quality})", lambda: brotli.compress(body, quality=settings.compression_brotli_quality)))
+    lines.append(f"  {'без сжатия':28} {'':11}  {len(body) / 1024:9.1f} КБ")
+    for label, func in compressors:
+        elapsed, compressed = best_time(func, runs)
+        ratio = len(body) / len(compressed) if compressed else 0
+        lines.append(f"  {label:28} {elapsed:8.2f} мс  {len(compressed) / 1024:9.1f} КБ  (x{ratio:.1f})")
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Сериализация и сжатие ответов API")
+    parser.add_argument("--history-items", type=int, default=1000, help="Записей в истории")
+    parser.add_argument("--timeline-items", type=int, default=5000, help="Проверок в хронологии")
+    parser.add_argument("--runs", type=int, default=5, help="Количество замеров (берётся минимум)")
+    args = parser.parse_args()
+
+    print(f"orjson: {'да' if ORJSON_AVAILABLE else 'нет'}, brotli: {'да' if BROTLI_AVAILABLE else 'нет'}")
+    lines = []
+    lines += bench_payload(f"GET /history ({args.history_items} записей)", make_history(args.history_items), args.runs)
+    lines += bench_payload(
+        f"GET /competitors/.../timeline?details=true ({args.timeline_items} проверок)",
+        make_timeline(args.timeline_items),
+        args.runs,
+    )
+    print("\n".join(lines))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,181 @@
 """
 HTTP клиент для работы с backend API
+
+Все запросы идут через одну requests.Session с пулом keep-alive
+соединений: TCP (и TLS, если сервер удалённый) устанавливается один раз,
+а не на каждый запрос. Пул urllib3 потокобезопасен, сессию используют
+все рабочие потоки приложения.
 """
 import requests
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Dict, Any, Iterator, Tuple, Callable, List
 import json
+import os
+import random
+import socket
+import threading
+import time
+
+from image_prep import DEFAULT_JPEG_QUALITY, DEFAULT_MAX_DIMENSION, prepare_image
+from result_cache import PARSE_CACHE_TTL, ResultCache, cache_key, result_cache
+
+BASE_URL = os.getenv("COMPETITOR_API_URL", "http://localhost:8000")
+
+# Пул соединений: сколько соединений держать открытыми (не меньше числа
+# одновременных запросов приложения + лента событий)
+POOL_SIZE = int(os.getenv("COMPETITOR_API_POOL_SIZE", "8"))
+
+# Таймауты (подключение, чтение) в секундах по эндпоинтам: первый
+# подходящий префикс "МЕТОД /путь"
+DEFAULT_TIMEOUT = (5, 30)
+TIMEOUTS = (
+    ('GET /health', (3, 5)),
+    ('GET /capabilities', (3, 5)),
+    ('GET /history', (5, 15)),
+    ('DELETE /history', (5, 15)),
+    ('GET /jobs/', (5, 15)),
+    ('DELETE /jobs/', (5, 15)),
+    ('POST /jobs/analyze_image', (5, 120)),  # загрузка файла
+    ('POST /jobs', (5, 15)),
+    ('POST /analyze_text', (5, 120)),  # синхронный вызов LLM
+    ('POST /analyze_image', (5, 180)),
+    ('POST /parse_demo', (5, 180)),
+)
+
+# Повторы при сетевых сбоях: ошибки подключения - для любых запросов
+# (запрос не отправлен), ошибки чтения и 502/504 - только для идемпотентных
+NETWORK_RETRIES = 3
+NETWORK_BACKOFF = 0.5
+
+# Фоновые задачи: интервал опроса статуса и максимальное время ожидания
+JOB_POLL_INTERVAL = 1.0
+JOB_WAIT_TIMEOUT = 900
+JOB_FINAL_STATUSES = ('done', 'failed', 'cancelled')
+
+# Лента событий: сервер шлёт keepalive раз в 15 секунд, тишина дольше - обрыв
+EVENTS_READ_TIMEOUT = 45
 
-BASE_URL = "http://localhost:8000"
+# Повторы при перегрузке сервера (503 + Retry-After)
+OVERLOAD_MAX_RETRIES = 3
+OVERLOAD_MAX_DELAY = 30
+
+
+class TaskCancelled(Exception):
+    """Операция отменена пользователем"""
+
+
+class ServerUnavailable(Exception):
+    """Сервер недоступен (нет соединения или ответа)"""
+
+
+class CancelToken:
+    """
+    Признак отмены операции
+    
+    Методы клиента проверяют его между запросами, а обработчики on_cancel
+    прерывают текущую операцию: закрывают поток событий, отменяют задачу
+    на сервере. Обработчики выполняются в отдельном потоке, чтобы отмена
+    из UI не ждала сетевых вызовов.
+    """
+    
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Any]] = []
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+    
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._run_callback(callback)
+    
+    def on_cancel(self, callback: Callable[[], Any]):
+        """Зарегистрировать обработчик (сразу вызывается, если уже отменено)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        self._run_callback(callback)
+    
+    @staticmethod
+    def _run_callback(callback: Callable[[], Any]):
+        def run():
+            try:
+                callback()
+            except Exception:
+                pass
+        threading.Thread(target=run, daemon=True).start()
+    
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelled()
+    
+    def wait(self, timeout: float) -> bool:
+        """Подождать timeout секунд или до отмены; True - отменено"""
+        return self._event.wait(timeout)
 
 
 class APIClient:
     """Клиент для взаимодействия с backend API"""
     
-    def __init__(self, base_url: str = BASE_URL):
+    def __init__(self, base_url: str = BASE_URL, pool_size: int = POOL_SIZE, cache: ResultCache = result_cache):
         self.base_url = base_url.rstrip('/')
+        self.session = self._create_session(pool_size)
+        self.cache = cache
+        self._capabilities: Optional[Dict[str, Any]] = None
+    
+    @staticmethod
+    def _create_session(pool_size: int) -> requests.Session:
+        """Сессия с пулом keep-alive соединений и повторами при сетевых сбоях"""
+        retry = Retry(
+            total=NETWORK_RETRIES,
+            connect=NETWORK_RETRIES,
+            read=NETWORK_RETRIES,
+            status=NETWORK_RETRIES,
+            backoff_factor=NETWORK_BACKOFF,
+            # 503 с Retry-After обрабатывается в _make_request
+            status_forcelist=(502, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def close(self):
+        """Закрыть соединения пула и локальный кеш"""
+        self.session.close()
+        self.cache.close()
+    
+    @staticmethod
+    def _timeout(method: str, endpoint: str) -> Tuple[float, float]:
+        """Таймаут (подключение, чтение) для эндпоинта"""
+        key = f"{method.upper()} {endpoint}"
+        for prefix, timeout in TIMEOUTS:
+            if key.startswith(prefix):
+                return timeout
+        return DEFAULT_TIMEOUT
     
     def _handle_response(self, response: requests.Response) -> Dict[str, Any]:
         """Обработка ответа с улучшенной обработкой ошибок"""
         try:
             response.raise_for_status()
-            return response.json()
+            if response.status_code == 304:
+                return {'not_modified': True}
+            data = response.json()
+            if isinstance(data, dict) and response.headers.get('ETag'):
+                data['etag'] = response.headers['ETag']
+            return data
         except requests.exceptions.HTTPError as e:
             error_msg = f"HTTP ошибка {response.status_code}"
             try:
@@ -33,27 +190,111 @@ class APIClient:
         except Exception as e:
             raise Exception(f"Неожиданная ошибка: {str(e)}") from e
     
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
-        """Универсальный метод для выполнения запросов"""
+    @staticmethod
+    def _retry_delay(response: requests.Response) -> Optional[float]:
+        """Задержка перед повтором для ответа 503 с Retry-After (со случайным разбросом)"""
+        if response.status_code != 503:
+            return None
+        retry_after = response.headers.get('Retry-After')
+        if not retry_after:
+            return None
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            return None
+        # Разброс, чтобы клиенты не возвращались одновременно
+        return min(OVERLOAD_MAX_DELAY, delay * random.uniform(1.0, 1.5))
+    
+    @staticmethod
+    def _rewind_files(kwargs: Dict[str, Any]):
+        """Вернуть загружаемые файлы в начало перед повтором запроса"""
+        for value in (kwargs.get('files') or {}).values():
+            file_obj = value[1] if isinstance(value, tuple) else value
+            if hasattr(file_obj, 'seek'):
+                file_obj.seek(0)
+    
+    def _make_request(self, method: str, endpoint: str, cancel: Optional[CancelToken] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Универсальный метод для выполнения запросов
+        
+        При отмене (cancel) новые попытки не выполняются, а результат
+        уже отправленного запроса отбрасывается (TaskCancelled).
+        """
         try:
             url = f"{self.base_url}{endpoint}"
-            response = requests.request(method, url, timeout=60, **kwargs)
+            for attempt in range(OVERLOAD_MAX_RETRIES + 1):
+                if cancel:
+                    cancel.raise_if_cancelled()
+                kwargs.setdefault('timeout', self._timeout(method, endpoint))
+                response = self.session.request(method, url, **kwargs)
+                delay = self._retry_delay(response)
+                if delay is None or attempt == OVERLOAD_MAX_RETRIES:
+                    break
+                # Сервер перегружен и запрос не обработан - безопасно повторить
+                if cancel:
+                    if cancel.wait(delay):
+                        raise TaskCancelled()
+                else:
+                    time.sleep(delay)
+                self._rewind_files(kwargs)
+            if cancel:
+                cancel.raise_if_cancelled()
             return self._handle_response(response)
+        except TaskCancelled:
+            raise
         except requests.exceptions.ConnectionError:
-            raise Exception("Не удалось подключиться к серверу. Убедитесь, что backend запущен на http://localhost:8000")
+            raise ServerUnavailable(f"Не удалось подключиться к серверу. Убедитесь, что backend запущен на {self.base_url}")
         except requests.exceptions.Timeout:
-            raise Exception("Превышено время ожидания ответа от сервера")
+            raise ServerUnavailable("Превышено время ожидания ответа от сервера")
         except requests.exceptions.RequestException as e:
             raise Exception(f"Ошибка запроса: {str(e)}") from e
         except Exception as e:
             raise Exception(f"Неожиданная ошибка: {str(e)}") from e
     
-    def analyze_text(self, text: str) -> Dict[str, Any]:
-        """Анализ текста"""
-        return self._make_request('POST', '/analyze_text', json={"text": text})
+    def _cached(
+        self,
+        key: str,
+        fetch: Callable[[], Dict[str, Any]],
+        refresh: bool = False,
+        max_age: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Ответ из локального кеша или с сервера
+        
+        В ответ добавляется '_cache': {'source': 'cache', 'stored_at': время}
+        или {'source': 'server'}. Кешируются только успешные ответы.
+        
+        Args:
+            refresh: Не читать кеш (запросить заново и обновить запись)
+            max_age: Срок свежести записи (секунды); более старая запись
+                отдаётся, только если сервер недоступен
+        """
+        hit = None if refresh else self.cache.get(key)
+        if hit is not None:
+            cached, stored_at = hit
+            cached['_cache'] = {'source': 'cache', 'stored_at': stored_at}
+            if max_age is None or time.time() - stored_at <= max_age:
+                return cached
+        try:
+            result = fetch()
+        except ServerUnavailable:
+            # Устаревшая запись лучше пустого экрана, пока сервер недоступен
+            if hit is None:
+                raise
+            return cached
+        if result.get('success', True):
+            self.cache.put(key, result)
+        return dict(result, _cache={'source': 'server'})
+    
+    def analyze_text(self, text: str, cancel: Optional[CancelToken] = None, refresh: bool = False) -> Dict[str, Any]:
+        """Анализ текста (через фоновую задачу: отмена останавливает её и на сервере)"""
+        def fetch():
+            job = self.submit_job('analyze_text', {"text": text}, cancel=cancel)
+            return self.wait_for_job(job['id'], cancel=cancel)
+        return self._cached(cache_key('text', text), fetch, refresh)
     
-    def analyze_image(self, image_path: str) -> Dict[str, Any]:
-        """Анализ изображения"""
+    def analyze_image(self, image_path: str, cancel: Optional[CancelToken] = None, refresh: bool = False) -> Dict[str, Any]:
+        """Анализ изображения (ключ кеша - хеш содержимого файла)"""
         import os
         import mimetypes
         
@@ -75,24 +316,258 @@ class APIClient:
             # Получаем имя файла
             filename = os.path.basename(image_path)
             
-            # Открываем файл и отправляем с правильным именем и типом
             with open(image_path, 'rb') as f:
+                content = f.read()
+            
+            # Отправляем с правильным именем и типом; анализ выполняется фоновой задачей
+            def fetch():
+                upload = (filename, content, mime_type)
+                # Уменьшаем до ограничений сервера: больше он всё равно не использует
+                limits = self.get_capabilities(cancel=cancel).get('image', {})
+                prepared = prepare_image(
+                    image_path, content,
+                    limits.get('max_dimension', DEFAULT_MAX_DIMENSION),
+                    limits.get('jpeg_quality', DEFAULT_JPEG_QUALITY)
+                )
+                if prepared is not None:
+                    upload = (prepared[1], prepared[0], prepared[2])
                 files = {
-                    'file': (filename, f, mime_type)
+                    'file': upload
                 }
-                return self._make_request('POST', '/analyze_image', files=files)
+                job = self._make_request('POST', '/jobs/analyze_image', cancel=cancel, files=files)
+                return self.wait_for_job(job['id'], cancel=cancel)
+            return self._cached(cache_key('image', content), fetch, refresh)
         except FileNotFoundError:
             raise Exception(f"Файл не найден: {image_path}")
         except IOError as e:
             raise Exception(f"Ошибка чтения файла: {str(e)}") from e
     
-    def parse_demo(self, url: str) -> Dict[str, Any]:
-        """Парсинг сайта"""
-        return self._make_request('POST', '/parse_demo', json={"url": url})
+    def get_capabilities(self, cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """
+        Возможности и ограничения сервера (запрашиваются один раз)
+        
+        Если сервер старый или недоступен, возвращается {} - клиент
+        использует ограничения по умолчанию.
+        """
+        if self._capabilities is None:
+            try:
+                self._capabilities = self._make_request('GET', '/capabilities', cancel=cancel)
+            except TaskCancelled:
+                raise
+            except Exception:
+                return {}
+        return self._capabilities
+    
+    def parse_demo(self, url: str, cancel: Optional[CancelToken] = None, refresh: bool = False) -> Dict[str, Any]:
+        """Парсинг сайта (через фоновую задачу: не держит соединение до конца парсинга)"""
+        def fetch():
+            job = self.submit_job('parse_demo', {"url": url}, cancel=cancel)
+            return self.wait_for_job(job['id'], cancel=cancel)
+        return self._cached(cache_key('parse', url), fetch, refresh, max_age=PARSE_CACHE_TTL)
+    
+    def submit_job(
+        self,
+        job_type: str,
+        payload: Dict[str, Any],
+        priority: int = 5,
+        cancel: Optional[CancelToken] = None
+    ) -> Dict[str, Any]:
+        """Поставить задачу в очередь на сервере"""
+        return self._make_request(
+            'POST', '/jobs', cancel=cancel,
+            json={"type": job_type, "payload": payload, "priority": priority}
+        )
+    
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        """Получить статус задачи"""
+        return self._make_request('GET', f'/jobs/{job_id}')
+    
+    def cancel_job(self, job_id: str) -> Dict[str, Any]:
+        """Отменить задачу"""
+        return self._make_request('DELETE', f'/jobs/{job_id}')
+    
+    @staticmethod
+    def _job_result(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Результат завершённой задачи (None если задача ещё выполняется)"""
+        status = job.get('status')
+        if status == 'done':
+            return job.get('result') or {}
+        if status == 'failed':
+            raise Exception(job.get('error') or "Задача завершилась с ошибкой")
+        if status == 'cancelled':
+            raise Exception("Задача отменена")
+        return None
+    
+    def _cancel_job_quietly(self, job_id: str):
+        """Отменить задачу на сервере, не прерываясь на ошибках"""
+        try:
+            self.cancel_job(job_id)
+        except Exception:
+            pass
+    
+    def wait_for_job(
+        self,
+        job_id: str,
+        timeout: float = JOB_WAIT_TIMEOUT,
+        cancel: Optional[CancelToken] = None
+    ) -> Dict[str, Any]:
+        """
+        Дождаться завершения задачи
+        
+        Ждёт событие job.updated из ленты событий; если лента недоступна,
+        опрашивает статус задачи короткими запросами. При отмене (cancel)
+        задача отменяется на сервере, а ожидание прерывается TaskCancelled.
+        
+        Returns:
+            Результат задачи (тот же формат, что у синхронного эндпоинта)
+        """
+        if cancel:
+            cancel.on_cancel(lambda: self._cancel_job_quietly(job_id))
+        deadline = time.monotonic() + timeout
+        try:
+            for event in self.iter_events(types='job', cancel=cancel):
+                data = event.get('data') or {}
+                # После ready подписка активна: перечитываем состояние один раз,
+                # дальше ждём событие о завершении задачи
+                finished = data.get('id') == job_id and data.get('status') in JOB_FINAL_STATUSES
+                if event['type'] == 'ready' or finished:
+                    result = self._job_result(self.get_job(job_id))
+                    if result is not None:
+                        return result
+                if time.monotonic() > deadline:
+                    raise Exception("Превышено время ожидания выполнения задачи")
+        except requests.exceptions.RequestException:
+            pass
+        
+        while True:
+            if cancel:
+                cancel.raise_if_cancelled()
+            result = self._job_result(self.get_job(job_id))
+            if result is not None:
+                return result
+            if time.monotonic() > deadline:
+                raise Exception("Превышено время ожидания выполнения задачи")
+            if cancel:
+                if cancel.wait(JOB_POLL_INTERVAL):
+                    raise TaskCancelled()
+            else:
+                time.sleep(JOB_POLL_INTERVAL)
     
-    def get_history(self) -> Dict[str, Any]:
-        """Получить историю"""
-        return self._make_request('GET', '/history')
+    @staticmethod
+    def _abort_stream(response: requests.Response):
+        """
+        Прервать чтение потокового ответа из другого потока
+
+        response.close() не будит поток, заблокированный в чтении сокета:
+        сокет сначала закрывается на чтение и запись (shutdown), и чтение
+        сразу завершается ошибкой.
+        """
+        raw = response.raw
+        sock = getattr(getattr(raw, "_connection", None), "sock", None)
+        if sock is None:
+            # Соединение уже отдано ответу: сокет за файловым объектом http.client
+            sock = getattr(getattr(getattr(getattr(raw, "_fp", None), "fp", None), "raw", None), "_sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        response.close()
+    
+    def iter_events(
+        self,
+        since: Optional[int] = None,
+        types: Optional[str] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Лента событий сервера (Server-Sent Events /events)
+        
+        Отдаёт события {id, type, data, ts} по мере поступления, в том числе
+        keepalive {"type": "ping"}. Заканчивается при закрытии соединения
+        сервером; ошибки соединения пробрасываются (requests.RequestException).
+        
+        Args:
+            since: Номер последнего полученного события (досылка пропущенных)
+            types: Префиксы типов событий через запятую: "history", "job"
+            cancel: При отмене соединение закрывается, поднимается TaskCancelled
+        """
+        params = {}
+        if since is not None:
+            params['since'] = since
+        if types:
+            params['types'] = types
+        with self.session.get(
+            f"{self.base_url}/events",
+            params=params,
+            stream=True,
+            timeout=(10, EVENTS_READ_TIMEOUT)
+        ) as response:
+            response.raise_for_status()
+            if cancel:
+                cancel.on_cancel(lambda: self._abort_stream(response))
+            data_lines = []
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if line is None:
+                        continue
+                    if line.startswith(':'):
+                        yield {'type': 'ping'}
+                    elif line.startswith('data:'):
+                        data_lines.append(line[5:].lstrip())
+                    elif not line and data_lines:
+                        yield json.loads("\n".join(data_lines))
+                        data_lines = []
+            except Exception:
+                # Закрытие соединения из другого потока прерывает чтение ошибкой
+                if cancel and cancel.cancelled:
+                    raise TaskCancelled()
+                raise
+            if cancel:
+                cancel.raise_if_cancelled()
+    
+    def get_history(
+        self,
+        since: Optional[str] = None,
+        etag: Optional[str] = None,
+        cancel: Optional[CancelToken] = None,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Получить историю
+        
+        Args:
+            since: cursor из прошлого ответа - вернутся только новые записи (full=False)
+            etag: ETag из прошлого ответа - если история не менялась,
+                сервер ответит 304 и вернётся {'not_modified': True}
+            offset, limit: страница истории (от новых к старым). Страница
+                сохраняется в локальном кеше и отдаётся из него, если сервер
+                недоступен (с '_cache': {'source': 'cache', ...})
+        """
+        params = {}
+        if since:
+            params['since'] = since
+        if offset:
+            params['offset'] = offset
+        if limit is not None:
+            params['limit'] = limit
+        headers = {'If-None-Match': etag} if etag else None
+        if since or etag or limit is None:
+            return self._make_request('GET', '/history', cancel=cancel, params=params or None, headers=headers)
+        
+        key = cache_key('history', offset, limit)
+        try:
+            page = self._make_request('GET', '/history', cancel=cancel, params=params)
+        except ServerUnavailable:
+            hit = self.cache.get(key)
+            if hit is None:
+                raise
+            page, stored_at = hit
+            page['_cache'] = {'source': 'cache', 'stored_at': stored_at}
+            return page
+        self.cache.put(key, page)
+        return page
     
     def clear_history(self) -> Dict[str, Any]:
         """Очистить историю"""
@@ -101,7 +576,7 @@ class APIClient:
     def health_check(self) -> bool:
         """Проверка доступности сервера"""
         try:
-            response = requests.get(f"{self.base_url}/health", timeout=5)
+            response = self.session.get(f"{self.base_url}/health", timeout=self._timeout('GET', '/health'))
             return response.status_code == 200
         except:
             return False
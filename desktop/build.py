@@ -1,11 +1,24 @@
 """
 Скрипт сборки desktop-приложения в .exe
 Использует PyInstaller для создания исполняемого файла
+
+    python build.py              - один файл (--onefile)
+    python build.py --fast       - быстрый запуск: папка (--onedir) без неиспользуемых модулей Qt
+    python build.py --all        - обе сборки и сравнение времени запуска
+    python build.py --bench      - замер времени до первого окна для уже собранных вариантов
+    python build.py clean        - очистить артефакты сборки
+
+Сборка --onefile при каждом запуске распаковывает Python и Qt во временную
+папку, поэтому холодный запуск занимает секунды. Сборка --fast запускается
+из папки без распаковки, не содержит неиспользуемых модулей и плагинов Qt
+и не сжимается UPX (распаковка UPX тоже замедляет запуск).
 """
 import sys
 import os
 import shutil
 import subprocess
+import tempfile
+import time
 from pathlib import Path
 
 # Настройка кодировки для Windows
@@ -15,10 +28,139 @@ if sys.platform == "win32":
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
 
-def build_exe():
-    """Собрать .exe файл"""
+# Имя приложения
+APP_NAME = "CompetitorMonitor"
+FAST_APP_NAME = "CompetitorMonitorFast"
+
+# Модули, которые приложение не использует (Qt - только Core, Gui, Widgets)
+EXCLUDED_MODULES = (
+    "PyQt6.QtNetwork", "PyQt6.QtQml", "PyQt6.QtQuick", "PyQt6.QtQuickWidgets",
+    "PyQt6.QtWebEngineCore", "PyQt6.QtWebEngineWidgets", "PyQt6.QtWebChannel",
+    "PyQt6.QtMultimedia", "PyQt6.QtMultimediaWidgets", "PyQt6.QtSql", "PyQt6.QtSvg",
+    "PyQt6.QtSvgWidgets", "PyQt6.QtPdf", "PyQt6.QtPdfWidgets", "PyQt6.QtOpenGL",
+    "PyQt6.QtOpenGLWidgets", "PyQt6.QtPrintSupport", "PyQt6.QtBluetooth", "PyQt6.QtNfc",
+    "PyQt6.QtPositioning", "PyQt6.QtSensors", "PyQt6.QtSerialPort", "PyQt6.QtTest",
+    "PyQt6.QtDesigner", "PyQt6.QtHelp", "PyQt6.QtXml", "PyQt6.QtDBus",
+    "tkinter", "unittest", "pydoc", "pydoc_data", "test", "distutils", "setuptools",
+)
+# Плагины Qt, которые удаляются из сборки --fast (относительно папки plugins)
+EXCLUDED_QT_PLUGINS = (
+    "networkinformation", "tls", "sqldrivers", "multimedia", "position",
+    "printsupport", "qmltooling", "designer", "platforminputcontexts",
+    "virtualkeyboard", "generic", "egldeviceintegrations", "xcbglintegrations",
+    "wayland-decoration-client", "wayland-graphics-integration-client",
+    "wayland-shell-integration",
+)
+# Форматы изображений, которые читает приложение (PNG встроен в QtGui)
+KEPT_IMAGE_FORMATS = ("qjpeg", "qgif", "qwebp", "qico")
+
+# Замер запуска: сколько раз запускать и сколько ждать окна
+BENCH_RUNS = 3
+BENCH_TIMEOUT = 60
+
+
+def executable_path(current_dir: Path, fast: bool) -> Path:
+    """Путь к собранному исполняемому файлу"""
+    suffix = ".exe" if sys.platform == "win32" else ""
+    if fast:
+        return current_dir / "dist" / FAST_APP_NAME / f"{FAST_APP_NAME}{suffix}"
+    return current_dir / "dist" / f"{APP_NAME}{suffix}"
+
+
+def folder_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def prune_qt(app_dir: Path) -> int:
+    """
+    Удалить неиспользуемые плагины и переводы Qt из сборки --onedir
+
+    Returns:
+        Освобождено байт
+    """
+    freed = 0
+    
+    def remove(path: Path):
+        nonlocal freed
+        if path.is_dir():
+            freed += folder_size(path)
+            shutil.rmtree(path)
+        elif path.exists():
+            freed += path.stat().st_size
+            path.unlink()
+    
+    for qt_dir in app_dir.rglob("Qt6"):
+        plugins = qt_dir / "plugins"
+        for name in EXCLUDED_QT_PLUGINS:
+            remove(plugins / name)
+        image_formats = plugins / "imageformats"
+        if image_formats.is_dir():
+            for plugin in image_formats.iterdir():
+                if not plugin.name.removeprefix("lib").startswith(KEPT_IMAGE_FORMATS):
+                    remove(plugin)
+        translations = qt_dir / "translations"
+        if translations.is_dir():
+            for translation in translations.iterdir():
+                if not translation.name.startswith("qtbase_ru"):
+                    remove(translation)
+    return freed
+
+
+def measure_startup(executable: Path, runs: int = BENCH_RUNS) -> list:
+    """
+    Время от запуска процесса до показа главного окна (мс) для каждого запуска
+
+    Приложение записывает время показа окна в COMPETITOR_STARTUP_FILE и
+    закрывается (см. main.py). Первый запуск - "холодный".
+    """
+    timings = []
+    with tempfile.TemporaryDirectory() as tmp:
+        marker = Path(tmp) / "startup.txt"
+        for _ in range(runs):
+            marker.unlink(missing_ok=True)
+            env = dict(os.environ, COMPETITOR_STARTUP_FILE=str(marker))
+            started = time.time()
+            process = subprocess.Popen([str(executable)], env=env, cwd=executable.parent)
+            shown = None
+            while time.time() - started < BENCH_TIMEOUT:
+                if marker.exists() and marker.stat().st_size:
+                    shown = float(marker.read_text(encoding="utf-8"))
+                    break
+                if process.poll() is not None:
+                    break
+                time.sleep(0.01)
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            if shown is None:
+                print(f"   ERROR: окно не показано за {BENCH_TIMEOUT} с ({executable.name})")
+                return timings
+            timings.append((shown - started) * 1000)
+    return timings
+
+
+def bench(current_dir: Path):
+    """Сравнить время запуска собранных вариантов"""
+    print("\nВремя до первого окна (мс):")
+    found = False
+    for label, fast in (("--onefile", False), ("--fast (--onedir)", True)):
+        executable = executable_path(current_dir, fast)
+        if not executable.exists():
+            continue
+        found = True
+        timings = measure_startup(executable)
+        if timings:
+            cold, best = timings[0], min(timings)
+            print(f"   {label:20} холодный {cold:7.0f}   лучший {best:7.0f}   ({len(timings)} запусков)")
+    if not found:
+        print("   Нет собранных вариантов: python build.py --all")
+
+
+def build_exe(fast: bool = False):
+    """Собрать .exe файл (fast - папка с быстрым запуском)"""
     print("=" * 60)
-    print("СБОРКА DESKTOP ПРИЛОЖЕНИЯ")
+    print("СБОРКА DESKTOP ПРИЛОЖЕНИЯ" + (" (БЫСТРЫЙ ЗАПУСК)" if fast else ""))
     print("=" * 60)
     
     # Текущая директория
@@ -41,14 +183,13 @@ def build_exe():
         print("   Убедитесь, что вы находитесь в папке desktop/")
         sys.exit(1)
     
-    # Имя приложения
-    app_name = "CompetitorMonitor"
+    app_name = FAST_APP_NAME if fast else APP_NAME
     
     # Параметры PyInstaller
     pyinstaller_args = [
         "pyinstaller",
         "--name", app_name,
-        "--onefile",           # Один .exe файл
+        "--onedir" if fast else "--onefile",  # Папка (без распаковки при запуске) или один .exe
         "--windowed",          # Без консоли
         "--noconfirm",         # Перезаписывать без подтверждения
         "--clean",             # Очистить кеш
@@ -59,6 +200,10 @@ def build_exe():
         # Добавляем файлы
         "--add-data", f"styles.py{os.pathsep}.",
         "--add-data", f"api_client.py{os.pathsep}.",
+        "--add-data", f"task_runner.py{os.pathsep}.",
+        "--add-data", f"history_model.py{os.pathsep}.",
+        "--add-data", f"result_cache.py{os.pathsep}.",
+        "--add-data", f"image_prep.py{os.pathsep}.",
         
         # Скрытые импорты
         "--hidden-import", "PyQt6",
@@ -66,10 +211,13 @@ def build_exe():
         "--hidden-import", "PyQt6.QtWidgets",
         "--hidden-import", "PyQt6.QtGui",
         "--hidden-import", "requests",
-        
-        # Главный файл
-        "main.py"
     ]
+    if fast:
+        pyinstaller_args.append("--noupx")
+        for module in EXCLUDED_MODULES:
+            pyinstaller_args += ["--exclude-module", module]
+    # Главный файл
+    pyinstaller_args.append("main.py")
     
     print(f"\nЗапуск сборки: {app_name}.exe")
     print("-" * 60)
@@ -78,18 +226,22 @@ def build_exe():
     result = subprocess.run(pyinstaller_args, cwd=current_dir)
     
     if result.returncode == 0:
-        exe_path = current_dir / "dist" / f"{app_name}.exe"
+        exe_path = executable_path(current_dir, fast)
         
         if exe_path.exists():
-            size_mb = exe_path.stat().st_size / (1024 * 1024)
+            if fast:
+                freed = prune_qt(exe_path.parent)
+                size_mb = folder_size(exe_path.parent) / (1024 * 1024)
+            else:
+                size_mb = exe_path.stat().st_size / (1024 * 1024)
             print("\n" + "=" * 60)
             print("СБОРКА ЗАВЕРШЕНА УСПЕШНО!")
             print("=" * 60)
             print(f"\nФайл: {exe_path}")
-            print(f"Размер: {size_mb:.1f} MB")
+            print(f"Размер: {size_mb:.1f} MB" + (f" (удалено плагинов Qt: {freed / (1024 * 1024):.1f} MB)" if fast else ""))
             print("\nДля запуска:")
             print(f"   1. Запустите backend: cd .. && python run.py")
-            print(f"   2. Запустите {app_name}.exe")
+            print(f"   2. Запустите {exe_path.name}" + (f" из папки {exe_path.parent}" if fast else ""))
         else:
             print("\nERROR: .exe файл не найден")
     else:
@@ -121,8 +273,15 @@ def clean():
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "clean":
+    args = sys.argv[1:]
+    if "clean" in args:
         clean()
+    elif "--bench" in args:
+        bench(Path(__file__).parent)
+    elif "--all" in args:
+        build_exe(fast=False)
+        build_exe(fast=True)
+        bench(Path(__file__).parent)
     else:
-        build_exe()
+        build_exe(fast="--fast" in args)
 
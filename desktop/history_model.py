@@ -0,0 +1,191 @@
+"""
+Модель списка истории для QListView
+
+История загружается страницами (/history?offset&limit) по мере прокрутки:
+QListView вызывает canFetchMore/fetchMore, когда доходит до конца
+загруженного. Строки форматируются в потоке пула вместе с запросом,
+модель хранит только id и готовый текст, а представление рисует лишь
+видимые строки - прокрутка 100k записей не нагружает поток UI.
+
+Новые записи приходят событиями history.added и вставляются в начало;
+на сервере они тоже добавляются в начало, поэтому следующая страница
+запрашивается с offset = число загруженных строк.
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt, pyqtSignal
+
+from api_client import api_client
+from task_runner import TaskRunner
+
+# Записей в одной странице
+PAGE_SIZE = 200
+
+# Типы запросов на русском
+TYPE_LABELS = {
+    'text': '📝 Текст',
+    'image': '🖼️ Изображение',
+    'parse': '🌐 Парсинг',
+    'crawl': '🕸️ Обход сайта',
+    'compare': '⚖️ Сравнение',
+    'monitor': '🔔 Мониторинг'
+}
+
+
+def format_history_item(item: dict) -> str:
+    """Строка списка истории для записи"""
+    request_type = item.get('request_type', 'unknown')
+    request_summary = item.get('request_summary', '')
+    timestamp = item.get('timestamp', '')
+
+    # Форматируем дату если есть
+    if timestamp:
+        try:
+            # Убираем 'Z' и обрабатываем ISO формат
+            dt = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+            time_str = dt.strftime("%Y-%m-%d %H:%M")
+        except ValueError:
+            # Если не удалось распарсить, используем как есть
+            time_str = str(timestamp)[:16]
+    else:
+        time_str = ""
+
+    type_label = TYPE_LABELS.get(request_type, f'❓ {request_type}')
+
+    # Формируем строку для отображения
+    if time_str:
+        display_text = f"[{time_str}] {type_label}: {request_summary[:55]}"
+    else:
+        display_text = f"{type_label}: {request_summary[:60]}"
+
+    if len(request_summary) > (55 if time_str else 60):
+        display_text += "..."
+    return display_text
+
+
+def fetch_history_page(offset: int, limit: int, cancel=None) -> dict:
+    """Загрузить страницу истории и отформатировать строки (в потоке пула)"""
+    page = api_client.get_history(offset=offset, limit=limit, cancel=cancel)
+    cache = page.get('_cache') or {}
+    return {
+        'offset': page.get('offset', offset),
+        'total': page.get('total', 0),
+        'rows': [(item.get('id'), format_history_item(item)) for item in page.get('items', [])],
+        # Сервер недоступен: страница из локального кеша (время сохранения)
+        'cached_at': cache.get('stored_at') if cache.get('source') == 'cache' else None,
+    }
+
+
+class HistoryListModel(QAbstractListModel):
+    """История запросов с постраничной подгрузкой"""
+
+    # Изменилось число записей на сервере (для подписи под списком)
+    total_changed = pyqtSignal(int)
+    # Ошибка загрузки страницы
+    load_failed = pyqtSignal(str)
+
+    IdRole = Qt.ItemDataRole.UserRole
+
+    def __init__(self, tasks: TaskRunner, page_size: int = PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.tasks = tasks
+        self.page_size = page_size
+        self._rows: List[Tuple[str, str]] = []
+        self._ids = set()
+        # None - размер истории ещё неизвестен (ни одной страницы не загружено)
+        self._total: Optional[int] = None
+        self._fetching = False
+        # Время сохранения последней страницы, показанной из локального кеша
+        self.cached_at: Optional[float] = None
+
+    @property
+    def total(self) -> Optional[int]:
+        return self._total
+
+    # === QAbstractListModel ===
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        item_id, text = self._rows[index.row()]
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return text
+        if role == self.IdRole:
+            return item_id
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        if parent.isValid() or self._fetching:
+            return False
+        return self._total is None or len(self._rows) < self._total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._fetching = True
+        self.tasks.submit(
+            "history", fetch_history_page, len(self._rows), self.page_size,
+            on_result=self._append_page,
+            on_error=self._page_failed
+        )
+
+    # === Обновление ===
+
+    def reload(self):
+        """Сбросить список и загрузить первую страницу заново"""
+        self.tasks.cancel_key("history")
+        self._fetching = False
+        self.beginResetModel()
+        self._rows = []
+        self._ids = set()
+        self._total = None
+        self.cached_at = None
+        self.endResetModel()
+        self.fetchMore()
+
+    def clear(self):
+        """История очищена на сервере"""
+        self.tasks.cancel_key("history")
+        self._fetching = False
+        self.beginResetModel()
+        self._rows = []
+        self._ids = set()
+        self._total = 0
+        self.endResetModel()
+        self.total_changed.emit(0)
+
+    def prepend(self, item: dict):
+        """Новая запись из события history.added"""
+        item_id = item.get('id')
+        if self._total is None or item_id in self._ids:
+            # Первая страница ещё не пришла - запись будет в ней
+            return
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._rows.insert(0, (item_id, format_history_item(item)))
+        self._ids.add(item_id)
+        self.endInsertRows()
+        self._total += 1
+        self.total_changed.emit(self._total)
+
+    def _append_page(self, page: dict):
+        self._fetching = False
+        self.cached_at = page['cached_at']
+        # Записи, которые уже вставлены по событиям, пропускаем
+        rows = [row for row in page['rows'] if row[0] not in self._ids]
+        if rows:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+            self._rows.extend(rows)
+            self._ids.update(row[0] for row in rows)
+            self.endInsertRows()
+        # Пустая страница при ненулевом total (записи вытеснены) - больше не грузим
+        self._total = page['total'] if page['rows'] else len(self._rows)
+        self.total_changed.emit(self._total)
+
+    def _page_failed(self, error: str):
+        self._fetching = False
+        self.load_failed.emit(error)
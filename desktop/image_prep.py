@@ -0,0 +1,97 @@
+"""
+Подготовка изображения к загрузке
+
+Сервер всё равно уменьшает изображение до image.max_dimension и
+перекодирует в JPEG (GET /capabilities), поэтому клиент делает это сам
+до загрузки: скриншот PNG на 15 МБ превращается в JPEG на сотни КБ.
+JPEG декодируется сразу в уменьшенном размере (QImageReader.setScaledSize),
+ориентация из EXIF применяется при чтении.
+"""
+from typing import Optional, Tuple
+
+try:
+    from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, QSize, Qt
+    from PyQt6.QtGui import QColor, QImage, QImageReader, QPainter
+    QT_AVAILABLE = True
+except ImportError:
+    QT_AVAILABLE = False
+
+# Ограничения по умолчанию, если сервер не сообщил свои (совпадают с backend/config.py)
+DEFAULT_MAX_DIMENSION = 2048
+DEFAULT_JPEG_QUALITY = 85
+
+
+def _scaled_size(size: 'QSize', max_dimension: int) -> 'QSize':
+    """Размер с сохранением пропорций, большая сторона не больше max_dimension"""
+    scale = max_dimension / max(size.width(), size.height())
+    return QSize(max(1, round(size.width() * scale)), max(1, round(size.height() * scale)))
+
+
+def prepare_image(
+    image_path: str,
+    content: bytes,
+    max_dimension: int = DEFAULT_MAX_DIMENSION,
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY
+) -> Optional[Tuple[bytes, str, str]]:
+    """
+    Уменьшить и перекодировать изображение в JPEG
+
+    Args:
+        image_path: Путь к файлу (для имени загрузки)
+        content: Содержимое файла
+
+    Returns:
+        (байты, имя файла, MIME-тип) или None - загружать исходный файл
+        (Qt недоступен, формат не читается или перекодирование не уменьшает размер)
+    """
+    if not QT_AVAILABLE:
+        return None
+
+    buffer = QBuffer()
+    buffer.setData(QByteArray(content))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    reader = QImageReader(buffer)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if not size.isValid():
+        return None
+    image_format = reader.format().data().decode('ascii', 'ignore').lower()
+    oversized = max(size.width(), size.height()) > max_dimension
+    if not oversized and image_format in ('jpeg', 'jpg'):
+        # JPEG в допустимом размере: повторное сжатие только испортит качество
+        return None
+
+    if oversized:
+        # JPEG декодируется сразу в уменьшенном масштабе - память не зависит от исходника
+        reader.setScaledSize(_scaled_size(size, max_dimension))
+    image = reader.read()
+    if image.isNull():
+        return None
+    if max(image.width(), image.height()) > max_dimension:
+        # Поворот по EXIF применяется после setScaledSize
+        image = image.scaled(
+            max_dimension, max_dimension,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation
+        )
+
+    if image.hasAlphaChannel():
+        # Прозрачность на белом фоне, как на сервере
+        background = QImage(image.size(), QImage.Format.Format_RGB32)
+        background.fill(QColor("white"))
+        painter = QPainter(background)
+        painter.drawImage(0, 0, image)
+        painter.end()
+        image = background
+
+    output = QByteArray()
+    out_buffer = QBuffer(output)
+    out_buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    if not image.save(out_buffer, "JPEG", jpeg_quality):
+        return None
+    data = output.data()
+    if len(data) >= len(content):
+        return None
+
+    stem = image_path.replace('\\', '/').rsplit('/', 1)[-1].rsplit('.', 1)[0] or 'image'
+    return data, f"{stem}.jpg", 'image/jpeg'
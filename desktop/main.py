@@ -1,26 +1,45 @@
 """
 Главное окно PyQt6 приложения
 Мониторинг конкурентов - Desktop App
+
+При запуске сначала показывается заставка, и только потом импортируются
+сетевой клиент и его зависимости (requests, sqlite3): окно приложения
+появляется сразу, а не после загрузки всех модулей.
 """
 import sys
+import time
 import traceback
 import json
 import os
 from datetime import datetime
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QTextEdit, QLineEdit, QLabel, QListWidget, QStackedWidget,
-    QMessageBox
+    QPushButton, QTextEdit, QLineEdit, QLabel, QListView, QStackedWidget,
+    QMessageBox, QSplashScreen
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QFont
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QPixmap
 
-from api_client import api_client
 from styles import DARK_THEME
 
 # Настройка логирования
 LOG_FILE = os.path.join(os.path.dirname(__file__), "app.log")
 
+# Замер времени запуска (build.py --bench): в файл записывается время
+# показа главного окна, после чего приложение закрывается
+STARTUP_FILE = os.getenv("COMPETITOR_STARTUP_FILE")
+
+# Сетевой клиент: импортируется после показа заставки (load_services)
+api_client = None
+
+
+def load_services():
+    """Импортировать сетевой клиент и его зависимости"""
+    global api_client
+    if api_client is None:
+        from api_client import api_client as client
+        api_client = client
+
 def log_error(message: str, exception: Exception = None):
     """Логирование ошибок в файл"""
     try:
@@ -34,6 +53,17 @@ def log_error(message: str, exception: Exception = None):
         pass  # Если не можем записать в лог, просто игнорируем
 
 
+def format_facts(facts: list) -> list:
+    """Строки блока фактов локальных правил (без LLM)"""
+    if not facts:
+        return []
+    lines = ["🔎 НАЙДЕННЫЕ ФАКТЫ", "-" * 60]
+    for fact in facts:
+        lines.append(f"• {fact.get('label', fact.get('rule'))}: {', '.join(fact.get('matches', []))}")
+    lines.append("")
+    return lines
+
+
 def format_response_as_text(response: dict) -> str:
     """Преобразует JSON ответ в читаемый текст"""
     if not isinstance(response, dict):
@@ -86,6 +116,8 @@ def format_response_as_text(response: dict) -> str:
                 result_parts.append(f"{i}. {rec}")
             result_parts.append("")
     
+    result_parts.extend(format_facts(response.get('facts')))
+    
     # Обработка анализа изображения
     if 'analysis' in response and response['analysis']:
         analysis = response['analysis']
@@ -182,6 +214,8 @@ def format_response_as_text(response: dict) -> str:
                 for i, rec in enumerate(analysis['recommendations'], 1):
                     result_parts.append(f"{i}. {rec}")
                 result_parts.append("")
+        
+        result_parts.extend(format_facts(data.get('facts')))
     
     if not result_parts:
         # Если ничего не найдено, возвращаем JSON для отладки
@@ -190,42 +224,85 @@ def format_response_as_text(response: dict) -> str:
     return "\n".join(result_parts)
 
 
-class WorkerThread(QThread):
-    """Поток для выполнения API запросов"""
-    finished = pyqtSignal(str)  # Изменено на str для безопасности
-    error = pyqtSignal(str)
+def format_cache_note(cache: dict) -> str:
+    """Откуда получен результат: локальный кеш или сервер"""
+    if cache.get('source') == 'cache':
+        stored_at = datetime.fromtimestamp(cache['stored_at']).strftime("%Y-%m-%d %H:%M")
+        return f"💾 Из локального кеша (получено {stored_at}). «Запросить заново» - свежий анализ"
+    return "🆕 Свежий результат с сервера"
+
+
+def format_worker_result(result) -> str:
+    """Результат запроса в текст для UI (выполняется в потоке пула)"""
+    if isinstance(result, dict):
+        cache = result.pop('_cache', None)
+        text = format_response_as_text(result)
+        if cache:
+            text = f"{format_cache_note(cache)}\n\n{text}"
+        return text
+    return str(result)
+
+
+def call_formatted(func, refresh: bool, *args, cancel=None) -> str:
+    """
+    Вызвать метод api_client и отформатировать результат
+
+    refresh передаётся обычным аргументом, а не через partial: аргументы
+    задачи сравниваются при дедупликации повторных кликов в TaskRunner.
+    """
+    result = func(*args, cancel=cancel, refresh=refresh)
+    try:
+        result_str = format_worker_result(result)
+    except Exception as e:
+        log_error("Ошибка форматирования результата", e)
+        raise Exception(f"Ошибка обработки результата: {str(e)}") from e
+    log_error(f"Задача: успешно получен результат, длина: {len(result_str)}")
+    return result_str
+
+
+class EventStreamThread(QThread):
+    """Поток ленты событий сервера: новые записи истории и статусы задач"""
+    event_received = pyqtSignal(dict)
+    
+    # Пауза перед переподключением (растёт до максимума при повторных обрывах)
+    RECONNECT_DELAYS = (1, 2, 5, 10, 30)
     
-    def __init__(self, func, *args):
+    def __init__(self):
         super().__init__()
-        self.func = func
-        self.args = args
+        from api_client import CancelToken
+        # Отмена закрывает соединение ленты: чтение, ждущее ping сервера,
+        # прерывается сразу, а не через EVENTS_KEEPALIVE/EVENTS_READ_TIMEOUT
+        self._cancel = CancelToken()
+        self._last_id = None
+    
+    def stop(self):
+        self._cancel.cancel()
     
     def run(self):
-        try:
-            result = self.func(*self.args)
-            # Преобразуем результат в читаемый текст
+        from api_client import TaskCancelled
+        failures = 0
+        while not self._cancel.cancelled:
             try:
-                if isinstance(result, dict):
-                    # Проверяем, является ли это ответом истории (есть 'items' и 'total')
-                    if 'items' in result and 'total' in result:
-                        # Для истории просто сериализуем в JSON
-                        result_str = json.dumps(result, ensure_ascii=False, indent=2, default=str)
-                    else:
-                        # Для других ответов используем форматирование
-                        result_str = format_response_as_text(result)
-                else:
-                    result_str = str(result)
-                log_error(f"WorkerThread: успешно получен результат, длина: {len(result_str)}")
-                self.finished.emit(result_str)
+                for event in api_client.iter_events(since=self._last_id, cancel=self._cancel):
+                    if self._cancel.cancelled:
+                        return
+                    failures = 0
+                    if event.get('type') == 'ping':
+                        continue
+                    if event.get('id') is not None:
+                        self._last_id = event['id']
+                    self.event_received.emit(event)
+            except TaskCancelled:
+                return
             except Exception as e:
-                log_error(f"WorkerThread: ошибка форматирования результата", e)
-                self.error.emit(f"Ошибка обработки результата: {str(e)}")
-        except Exception as e:
-            error_msg = str(e)
-            if not error_msg:
-                error_msg = f"Неизвестная ошибка: {type(e).__name__}"
-            log_error(f"WorkerThread: исключение при выполнении", e)
-            self.error.emit(error_msg)
+                if self._cancel.cancelled:
+                    return
+                log_error(f"EventStreamThread: соединение с лентой событий прервано: {e}")
+            delay = self.RECONNECT_DELAYS[min(failures, len(self.RECONNECT_DELAYS) - 1)]
+            failures += 1
+            # Пауза прерывается при закрытии окна
+            if self._cancel.wait(delay):
+                return
 
 
 class MainWindow(QMainWindow):
@@ -235,11 +312,21 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 1200, 800)
         self.setStyleSheet(DARK_THEME)
         
-        # Сохраняем ссылки на worker threads
-        self._text_worker = None
-        self._image_worker = None
-        self._parse_worker = None
-        self._history_worker = None
+        load_services()
+        from history_model import HistoryListModel
+        from task_runner import TaskRunner
+        
+        # Общий пул потоков для запросов к серверу
+        self.tasks = TaskRunner(parent=self)
+        self.tasks.running_changed.connect(self._update_task_buttons)
+        self.cancel_buttons = {}
+        
+        # История загружается страницами по мере прокрутки и обновляется по событиям
+        self.history_model = HistoryListModel(self.tasks, parent=self)
+        self.history_model.total_changed.connect(self._update_history_total)
+        self.history_model.load_failed.connect(self._handle_history_error)
+        self._active_jobs = set()
+        self._last_image = None
         
         # Центральный виджет
         central_widget = QWidget()
@@ -261,6 +348,42 @@ class MainWindow(QMainWindow):
         
         # Показываем первую вкладку
         self.content_stack.setCurrentIndex(0)
+        
+        # История загружается один раз, дальше обновляется по событиям
+        self._events_thread = EventStreamThread()
+        self._events_thread.event_received.connect(self._handle_event)
+        self._events_thread.start()
+        self.load_history()
+    
+    def closeEvent(self, event):
+        """Остановить ленту событий и запросы при закрытии окна"""
+        # stop() закрывает соединение ленты, поэтому поток завершается быстро;
+        # ждём без ограничения: уничтожение работающего QThread аварийно
+        # завершает приложение (дольше ждать можно только установку
+        # соединения - не больше таймаута подключения)
+        self._events_thread.stop()
+        self._events_thread.wait()
+        self.tasks.shutdown()
+        api_client.close()
+        super().closeEvent(event)
+    
+    def _handle_event(self, event: dict):
+        """Применить событие сервера к истории и статусу"""
+        event_type = event.get('type')
+        data = event.get('data') or {}
+        if event_type == 'history.added':
+            self.history_model.prepend(data)
+        elif event_type == 'history.cleared':
+            self.history_model.clear()
+        elif event_type == 'job.updated':
+            if data.get('status') in ('queued', 'running'):
+                self._active_jobs.add(data.get('id'))
+            else:
+                self._active_jobs.discard(data.get('id'))
+            if self._active_jobs:
+                self.status_label.setText(f"● Задач в работе: {len(self._active_jobs)}")
+            else:
+                self.status_label.setText("● Система активна")
     
     def create_sidebar(self):
         """Создание боковой панели"""
@@ -322,8 +445,10 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.text_input)
         
         btn = QPushButton("Проанализировать")
-        btn.clicked.connect(self.analyze_text)
+        btn.clicked.connect(lambda: self.analyze_text())
         layout.addWidget(btn)
+        layout.addWidget(self._create_cancel_button("text"))
+        layout.addWidget(self._create_refresh_button("text"))
         
         self.text_result = QTextEdit()
         self.text_result.setReadOnly(True)
@@ -343,6 +468,8 @@ class MainWindow(QMainWindow):
         btn = QPushButton("Выбрать изображение")
         btn.clicked.connect(self.select_image)
         layout.addWidget(btn)
+        layout.addWidget(self._create_cancel_button("image"))
+        layout.addWidget(self._create_refresh_button("image"))
         
         self.image_result = QTextEdit()
         self.image_result.setReadOnly(True)
@@ -364,8 +491,10 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.url_input)
         
         btn = QPushButton("Парсить и анализировать")
-        btn.clicked.connect(self.parse_url)
+        btn.clicked.connect(lambda: self.parse_url())
         layout.addWidget(btn)
+        layout.addWidget(self._create_cancel_button("parse"))
+        layout.addWidget(self._create_refresh_button("parse"))
         
         self.parse_result = QTextEdit()
         self.parse_result.setReadOnly(True)
@@ -382,15 +511,49 @@ class MainWindow(QMainWindow):
         label.setFont(QFont("Arial", 14, QFont.Weight.Bold))
         layout.addWidget(label)
         
-        self.history_list = QListWidget()
+        # Представление рисует только видимые строки; одинаковая высота
+        # строк избавляет от измерения каждой
+        self.history_list = QListView()
+        self.history_list.setUniformItemSizes(True)
+        self.history_list.setModel(self.history_model)
         layout.addWidget(self.history_list)
         
+        self.history_status = QLabel("Загрузка истории...")
+        layout.addWidget(self.history_status)
+        
         btn = QPushButton("Обновить историю")
         btn.clicked.connect(self.load_history)
         layout.addWidget(btn)
         
         return widget
     
+    def _create_cancel_button(self, key: str) -> QPushButton:
+        """Кнопка отмены запроса вкладки (активна, пока запрос выполняется)"""
+        btn = QPushButton("Отменить")
+        btn.setEnabled(False)
+        btn.clicked.connect(lambda: self.cancel_task(key))
+        self.cancel_buttons[key] = btn
+        return btn
+    
+    def _create_refresh_button(self, key: str) -> QPushButton:
+        """Кнопка повторного запроса к серверу в обход локального кеша"""
+        btn = QPushButton("Запросить заново")
+        actions = {'text': self.analyze_text, 'image': self.reanalyze_image, 'parse': self.parse_url}
+        btn.clicked.connect(lambda: actions[key](refresh=True))
+        return btn
+    
+    def _update_task_buttons(self, key: str, running: bool):
+        """Обновить кнопку отмены при запуске и завершении запроса"""
+        btn = self.cancel_buttons.get(key)
+        if btn is not None:
+            btn.setEnabled(running)
+    
+    def cancel_task(self, key: str):
+        """Отменить запрос вкладки (фоновая задача отменяется и на сервере)"""
+        self.tasks.cancel_key(key)
+        results = {'text': self.text_result, 'image': self.image_result, 'parse': self.parse_result}
+        results[key].setText("⏹ Запрос отменён")
+    
     def _handle_text_result(self, result: str):
         """Обработчик результата анализа текста"""
         try:
@@ -405,8 +568,8 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"Критическая ошибка в обработчике: {e}")
     
-    def analyze_text(self):
-        """Анализ текста"""
+    def analyze_text(self, refresh: bool = False):
+        """Анализ текста (повторный - из локального кеша, если не refresh)"""
         text = self.text_input.toPlainText().strip()
         if not text:
             self.text_result.setText("Введите текст для анализа")
@@ -414,12 +577,13 @@ class MainWindow(QMainWindow):
         
         self.text_result.setText("Анализирую...")
         try:
-            worker = WorkerThread(api_client.analyze_text, text)
-            worker.finished.connect(self._handle_text_result)
-            worker.error.connect(self._handle_text_error)
-            # Сохраняем ссылку на worker, чтобы он не удалился
-            self._text_worker = worker
-            worker.start()
+            # Повторный клик с тем же текстом игнорируется, новый текст или
+            # «Запросить заново» отменяет прошлый запрос
+            self.tasks.submit(
+                "text", call_formatted, api_client.analyze_text, refresh, text,
+                on_result=self._handle_text_result,
+                on_error=self._handle_text_error
+            )
         except Exception as e:
             self.text_result.setText(f"❌ Ошибка при запуске: {str(e)}")
     
@@ -445,16 +609,26 @@ class MainWindow(QMainWindow):
                 self, "Выбрать изображение", "", "Images (*.png *.jpg *.jpeg)"
             )
             if filename:
-                self.image_result.setText("Анализирую...")
-                worker = WorkerThread(api_client.analyze_image, filename)
-                worker.finished.connect(self._handle_image_result)
-                worker.error.connect(self._handle_image_error)
-                # Сохраняем ссылку на worker
-                self._image_worker = worker
-                worker.start()
+                self._last_image = filename
+                self.reanalyze_image()
         except Exception as e:
             self.image_result.setText(f"❌ Ошибка при выборе файла: {str(e)}")
     
+    def reanalyze_image(self, refresh: bool = False):
+        """Анализ последнего выбранного изображения"""
+        if not self._last_image:
+            self.image_result.setText("Выберите изображение для анализа")
+            return
+        self.image_result.setText("Анализирую...")
+        try:
+            self.tasks.submit(
+                "image", call_formatted, api_client.analyze_image, refresh, self._last_image,
+                on_result=self._handle_image_result,
+                on_error=self._handle_image_error
+            )
+        except Exception as e:
+            self.image_result.setText(f"❌ Ошибка при запуске: {str(e)}")
+    
     def _handle_parse_result(self, result: str):
         """Обработчик результата парсинга"""
         try:
@@ -469,8 +643,8 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"Критическая ошибка в обработчике: {e}")
     
-    def parse_url(self):
-        """Парсинг URL"""
+    def parse_url(self, refresh: bool = False):
+        """Парсинг URL (повторный - из локального кеша, если не refresh)"""
         url = self.url_input.text().strip()
         if not url:
             self.parse_result.setText("Введите URL для парсинга")
@@ -482,114 +656,37 @@ class MainWindow(QMainWindow):
         
         self.parse_result.setText("Парсирую...")
         try:
-            worker = WorkerThread(api_client.parse_demo, url)
-            worker.finished.connect(self._handle_parse_result)
-            worker.error.connect(self._handle_parse_error)
-            # Сохраняем ссылку на worker
-            self._parse_worker = worker
-            worker.start()
+            self.tasks.submit(
+                "parse", call_formatted, api_client.parse_demo, refresh, url,
+                on_result=self._handle_parse_result,
+                on_error=self._handle_parse_error
+            )
         except Exception as e:
             self.parse_result.setText(f"❌ Ошибка при запуске: {str(e)}")
     
-    def _handle_history_result(self, result: str):
-        """Обработчик результата загрузки истории"""
-        try:
-            # Парсим JSON ответ
-            history_data = json.loads(result)
-            
-            self.history_list.clear()
-            
-            items = history_data.get('items', [])
-            total = history_data.get('total', 0)
-            
-            if not items or total == 0:
-                self.history_list.addItem("📭 История пуста")
-                self.history_list.addItem("Выполните анализ текста, изображения или парсинг, чтобы увидеть историю")
-                return
-            
-            # Форматируем каждый элемент истории
-            for item in items:
-                request_type = item.get('request_type', 'unknown')
-                request_summary = item.get('request_summary', '')
-                timestamp = item.get('timestamp', '')
-                
-                # Форматируем дату если есть
-                if timestamp:
-                    try:
-                        from datetime import datetime
-                        # Обрабатываем разные форматы timestamp
-                        if isinstance(timestamp, str):
-                            # Убираем 'Z' и обрабатываем ISO формат
-                            timestamp_clean = timestamp.replace('Z', '+00:00')
-                            if '+' in timestamp_clean or timestamp_clean.endswith('+00:00'):
-                                dt = datetime.fromisoformat(timestamp_clean)
-                            else:
-                                dt = datetime.fromisoformat(timestamp_clean)
-                            time_str = dt.strftime("%Y-%m-%d %H:%M")
-                        else:
-                            # Если это уже объект datetime
-                            time_str = timestamp.strftime("%Y-%m-%d %H:%M")
-                    except Exception as e:
-                        # Если не удалось распарсить, используем как есть
-                        time_str = str(timestamp)[:16] if len(str(timestamp)) > 16 else str(timestamp)
-                else:
-                    time_str = ""
-                
-                # Типы запросов на русском
-                type_map = {
-                    'text': '📝 Текст',
-                    'image': '🖼️ Изображение',
-                    'parse': '🌐 Парсинг'
-                }
-                type_label = type_map.get(request_type, f'❓ {request_type}')
-                
-                # Формируем строку для отображения
-                if time_str:
-                    display_text = f"[{time_str}] {type_label}: {request_summary[:55]}"
-                else:
-                    display_text = f"{type_label}: {request_summary[:60]}"
-                
-                if len(request_summary) > (55 if time_str else 60):
-                    display_text += "..."
-                
-                self.history_list.addItem(display_text)
-            
-            # Добавляем информацию о количестве
-            if total > 0:
-                self.history_list.addItem("")
-                self.history_list.addItem(f"Всего записей: {total}")
-        except json.JSONDecodeError as e:
-            self.history_list.clear()
-            self.history_list.addItem(f"❌ Ошибка парсинга JSON: {str(e)}")
-            self.history_list.addItem(f"Ответ: {result[:200]}")
-        except Exception as e:
-            self.history_list.clear()
-            self.history_list.addItem(f"❌ Ошибка загрузки истории: {str(e)}")
-            import traceback
-            log_error(f"Ошибка в _handle_history_result: {str(e)}", e)
+    def _update_history_total(self, total: int):
+        """Подпись под списком истории"""
+        if total:
+            text = f"Всего записей: {total}"
+        else:
+            text = "📭 История пуста. Выполните анализ текста, изображения или парсинг, чтобы увидеть историю"
+        cached_at = self.history_model.cached_at
+        if cached_at is not None:
+            stored_at = datetime.fromtimestamp(cached_at).strftime("%Y-%m-%d %H:%M")
+            text = f"💾 Сервер недоступен, показана сохранённая история ({stored_at}). {text}"
+        self.history_status.setText(text)
     
     def _handle_history_error(self, error: str):
         """Обработчик ошибки загрузки истории"""
-        try:
-            self.history_list.clear()
-            self.history_list.addItem(f"❌ Ошибка: {error}")
-        except Exception as e:
-            print(f"Критическая ошибка в обработчике истории: {e}")
+        self.history_status.setText(f"❌ Ошибка загрузки истории: {error}")
     
     def load_history(self):
-        """Загрузка истории"""
-        self.history_list.clear()
-        self.history_list.addItem("Загрузка истории...")
+        """Загрузка истории заново (следующие страницы - при прокрутке)"""
+        self.history_status.setText("Загрузка истории...")
         try:
-            worker = WorkerThread(api_client.get_history)
-            worker.finished.connect(self._handle_history_result)
-            worker.error.connect(self._handle_history_error)
-            # Сохраняем ссылку на worker
-            self._history_worker = worker
-            worker.start()
+            self.history_model.reload()
         except Exception as e:
-            self.history_list.clear()
-            self.history_list.addItem(f"❌ Ошибка при запуске: {str(e)}")
+            self.history_status.setText(f"❌ Ошибка при запуске: {str(e)}")
 
 
 def exception_hook(exctype, value, tb):
@@ -612,19 +709,49 @@ def exception_hook(exctype, value, tb):
             print(f"Не удалось показать диалог ошибки: {e}")
 
 
+def show_splash(app: QApplication) -> QSplashScreen:
+    """Заставка, пока загружаются модули и создаётся главное окно"""
+    pixmap = QPixmap(360, 120)
+    pixmap.fill(QColor("#1e1e2e"))
+    splash = QSplashScreen(pixmap)
+    splash.showMessage(
+        "Мониторинг конкурентов\nЗагрузка...",
+        Qt.AlignmentFlag.AlignCenter,
+        QColor("white")
+    )
+    splash.show()
+    app.processEvents()
+    return splash
+
+
+def report_startup(window: QMainWindow):
+    """Записать время показа окна для замера запуска и закрыть приложение"""
+    try:
+        with open(STARTUP_FILE, 'w', encoding='utf-8') as f:
+            f.write(repr(time.time()))
+    finally:
+        window.close()
+
+
 def main():
     # Устанавливаем глобальный обработчик исключений
     sys.excepthook = exception_hook
     
     app = QApplication(sys.argv)
+    splash = show_splash(app)
     
     try:
         window = MainWindow()
         window.show()
+        splash.finish(window)
+        if STARTUP_FILE:
+            # Срабатывает, когда окно показано и цикл событий запущен
+            QTimer.singleShot(0, lambda: report_startup(window))
         sys.exit(app.exec())
     except Exception as e:
         error_msg = ''.join(traceback.format_exception(type(e), e, e.__traceback__))
         print(f"Ошибка при запуске приложения:\n{error_msg}")
+        splash.close()
         
         msg = QMessageBox()
         msg.setIcon(QMessageBox.Icon.Critical)
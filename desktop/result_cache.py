@@ -0,0 +1,150 @@
+"""
+Локальный кеш результатов на диске
+
+Полные ответы сервера хранятся в SQLite по хешу содержимого запроса:
+повторный анализ того же текста или изображения отвечает сразу, без
+запроса к серверу (и OpenAI), а последние загруженные страницы истории
+доступны, когда сервер недоступен.
+
+Размер кеша ограничен (COMPETITOR_CACHE_MAX_MB): при превышении
+удаляются записи, которые дольше всего не читались (LRU). Ответы
+хранятся сжатыми (zlib).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+# Файл кеша: в домашней директории пользователя, чтобы переживать
+# обновления собранного приложения
+CACHE_DIR = os.getenv("COMPETITOR_CACHE_DIR", str(Path.home() / ".competitor_monitor"))
+CACHE_FILE = "result_cache.db"
+# Максимальный размер сжатых ответов в кеше
+CACHE_MAX_BYTES = int(float(os.getenv("COMPETITOR_CACHE_MAX_MB", "100")) * 1024 * 1024)
+# Сколько результат парсинга считается свежим: страница конкурента
+# меняется, в отличие от текста или изображения с тем же хешем
+PARSE_CACHE_TTL = float(os.getenv("COMPETITOR_PARSE_CACHE_TTL_MINUTES", "30")) * 60
+
+
+def cache_key(kind: str, *parts: Any) -> str:
+    """Ключ кеша: тип запроса и хеш его содержимого (строки или байты)"""
+    digest = hashlib.sha256(kind.encode("utf-8"))
+    for part in parts:
+        digest.update(b"\0")
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+    return f"{kind}:{digest.hexdigest()}"
+
+
+class ResultCache:
+    """Кеш ответов с вытеснением давно не использованных записей"""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = Path(path) if path else Path(CACHE_DIR) / CACHE_FILE
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Открыть базу при первом обращении (None - кеш недоступен)"""
+        if self._conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    " key TEXT PRIMARY KEY,"
+                    " value BLOB NOT NULL,"
+                    " size INTEGER NOT NULL,"
+                    " stored_at REAL NOT NULL,"
+                    " accessed_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)")
+                conn.commit()
+                self._conn = conn
+            except (OSError, sqlite3.Error) as e:
+                print(f"⚠️ Локальный кеш недоступен: {e}")
+                self.max_bytes = 0
+        return self._conn
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        Прочитать запись
+
+        Returns:
+            (значение, время сохранения) или None
+        """
+        if self.max_bytes <= 0:
+            return None
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute("SELECT value, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+                return json.loads(zlib.decompress(row[0])), row[1]
+            except (sqlite3.Error, zlib.error, ValueError) as e:
+                print(f"⚠️ Ошибка чтения локального кеша: {e}")
+                return None
+
+    def put(self, key: str, value: Any):
+        """Сохранить запись и вытеснить старые, если кеш переполнен"""
+        if self.max_bytes <= 0:
+            return
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), now, now)
+                )
+                self._evict(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Ошибка записи в локальный кеш: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Удалить давно не читавшиеся записи сверх лимита размера"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def clear(self):
+        """Удалить все записи"""
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                conn.execute("DELETE FROM entries")
+                conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+result_cache = ResultCache()
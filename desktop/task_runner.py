@@ -0,0 +1,161 @@
+"""
+Выполнение запросов к backend в общем пуле потоков
+
+Вместо отдельного QThread на каждое действие задачи выполняются в
+QThreadPool ограниченного размера. У каждой задачи есть id и признак
+отмены (CancelToken): отмена прерывает ожидание ответа и отменяет
+фоновую задачу на сервере, а результат отменённой задачи в UI не
+попадает.
+
+Задачи группируются по ключу действия ("text", "parse", "history"...):
+- повторный запуск с теми же аргументами, пока задача выполняется,
+  игнорируется (двойной клик);
+- запуск с другими аргументами или с supersede=True отменяет предыдущую
+  задачу с тем же ключом.
+"""
+import itertools
+from typing import Any, Callable, Dict, Optional
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from api_client import CancelToken, TaskCancelled
+
+# Максимум одновременно выполняемых запросов (и потоков пула)
+MAX_THREADS = 4
+
+
+class _TaskSignals(QObject):
+    """Сигналы задач: доставляются в поток UI"""
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    done = pyqtSignal(int)
+
+
+class _Task(QRunnable):
+    """Задача пула: вызывает func(*args, cancel=token)"""
+
+    def __init__(self, request_id: int, func: Callable, args: tuple, token: CancelToken, signals: _TaskSignals):
+        super().__init__()
+        self.request_id = request_id
+        self.func = func
+        self.args = args
+        self.token = token
+        self.signals = signals
+
+    def run(self):
+        try:
+            if self.token.cancelled:
+                return
+            result = self.func(*self.args, cancel=self.token)
+            if not self.token.cancelled:
+                self.signals.finished.emit(self.request_id, result)
+        except TaskCancelled:
+            pass
+        except Exception as e:
+            if not self.token.cancelled:
+                self.signals.failed.emit(self.request_id, str(e) or f"Неизвестная ошибка: {type(e).__name__}")
+        finally:
+            self.signals.done.emit(self.request_id)
+
+
+class TaskRunner(QObject):
+    """Пул потоков для запросов UI с отменой, дедупликацией и вытеснением"""
+
+    # Изменилось множество выполняющихся ключей (для состояния кнопок)
+    running_changed = pyqtSignal(str, bool)
+
+    def __init__(self, max_threads: int = MAX_THREADS, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._signals = _TaskSignals()
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        self._signals.done.connect(self._on_done)
+        self._ids = itertools.count(1)
+        self._tasks: Dict[int, dict] = {}
+
+    def submit(
+        self,
+        key: str,
+        func: Callable,
+        *args,
+        on_result: Callable[[Any], None],
+        on_error: Optional[Callable[[str], None]] = None,
+        supersede: bool = False
+    ) -> int:
+        """
+        Запустить задачу
+
+        Args:
+            key: Ключ действия (одна выполняющаяся задача на ключ)
+            func: Блокирующая функция, вызывается как func(*args, cancel=CancelToken)
+            on_result / on_error: Обработчики в потоке UI
+            supersede: Отменить выполняющуюся задачу с тем же ключом, даже
+                если аргументы совпадают
+
+        Returns:
+            id задачи (для повторного клика - id уже выполняющейся)
+        """
+        for request_id, task in list(self._tasks.items()):
+            if task["key"] != key:
+                continue
+            if not supersede and task["args"] == args and not task["token"].cancelled:
+                return request_id
+            self.cancel(request_id)
+
+        request_id = next(self._ids)
+        token = CancelToken()
+        self._tasks[request_id] = {
+            "key": key,
+            "args": args,
+            "token": token,
+            "on_result": on_result,
+            "on_error": on_error,
+        }
+        self.pool.start(_Task(request_id, func, args, token, self._signals))
+        self.running_changed.emit(key, True)
+        return request_id
+
+    def cancel(self, request_id: int) -> bool:
+        """Отменить задачу по id; результат в UI не придёт"""
+        task = self._tasks.pop(request_id, None)
+        if task is None:
+            return False
+        task["token"].cancel()
+        if not self.is_running(task["key"]):
+            self.running_changed.emit(task["key"], False)
+        return True
+
+    def cancel_key(self, key: str):
+        """Отменить задачи действия"""
+        for request_id, task in list(self._tasks.items()):
+            if task["key"] == key:
+                self.cancel(request_id)
+
+    def cancel_all(self):
+        for request_id in list(self._tasks):
+            self.cancel(request_id)
+
+    def is_running(self, key: str) -> bool:
+        return any(task["key"] == key for task in self._tasks.values())
+
+    def shutdown(self, timeout_ms: int = 2000):
+        """Отменить всё и дождаться потоков (при закрытии окна)"""
+        self.cancel_all()
+        self.pool.waitForDone(timeout_ms)
+
+    def _on_finished(self, request_id: int, result: Any):
+        task = self._tasks.get(request_id)
+        if task is not None:
+            task["on_result"](result)
+
+    def _on_failed(self, request_id: int, error: str):
+        task = self._tasks.get(request_id)
+        if task is not None and task["on_error"] is not None:
+            task["on_error"](error)
+
+    def _on_done(self, request_id: int):
+        task = self._tasks.pop(request_id, None)
+        if task is not None and not self.is_running(task["key"]):
+            self.running_changed.emit(task["key"], False)
@@ -1,6 +1,13 @@
 """
 Скрипт запуска сервера
+
+    python run.py            - режим разработки (автоперезагрузка, один процесс)
+    python run.py --prod     - production: несколько воркеров, uvloop/httptools если установлены
+
+Режим также задаётся переменной APP_ENV=production.
 """
+import importlib.util
+import os
 import sys
 from pathlib import Path
 
@@ -12,7 +19,33 @@ if str(project_root) not in sys.path:
 import uvicorn
 from backend.config import settings
 
-if __name__ == "__main__":
+
+def _module_available(name: str) -> bool:
+    """Проверить, установлен ли модуль (без импорта)"""
+    return importlib.util.find_spec(name) is not None
+
+
+def run_production():
+    """Запуск в production-режиме: воркеры по числу ядер, быстрые loop и HTTP парсер"""
+    workers = settings.api_workers or os.cpu_count() or 1
+    loop = "uvloop" if _module_available("uvloop") else "asyncio"
+    http = "httptools" if _module_available("httptools") else "h11"
+    
+    print(f"Production режим: {workers} воркеров, loop={loop}, http={http}")
+    uvicorn.run(
+        "backend.main:app",
+        host=settings.api_host,
+        port=settings.api_port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        proxy_headers=True,
+        access_log=False
+    )
+
+
+def run_development():
+    """Запуск в режиме разработки с автоперезагрузкой"""
     uvicorn.run(
         "backend.main:app",
         host=settings.api_host,
@@ -21,3 +54,9 @@ if __name__ == "__main__":
         reload_includes=["*.py", "*.html", "*.css", "*.js"]
     )
 
+
+if __name__ == "__main__":
+    if "--prod" in sys.argv or settings.app_env.lower() == "production":
+        run_production()
+    else:
+        run_development()
@@ -0,0 +1,32 @@
+"""Общие фикстуры тестов"""
+import types
+
+import pytest
+
+
+class FakeClock:
+    """Управляемые часы вместо time.monotonic"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """
+    Фабрика: подменить модуль time в модуле сервиса управляемыми часами
+
+    Подменяется только ссылка модуля сервиса, а не глобальный time:
+    event loop asyncio продолжает работать по настоящему времени.
+    """
+    def install(module) -> FakeClock:
+        clock = FakeClock()
+        monkeypatch.setattr(module, "time", types.SimpleNamespace(monotonic=clock, time=clock))
+        return clock
+    return install
@@ -0,0 +1,129 @@
+"""Контроль нагрузки: слоты, очередь и отклонение по задержке (CoDel)"""
+import asyncio
+import importlib
+
+import pytest
+
+admission_module = importlib.import_module("backend.services.admission_service")
+EndpointClassLimiter = admission_module.EndpointClassLimiter
+OverloadedError = admission_module.OverloadedError
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(admission_module)
+
+
+def limiter(concurrency=1, queue_limit=10, target=0.1, interval=1.0):
+    return EndpointClassLimiter("llm", concurrency, queue_limit, target, interval)
+
+
+async def waiting(limiter, count):
+    """Поставить count запросов в очередь и дождаться, пока они в неё встанут"""
+    tasks = [asyncio.create_task(limiter.acquire()) for _ in range(count)]
+    while limiter.queued < count:
+        await asyncio.sleep(0)
+    return tasks
+
+
+def test_queue_limit(clock):
+    async def scenario():
+        class_limiter = limiter(queue_limit=1)
+        await class_limiter.acquire()
+        [waiter] = await waiting(class_limiter, 1)
+        with pytest.raises(OverloadedError) as error:
+            await class_limiter.acquire()
+        assert "очередь" in error.value.reason
+        assert error.value.retry_after >= 1
+
+        class_limiter.release(0.5)
+        await waiter
+        assert class_limiter.in_flight == 1 and class_limiter.queued == 0
+        assert class_limiter.rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_short_delay_is_tolerated(clock):
+    async def scenario():
+        class_limiter = limiter()
+        await class_limiter.acquire()
+        tasks = await waiting(class_limiter, 2)
+        # Задержка выше target, но меньше interval: запросы обслуживаются
+        clock.advance(0.5)
+        class_limiter.release(0.5)
+        clock.advance(0.4)
+        class_limiter.release(0.4)
+        await asyncio.gather(*tasks)
+        assert class_limiter.rejected == 0
+
+    asyncio.run(scenario())
+
+
+def test_persistent_delay_drops_stale_requests(clock):
+    async def scenario():
+        class_limiter = limiter()
+        await class_limiter.acquire()
+        first, *stale = await waiting(class_limiter, 3)
+
+        clock.advance(0.5)
+        class_limiter.release(0.5)
+        await first
+
+        # Задержка в очереди держится выше target дольше interval
+        clock.advance(1.5)
+        class_limiter.release(1.5)
+        results = await asyncio.gather(*stale, return_exceptions=True)
+        assert all(isinstance(result, OverloadedError) for result in results)
+        assert "долго ждал" in results[0].reason
+        assert class_limiter.snapshot()["overloaded"] is True
+        assert class_limiter.in_flight == 0
+
+        # Очередь опустела: следующий запрос проходит и сбрасывает перегрузку
+        await class_limiter.acquire()
+        assert class_limiter.snapshot()["overloaded"] is False
+
+    asyncio.run(scenario())
+
+
+def test_low_delay_ends_dropping(clock):
+    async def scenario():
+        class_limiter = limiter()
+        await class_limiter.acquire()
+        [stale] = await waiting(class_limiter, 1)
+        clock.advance(0.5)
+        class_limiter.release(0.5)
+        await stale
+
+        clock.advance(1.5)
+        [fresh] = await waiting(class_limiter, 1)
+        class_limiter.release(1.5)
+        await fresh
+        assert class_limiter.rejected == 0
+        assert class_limiter.snapshot()["overloaded"] is False
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue(clock):
+    async def scenario():
+        class_limiter = limiter()
+        await class_limiter.acquire()
+        [waiter] = await waiting(class_limiter, 1)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert class_limiter.queued == 0
+        class_limiter.release(0.1)
+        assert class_limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_classify_heavy_endpoints():
+    controller = admission_module.AdmissionController()
+    controller.enabled = True
+    assert controller.classify("POST", "/compare").name == "llm"
+    assert controller.classify("POST", "/crawl/").name == "llm"
+    assert controller.classify("POST", "/parse_demo").name == "parse"
+    assert controller.classify("GET", "/compare") is None
+    assert controller.classify("POST", "/rules/evaluate") is None
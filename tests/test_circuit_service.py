@@ -0,0 +1,111 @@
+"""Circuit breaker: переходы closed -> open -> half-open -> closed"""
+import importlib
+
+import pytest
+
+circuit_module = importlib.import_module("backend.services.circuit_service")
+CircuitBreaker = circuit_module.CircuitBreaker
+CircuitOpenError = circuit_module.CircuitOpenError
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(circuit_module)
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(
+        "test", slow_call_seconds=5,
+        failure_rate=0.5, slow_call_rate=0.8, window=4, min_calls=4,
+        open_seconds=30, half_open_calls=2
+    )
+
+
+def call(breaker, clock, failed=False, duration=0.1, reason="таймаут"):
+    started = breaker.allow()
+    clock.advance(duration)
+    breaker.record(started, failed, reason)
+
+
+def test_opens_on_failure_rate(breaker, clock):
+    call(breaker, clock)
+    call(breaker, clock, failed=True)
+    call(breaker, clock)
+    assert breaker.state == circuit_module.CLOSED
+    # Решение принимается только после min_calls вызовов
+    call(breaker, clock, failed=True)
+    assert breaker.state == circuit_module.OPEN
+    assert "таймаут" in breaker.reason
+
+
+def test_opens_on_slow_calls(breaker, clock):
+    for _ in range(4):
+        call(breaker, clock, duration=6)
+    assert breaker.state == circuit_module.OPEN
+    assert "дольше 5 с" in breaker.reason
+
+
+def test_open_rejects_until_timeout(breaker, clock):
+    for _ in range(4):
+        call(breaker, clock, failed=True)
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.allow()
+    assert error.value.retry_after == 30
+    assert breaker.rejected == 1
+
+    clock.advance(20)
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.allow()
+    assert error.value.retry_after == 10
+
+
+def test_half_open_closes_after_successful_trials(breaker, clock):
+    for _ in range(4):
+        call(breaker, clock, failed=True)
+    clock.advance(31)
+
+    first = breaker.allow()
+    assert breaker.state == circuit_module.HALF_OPEN
+    second = breaker.allow()
+    # Пробных вызовов не больше half_open_calls одновременно
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    breaker.record(first, False)
+    assert breaker.state == circuit_module.HALF_OPEN
+    breaker.record(second, False)
+    assert breaker.state == circuit_module.CLOSED
+    assert breaker.snapshot()["calls"] == 0
+
+
+def test_half_open_failure_reopens(breaker, clock):
+    for _ in range(4):
+        call(breaker, clock, failed=True)
+    clock.advance(31)
+    call(breaker, clock, failed=True, reason="HTTP 502")
+    assert breaker.state == circuit_module.OPEN
+    assert "HTTP 502" in breaker.reason
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_call_started_before_opening_is_ignored(breaker, clock):
+    started = breaker.allow()
+    for _ in range(4):
+        call(breaker, clock, failed=True)
+    breaker.record(started, False)
+    assert breaker.state == circuit_module.OPEN
+
+
+def test_disabled_breaker_never_opens(clock):
+    breaker = CircuitBreaker("off", slow_call_seconds=1, min_calls=1, window=1, enabled=False)
+    for _ in range(5):
+        call(breaker, clock, failed=True)
+    assert breaker.state == circuit_module.CLOSED
+
+
+def test_registry_keys_hosts_with_port():
+    registry = circuit_module.CircuitBreakerRegistry()
+    assert registry.host("https://Example.by/a") is registry.host("https://example.by/b")
+    assert registry.host("http://example.by:8080/") is not registry.host("https://example.by/")
@@ -0,0 +1,158 @@
+"""Фоновые задачи: аренда, продление аренды и отмена выполняющейся задачи"""
+import asyncio
+import importlib
+import sqlite3
+import threading
+import time
+
+import pytest
+
+job_module = importlib.import_module("backend.services.job_service")
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_module.event_service, "publish", lambda *args, **kwargs: None)
+    service = job_module.JobService()
+    service.db_file = tmp_path / "jobs.db"
+    service.upload_dir = tmp_path / "uploads"
+    service.workers = 2
+    service.poll_interval = 0.05
+    service.max_attempts = 3
+    return service
+
+
+def set_column(service, job_id, column, value):
+    with sqlite3.connect(service.db_file) as conn:
+        conn.execute(f"UPDATE jobs SET {column} = ? WHERE id = ?", (value, job_id))
+
+
+def wait_for(service, job_id, statuses=job_module.FINAL_STATUSES, timeout=5.0):
+    async def poll():
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = service.get(job_id)
+            if job.status in statuses:
+                return job
+            await asyncio.sleep(0.02)
+        raise AssertionError(f"Задача не перешла в {statuses}: {service.get(job_id).status}")
+    return poll()
+
+
+def test_expired_lease_is_reclaimed(service):
+    service.register("noop", lambda payload: None)
+    job = service.submit("noop", {})
+
+    first = service._claim_next()
+    assert first["id"] == job.id and first["attempts"] == 1
+    # Аренда действует - задача не выдаётся повторно
+    assert service._claim_next() is None
+
+    set_column(service, job.id, "lease_until", time.time() - 1)
+    second = service._claim_next()
+    assert second["id"] == job.id and second["attempts"] == 2
+
+    # Результат прежней попытки не перезаписывает задачу
+    service._finish(job.id, 1, "done", {"attempt": 1})
+    assert service.get(job.id).status == "running"
+    service._finish(job.id, 2, "done", {"attempt": 2})
+    assert service.get(job.id).result == {"attempt": 2}
+
+
+def test_attempts_limit(service):
+    service.register("noop", lambda payload: None)
+    job = service.submit("noop", {})
+    for _ in range(service.max_attempts):
+        assert service._claim_next() is not None
+        set_column(service, job.id, "lease_until", time.time() - 1)
+    assert service._claim_next() is None
+    assert service.get(job.id).status == "failed"
+
+
+def test_heartbeat_keeps_long_job_leased(service):
+    service.lease_seconds = 0.3
+    calls = []
+
+    def slow(payload):
+        calls.append(payload)
+        time.sleep(1.0)
+        return "ok"
+
+    service.register("slow", slow)
+
+    async def scenario():
+        await service.start()
+        try:
+            job = service.submit("slow", {})
+            return await wait_for(service, job.id)
+        finally:
+            await service.stop()
+
+    job = asyncio.run(scenario())
+    assert job.status == "done" and job.result == "ok"
+    assert job.attempts == 1 and len(calls) == 1
+
+
+def test_cancel_signals_running_handler(service):
+    started = threading.Event()
+    seen = []
+
+    def cooperative(payload):
+        started.set()
+        deadline = time.monotonic() + 5
+        while not service.cancel_requested() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        seen.append(service.cancel_requested())
+        return "late"
+
+    service.register("cooperative", cooperative)
+
+    async def scenario():
+        await service.start()
+        try:
+            job = service.submit("cooperative", {})
+            await asyncio.to_thread(started.wait, 5)
+            await asyncio.to_thread(service.cancel, job.id)
+            while not seen:
+                await asyncio.sleep(0.02)
+            return service.get(job.id)
+        finally:
+            await service.stop()
+
+    job = asyncio.run(scenario())
+    assert seen == [True]
+    assert job.status == "cancelled" and job.result is None
+
+
+def test_cancel_from_other_process_is_seen_on_renewal(service):
+    service.lease_seconds = 0.3
+    started = threading.Event()
+    seen = []
+
+    def cooperative(payload):
+        started.set()
+        deadline = time.monotonic() + 5
+        while not service.cancel_requested() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        seen.append(service.cancel_requested())
+
+    service.register("cooperative", cooperative)
+
+    async def scenario():
+        await service.start()
+        try:
+            job = service.submit("cooperative", {})
+            await asyncio.to_thread(started.wait, 5)
+            # Отмена другим процессом сервера: только запись в базе
+            set_column(service, job.id, "status", "cancelled")
+            while not seen:
+                await asyncio.sleep(0.02)
+        finally:
+            await service.stop()
+
+    asyncio.run(scenario())
+    assert seen == [True]
+
+
+def test_cancel_requested_outside_job(service):
+    assert service.cancel_requested() is False
@@ -0,0 +1,169 @@
+"""Плановый мониторинг: распределение слотов, перенос пропущенных проверок, постановка анализа"""
+import importlib
+import json
+from types import SimpleNamespace
+
+import pytest
+
+monitor_module = importlib.import_module("backend.services.monitor_service")
+
+HOUR = 3600.0
+
+
+class FakeLeases:
+    def __init__(self, holder=None):
+        self.holder = holder
+
+    def acquire_lease(self, name, owner, seconds):
+        if self.holder in (None, owner):
+            self.holder = owner
+            return True
+        return False
+
+
+class FakeJobs:
+    def __init__(self, full=False):
+        self.full = full
+        self.submitted = []
+
+    def submit(self, job_type, payload, priority):
+        if self.full:
+            raise monitor_module.JobQueueFullError("очередь заполнена")
+        self.submitted.append((job_type, payload, priority))
+
+
+class FakeTimeline:
+    """Версия растёт при каждой записи; изменения задаются тестом"""
+
+    normalize_url = staticmethod(monitor_module.timeline_service.normalize_url)
+
+    def __init__(self):
+        self.versions = {}
+        self.changes = {}
+
+    def record(self, parsed_data):
+        url = parsed_data["url"]
+        self.versions[url] = self.versions.get(url, 0) + 1
+        return SimpleNamespace(version=self.versions[url], changed_fields=self.changes.get(url, []))
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = monitor_module.MonitorService()
+    service.targets = [(f"https://site{i}.by", HOUR) for i in range(4)]
+    service.jitter = 0.0
+    service.tick_seconds = 30
+    service.state_file = tmp_path / "monitor_state.json"
+    return service
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    timeline = FakeTimeline()
+    jobs = FakeJobs()
+    leases = FakeLeases()
+    parser = SimpleNamespace(parse_url=lambda url: {"url": url, "title": "t"})
+    monkeypatch.setattr(monitor_module, "timeline_service", timeline)
+    monkeypatch.setattr(monitor_module, "job_service", jobs)
+    monkeypatch.setattr(monitor_module, "shared_state", leases)
+    monkeypatch.setattr(monitor_module, "parser_service", parser)
+    return SimpleNamespace(timeline=timeline, jobs=jobs, leases=leases)
+
+
+def test_parse_targets():
+    targets = monitor_module.parse_targets(" a.by|60, https://B.by/ ,c.by|oops,,a.by|30", 360)
+    assert targets == [("https://a.by", 1800.0), ("https://b.by", 21600.0), ("https://c.by", 21600.0)]
+
+
+def test_new_urls_are_spread_over_interval(service):
+    now = 10_000.0
+    plan = service._plan({}, now)
+    slots = sorted(entry["next_run"] for entry in plan.values())
+    assert slots == [now, now + HOUR / 4, now + HOUR / 2, now + HOUR * 3 / 4]
+
+
+def test_schedule_survives_restart(service):
+    now = 10_000.0
+    plan = service._plan({}, now)
+    planned = {url: entry["next_run"] for url, entry in plan.items()}
+    # Перезапуск через 10 минут: будущие слоты сохраняются, пропущенная проверка - сразу
+    restarted = now + 600
+    replanned = service._plan(json.loads(json.dumps(plan)), restarted)
+    assert {url: entry["next_run"] for url, entry in replanned.items()} == {
+        url: run if run > restarted else restarted for url, run in planned.items()
+    }
+
+
+def test_missed_checks_are_respread(service):
+    now = 10_000.0
+    plan = service._plan({}, now)
+    # Сервер простоял сутки: все проверки пропущены
+    later = now + 24 * HOUR
+    replanned = service._plan(plan, later)
+    slots = sorted(entry["next_run"] for entry in replanned.values())
+    assert slots == [later, later + HOUR / 4, later + HOUR / 2, later + HOUR * 3 / 4]
+
+
+def test_interval_change_and_removed_urls(service):
+    now = 10_000.0
+    plan = service._plan({}, now)
+    plan["https://gone.by"] = {"interval": HOUR, "next_run": now, "checks": 3}
+    service.targets = [("https://site0.by", HOUR), ("https://site1.by", 2 * HOUR)]
+    replanned = service._plan(plan, now + 60)
+    assert set(replanned) == {"https://site0.by", "https://site1.by"}
+    assert replanned["https://site1.by"]["interval"] == 2 * HOUR
+    assert replanned["https://site1.by"]["next_run"] == now + 60
+
+
+def test_next_slot_keeps_schedule(service, fakes, monkeypatch):
+    monkeypatch.setattr(monitor_module, "time", SimpleNamespace(time=lambda: 10_010.0))
+    entry = {"interval": HOUR, "slot": 10_000.0, "next_run": 10_000.0}
+    service.check("https://site0.by", entry)
+    # Отсчёт от слота, а не от времени проверки
+    assert entry["slot"] == 10_000.0 + HOUR
+    assert entry["pending"] == {"version": 1, "changed_fields": []}
+
+    # Проверка отстала больше чем на интервал: следующая - через интервал от текущего момента
+    entry["slot"] = 10_010.0 - 3 * HOUR
+    service.check("https://site0.by", entry)
+    assert entry["slot"] == 10_010.0 + HOUR
+
+
+def test_run_due_checks_only_due_and_queues_changed(service, fakes):
+    service.targets = [("https://site0.by", HOUR), ("https://site1.by", HOUR)]
+    # Первый запуск: проверяется только URL со слотом "сейчас"
+    assert service.run_due() == 1
+    assert [payload["url"] for _, payload, _ in fakes.jobs.submitted] == ["https://site0.by"]
+
+    state = json.loads(service.state_file.read_text(encoding="utf-8"))
+    state["https://site0.by"]["next_run"] = 0
+    service.state_file.write_text(json.dumps(state), encoding="utf-8")
+    # Страница не изменилась: анализ не ставится
+    assert service.run_due() == 1
+    assert len(fakes.jobs.submitted) == 1
+
+    state = json.loads(service.state_file.read_text(encoding="utf-8"))
+    assert state["https://site0.by"]["last_status"] == "unchanged"
+    assert state["https://site0.by"]["checks"] == 2
+
+
+def test_pending_analysis_retried_when_queue_full(service, fakes):
+    service.targets = [("https://site0.by", HOUR)]
+    fakes.jobs.full = True
+    assert service.run_due() == 1
+    state = json.loads(service.state_file.read_text(encoding="utf-8"))
+    assert state["https://site0.by"]["pending"] == {"version": 1, "changed_fields": []}
+
+    fakes.jobs.full = False
+    assert service.run_due() == 0
+    assert [payload for _, payload, _ in fakes.jobs.submitted] == [
+        {"url": "https://site0.by", "version": 1, "changed_fields": []}
+    ]
+    state = json.loads(service.state_file.read_text(encoding="utf-8"))
+    assert "pending" not in state["https://site0.by"]
+
+
+def test_other_leader_skips_checks(service, fakes):
+    fakes.leases.holder = "other-host:1"
+    assert service.run_due() == 0
+    assert not service.state_file.exists()
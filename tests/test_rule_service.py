@@ -0,0 +1,62 @@
+"""Локальные правила: ключевые слова, фразы и перекрывающиеся совпадения"""
+import pytest
+
+from backend.services.rule_service import DEFAULT_RULES, RuleEngine
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return RuleEngine(DEFAULT_RULES)
+
+
+def facts(engine, text):
+    return {fact.rule: fact for fact in engine.evaluate(text)}
+
+
+@pytest.mark.parametrize("text, rule, match", [
+    ("Работаем с государственными заказчиками", "state_customers", "государственными заказчиками"),
+    ("Участвуем в государственной программе", "state_customers", "государственной программе"),
+    ("Более 200 реализованных объектов", "experience", "реализованных объектов"),
+    ("Свыше 50 выполненных объектов", "experience", "выполненных объектов"),
+    ("Используем информационное моделирование", "bim", "информационное моделирование"),
+    ("Передаём цифровую модель здания", "bim", "цифровую модель"),
+])
+def test_multi_word_stems(engine, text, rule, match):
+    assert match in facts(engine, text)[rule].matches
+
+
+def test_phrase_starts_at_word_boundary(engine):
+    assert "state_customers" not in facts(engine, "Негосударственными заказчиками")
+
+
+def test_single_word_stem_and_normalization(engine):
+    result = facts(engine, "ЛИЦЕНЗИЯ и аттестат; Цены ниже рынка")
+    assert set(result["license"].matches) == {"лицензия", "аттестат"}
+    assert result["prices"].matches == ["цены"]
+
+
+def test_overlapping_matches_of_different_rules():
+    engine = RuleEngine([
+        {"id": "more", "keywords": [], "patterns": [r"более \d+"]},
+        {"id": "years", "keywords": [], "patterns": [r"\d+ лет"]},
+    ])
+    result = facts(engine, "Более 20 лет на рынке")
+    assert result["more"].matches == ["более 20"]
+    assert result["years"].matches == ["20 лет"]
+
+
+def test_overlapping_keywords_and_patterns(engine):
+    result = facts(engine, "Проектируем по СНБ 3.02.04-03")
+    assert result["norms"].count == 2
+    assert "снб 3.02.04-03" in result["norms"].matches
+
+
+def test_invalid_pattern_is_skipped(caplog):
+    engine = RuleEngine([{"id": "broken", "keywords": ["смет"], "patterns": ["(("]}])
+    assert facts(engine, "Составим смету")["broken"].matches == ["смету"]
+    assert "broken" in caplog.text
+
+
+def test_empty_text(engine):
+    assert engine.evaluate(None) == []
+    assert engine.evaluate("") == []
@@ -0,0 +1,96 @@
+"""Хронология изменений: keyframe, дельты и восстановление любой версии"""
+import importlib
+import json
+
+import pytest
+
+timeline_module = importlib.import_module("backend.services.timeline_service")
+
+URL = "https://Example.by/uslugi/"
+
+VERSIONS = [
+    {"title": "Авторский надзор", "h1": "Услуги", "first_paragraph": "Работаем по всей Беларуси с 2005 года."},
+    {"title": "Авторский надзор", "h1": "Услуги", "first_paragraph": "Работаем по всей Беларуси с 2005 года."},
+    {"title": "Авторский надзор | Минск", "h1": "Услуги", "first_paragraph": "Работаем по всей Беларуси с 2004 года."},
+    {"title": "Авторский надзор | Минск", "h1": None, "first_paragraph": "Работаем по всей Беларуси с 2004 года."},
+    {"title": "Технический надзор", "h1": "Цены", "first_paragraph": "Новый текст."},
+    {"title": "Технический надзор", "h1": "Цены", "first_paragraph": "Новый текст, дополненный."},
+    {"title": "Технический надзор", "h1": "Цены", "first_paragraph": "Новый текст, дополненный."},
+]
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = timeline_module.TimelineService()
+    service.timeline_dir = tmp_path
+    service.keyframe_interval = 3
+    return service
+
+
+def record_all(service):
+    return [service.record({"url": URL, **version}) for version in VERSIONS]
+
+
+def test_every_version_is_restored(service):
+    record_all(service)
+    for number, expected in enumerate(VERSIONS, 1):
+        snapshot = service.get_snapshot(URL, number)
+        assert snapshot.version == number
+        assert {field: getattr(snapshot, field) for field in expected} == expected
+    assert service.get_snapshot(URL).version == len(VERSIONS)
+    assert service.get_snapshot(URL, len(VERSIONS) + 1) is None
+
+
+def test_keyframes_and_deltas_on_disk(service):
+    entries = record_all(service)
+    assert [entry.keyframe for entry in entries] == [True, False, False, True, False, False, True]
+
+    path = service._timeline_file(service.normalize_url(URL))
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert records[1]["delta"] == {}
+    # Небольшое изменение длинного текста хранится патчем, а не новым значением
+    assert "patch" in records[2]["delta"]["first_paragraph"]
+    assert records[4]["delta"]["h1"] == {"set": "Цены"}
+
+
+def test_changed_fields(service):
+    entries = record_all(service)
+    assert entries[0].changed_fields == list(timeline_module.TRACKED_FIELDS)
+    assert entries[1].changed_fields == []
+    assert entries[2].changed_fields == ["title", "first_paragraph"]
+    assert entries[3].changed_fields == ["h1"]
+
+
+def test_timeline_newest_first_with_details(service):
+    record_all(service)
+    items, total = service.get_timeline(URL, changes_only=True, details=True)
+    assert [item.version for item in items] == [6, 5, 4, 3, 1]
+    assert total == 5
+    h1_change = next(change for change in items[2].changes if change.field == "h1")
+    assert (h1_change.old, h1_change.new) == ("Услуги", None)
+    items, total = service.get_timeline(URL, limit=2)
+    assert [item.version for item in items] == [7, 6]
+    # total - число всех версий, а не размер страницы
+    assert total == len(VERSIONS)
+    items, total = service.get_timeline(URL, limit=2, changes_only=True)
+    assert [item.version for item in items] == [6, 5] and total == 5
+
+
+def test_tail_cache_sees_writes_of_other_processes(service, tmp_path):
+    service.record({"url": URL, **VERSIONS[0]})
+    other = timeline_module.TimelineService()
+    other.timeline_dir = tmp_path
+    other.keyframe_interval = 3
+    other.record({"url": URL, **VERSIONS[2]})
+
+    entry = service.record({"url": URL, **VERSIONS[4]})
+    assert entry.version == 3
+    assert service.get_snapshot(URL, 2).title == VERSIONS[2]["title"]
+
+
+def test_damaged_last_line_is_skipped(service):
+    record_all(service)
+    path = service._timeline_file(service.normalize_url(URL))
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"v": 8, "ts": "2024-')
+    assert service.get_snapshot(URL).version == len(VERSIONS)
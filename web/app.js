@@ -7,7 +7,12 @@
 const state = {
     currentTab: 'text',
     selectedImage: null,
-    isLoading: false
+    isLoading: false,
+    // История загружается один раз, дальше обновляется по событиям сервера
+    // и дозагрузкой новых записей (historyCursor/historyEtag из прошлого ответа)
+    history: null,
+    historyCursor: null,
+    historyEtag: null
 };
 
 // === DOM Elements ===
@@ -45,12 +50,99 @@ const elements = {
     loadingOverlay: document.getElementById('loading-overlay')
 };
 
+// === Overload handling ===
+// При перегрузке сервер отвечает 503 с Retry-After: повторяем со случайным разбросом
+const OVERLOAD_MAX_RETRIES = 3;
+const OVERLOAD_MAX_DELAY_MS = 30000;
+
+async function fetchWithRetry(url, options = {}) {
+    for (let attempt = 0; ; attempt++) {
+        const response = await fetch(url, options);
+        const retryAfter = parseFloat(response.headers.get('Retry-After'));
+        if (response.status !== 503 || isNaN(retryAfter) || attempt >= OVERLOAD_MAX_RETRIES) {
+            return response;
+        }
+        const delay = Math.min(OVERLOAD_MAX_DELAY_MS, retryAfter * 1000 * (1 + Math.random() * 0.5));
+        await new Promise(resolve => setTimeout(resolve, delay));
+    }
+}
+
+// === Подготовка изображений ===
+// Сервер всё равно уменьшает изображение до ограничений из /capabilities,
+// поэтому браузер делает это сам до загрузки (в Web Worker)
+const IMAGE_WORKER_URL = '/static/image_worker.js';
+const IMAGE_DEFAULT_LIMITS = { max_dimension: 2048, jpeg_quality: 85 };
+
+const imagePrep = {
+    limits: null,
+    worker: null,
+    nextId: 1,
+    pending: new Map(),
+    
+    supported() {
+        return typeof Worker !== 'undefined' && typeof OffscreenCanvas !== 'undefined'
+            && typeof createImageBitmap !== 'undefined';
+    },
+    
+    async getLimits() {
+        if (!this.limits) {
+            try {
+                const response = await fetchWithRetry(`${api.baseUrl}/capabilities`);
+                this.limits = response.ok ? (await response.json()).image : IMAGE_DEFAULT_LIMITS;
+            } catch (error) {
+                return IMAGE_DEFAULT_LIMITS;
+            }
+        }
+        return this.limits;
+    },
+    
+    getWorker() {
+        if (!this.worker) {
+            this.worker = new Worker(IMAGE_WORKER_URL);
+            this.worker.onmessage = (event) => {
+                const { id, blob, error } = event.data;
+                const resolve = this.pending.get(id);
+                this.pending.delete(id);
+                if (error) console.warn('Не удалось уменьшить изображение:', error);
+                if (resolve) resolve(blob || null);
+            };
+            this.worker.onerror = (event) => {
+                // Воркер не загрузился: все ждущие загружают исходные файлы
+                console.warn('Воркер подготовки изображений недоступен:', event.message);
+                this.pending.forEach(resolve => resolve(null));
+                this.pending.clear();
+                this.worker = null;
+            };
+        }
+        return this.worker;
+    },
+    
+    async prepare(file) {
+        // Уменьшенный JPEG или исходный файл, если уменьшение не нужно или невозможно
+        if (!this.supported()) return file;
+        const limits = await this.getLimits();
+        const id = this.nextId++;
+        const blob = await new Promise((resolve) => {
+            this.pending.set(id, resolve);
+            this.getWorker().postMessage({
+                id,
+                file,
+                maxDimension: limits.max_dimension,
+                quality: limits.jpeg_quality
+            });
+        });
+        if (!blob) return file;
+        const name = file.name.replace(/\.[^.]+$/, '') + '.jpg';
+        return new File([blob], name, { type: 'image/jpeg' });
+    }
+};
+
 // === API Functions ===
 const api = {
     baseUrl: '',
     
     async analyzeText(text) {
-        const response = await fetch(`${this.baseUrl}/analyze_text`, {
+        const response = await fetchWithRetry(`${this.baseUrl}/analyze_text`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ text })
@@ -60,37 +152,183 @@ const api = {
     
     async analyzeImage(file) {
         const formData = new FormData();
-        formData.append('file', file);
+        formData.append('file', await imagePrep.prepare(file));
         
-        const response = await fetch(`${this.baseUrl}/analyze_image`, {
+        // Анализ изображения выполняется фоновой задачей
+        const response = await fetchWithRetry(`${this.baseUrl}/jobs/analyze_image`, {
             method: 'POST',
             body: formData
         });
-        return response.json();
+        const job = await response.json();
+        if (!response.ok) {
+            return { success: false, error: job.detail || 'Не удалось поставить задачу' };
+        }
+        return this.waitForJob(job.id);
     },
     
     async parseDemo(url) {
-        const response = await fetch(`${this.baseUrl}/parse_demo`, {
+        return this.runJob('parse_demo', { url });
+    },
+    
+    // === Фоновые задачи ===
+    
+    async runJob(type, payload, priority = 5) {
+        const response = await fetchWithRetry(`${this.baseUrl}/jobs`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url })
+            body: JSON.stringify({ type, payload, priority })
         });
-        return response.json();
+        const job = await response.json();
+        if (!response.ok) {
+            const detail = Array.isArray(job.detail) ? job.detail.map(d => d.msg).join('; ') : job.detail;
+            return { success: false, error: detail || 'Не удалось поставить задачу' };
+        }
+        return this.waitForJob(job.id);
     },
     
-    async getHistory() {
-        const response = await fetch(`${this.baseUrl}/history`);
-        return response.json();
+    jobResult(job) {
+        if (job.status === 'done') return job.result;
+        if (job.status === 'cancelled') return { success: false, error: 'Задача отменена' };
+        return { success: false, error: job.error || 'Задача завершилась с ошибкой' };
+    },
+    
+    waitForJob(jobId) {
+        // Ждём результат через WebSocket, при недоступности - опросом статуса
+        return new Promise((resolve) => {
+            let settled = false;
+            const finish = (result) => {
+                if (!settled) {
+                    settled = true;
+                    resolve(result);
+                }
+            };
+            
+            let polling = false;
+            const fallback = () => {
+                if (!settled && !polling) {
+                    polling = true;
+                    this.pollJob(jobId).then(finish);
+                }
+            };
+            
+            let socket;
+            try {
+                const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+                socket = new WebSocket(`${protocol}://${location.host}${this.baseUrl}/jobs/${jobId}/ws`);
+            } catch (error) {
+                fallback();
+                return;
+            }
+            
+            socket.onmessage = (event) => {
+                const job = JSON.parse(event.data);
+                if (['done', 'failed', 'cancelled'].includes(job.status)) {
+                    finish(this.jobResult(job));
+                    socket.close();
+                }
+            };
+            socket.onerror = fallback;
+            socket.onclose = fallback;
+        });
+    },
+    
+    async pollJob(jobId, interval = 1000) {
+        while (true) {
+            const response = await fetchWithRetry(`${this.baseUrl}/jobs/${jobId}`);
+            const job = await response.json();
+            if (!response.ok) {
+                return { success: false, error: job.detail || 'Задача не найдена' };
+            }
+            if (['done', 'failed', 'cancelled'].includes(job.status)) {
+                return this.jobResult(job);
+            }
+            await new Promise(r => setTimeout(r, interval));
+        }
+    },
+    
+    async getHistory(since = null, etag = null) {
+        // 304 - история не менялась; с since приходят только новые записи
+        const query = since ? `?since=${encodeURIComponent(since)}` : '';
+        const headers = etag ? { 'If-None-Match': etag } : {};
+        const response = await fetchWithRetry(`${this.baseUrl}/history${query}`, { headers, cache: 'no-store' });
+        if (response.status === 304) return null;
+        const data = await response.json();
+        data.etag = response.headers.get('ETag');
+        return data;
     },
     
     async clearHistory() {
-        const response = await fetch(`${this.baseUrl}/history`, {
+        const response = await fetchWithRetry(`${this.baseUrl}/history`, {
             method: 'DELETE'
         });
         return response.json();
     }
 };
 
+// === Лента событий сервера ===
+// WebSocket /ws/events, если он недоступен (прокси) - Server-Sent Events /events
+const EVENTS_RECONNECT_DELAYS_MS = [1000, 2000, 5000, 10000, 30000];
+const EVENTS_WS_ATTEMPTS = 3;
+const HISTORY_LIVE_LIMIT = 100;
+
+const events = {
+    lastId: null,
+    failures: 0,
+    wsFailures: 0,
+    
+    connect() {
+        if (!('WebSocket' in window) || this.wsFailures >= EVENTS_WS_ATTEMPTS) {
+            this.connectSSE();
+            return;
+        }
+        const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+        const since = this.lastId !== null ? `?since=${this.lastId}` : '';
+        let opened = false;
+        const socket = new WebSocket(`${protocol}://${location.host}${api.baseUrl}/ws/events${since}`);
+        socket.onopen = () => {
+            opened = true;
+            this.failures = 0;
+            this.wsFailures = 0;
+        };
+        socket.onmessage = (message) => this.handle(JSON.parse(message.data));
+        socket.onclose = () => {
+            if (!opened) this.wsFailures++;
+            this.reconnect();
+        };
+    },
+    
+    connectSSE() {
+        if (!('EventSource' in window)) return;
+        // EventSource сам переподключается и передаёт Last-Event-ID
+        const since = this.lastId !== null ? `?since=${this.lastId}` : '';
+        const source = new EventSource(`${api.baseUrl}/events${since}`);
+        ['ready', 'history.added', 'history.cleared', 'job.updated'].forEach(type => {
+            source.addEventListener(type, (message) => this.handle(JSON.parse(message.data)));
+        });
+    },
+    
+    reconnect() {
+        const delay = EVENTS_RECONNECT_DELAYS_MS[Math.min(this.failures, EVENTS_RECONNECT_DELAYS_MS.length - 1)];
+        this.failures++;
+        setTimeout(() => this.connect(), delay);
+    },
+    
+    handle(event) {
+        if (event.id !== undefined && event.id !== null) this.lastId = event.id;
+        
+        if (event.type === 'history.added' && state.history) {
+            if (!state.history.some(item => item.id === event.data.id)) {
+                state.history.unshift(event.data);
+                state.history.length = Math.min(state.history.length, HISTORY_LIVE_LIMIT);
+                if (state.currentTab === 'history') ui.renderHistory(state.history);
+            }
+        } else if (event.type === 'history.cleared' && state.history) {
+            state.history = [];
+            if (state.currentTab === 'history') ui.renderHistory(state.history);
+        }
+    }
+};
+
 // === UI Functions ===
 const ui = {
     showLoading() {
@@ -259,9 +497,20 @@ const ui = {
             </div>
             
             ${parsed.analysis ? this.renderTextAnalysis(parsed.analysis) : ''}
+            ${this.renderFacts(parsed.facts)}
         `;
     },
     
+    // Факты локальных правил (без LLM): правило и примеры совпадений
+    renderFacts(facts) {
+        if (!facts || facts.length === 0) return '';
+        return this.renderResultBlock(
+            'Найденные факты',
+            facts.map(fact => `${fact.label}: ${fact.matches.join(', ')}`),
+            'facts'
+        );
+    },
+    
     renderResultBlock(title, items, type) {
         if (!items || items.length === 0) return '';
         
@@ -270,7 +519,8 @@ const ui = {
             weaknesses: '<circle cx="12" cy="12" r="10"/><line x1="12" y1="8" x2="12" y2="12"/><line x1="12" y1="16" x2="12.01" y2="16"/>',
             unique: '<polygon points="12 2 15.09 8.26 22 9.27 17 14.14 18.18 21.02 12 17.77 5.82 21.02 7 14.14 2 9.27 8.91 8.26 12 2"/>',
             recommendations: '<circle cx="12" cy="12" r="10"/><path d="M9.09 9a3 3 0 0 1 5.83 1c0 2-3 3-3 3"/><line x1="12" y1="17" x2="12.01" y2="17"/>',
-            insights: '<path d="M1 12s4-8 11-8 11 8 11 8-4 8-11 8-11-8-11-8z"/><circle cx="12" cy="12" r="3"/>'
+            insights: '<path d="M1 12s4-8 11-8 11 8 11 8-4 8-11 8-11-8-11-8z"/><circle cx="12" cy="12" r="3"/>',
+            facts: '<path d="M9 11l3 3L22 4"/><path d="M21 12v7a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2V5a2 2 0 0 1 2-2h11"/>'
         };
         
         return `
@@ -289,9 +539,19 @@ const ui = {
     },
     
     async loadHistory() {
+        if (state.history) this.renderHistory(state.history);
         try {
-            const data = await api.getHistory();
-            this.renderHistory(data.items);
+            const data = await api.getHistory(state.historyCursor, state.historyEtag);
+            if (!data) return;
+            if (data.full || !state.history) {
+                state.history = data.items;
+            } else {
+                const known = new Set(state.history.map(item => item.id));
+                state.history = data.items.filter(item => !known.has(item.id)).concat(state.history).slice(0, data.total);
+            }
+            state.historyCursor = data.cursor;
+            state.historyEtag = data.etag;
+            this.renderHistory(state.history);
         } catch (error) {
             console.error('Failed to load history:', error);
         }
@@ -314,13 +574,19 @@ const ui = {
         const icons = {
             text: '<path d="M14 2H6a2 2 0 0 0-2 2v16a2 2 0 0 0 2 2h12a2 2 0 0 0 2-2V8z"/><polyline points="14 2 14 8 20 8"/>',
             image: '<rect x="3" y="3" width="18" height="18" rx="2" ry="2"/><circle cx="8.5" cy="8.5" r="1.5"/><polyline points="21 15 16 10 5 21"/>',
-            parse: '<circle cx="12" cy="12" r="10"/><line x1="2" y1="12" x2="22" y2="12"/><path d="M12 2a15.3 15.3 0 0 1 4 10 15.3 15.3 0 0 1-4 10 15.3 15.3 0 0 1-4-10 15.3 15.3 0 0 1 4-10z"/>'
+            parse: '<circle cx="12" cy="12" r="10"/><line x1="2" y1="12" x2="22" y2="12"/><path d="M12 2a15.3 15.3 0 0 1 4 10 15.3 15.3 0 0 1-4 10 15.3 15.3 0 0 1-4-10 15.3 15.3 0 0 1 4-10z"/>',
+            crawl: '<circle cx="12" cy="12" r="10"/><line x1="2" y1="12" x2="22" y2="12"/><path d="M12 2a15.3 15.3 0 0 1 4 10 15.3 15.3 0 0 1-4 10 15.3 15.3 0 0 1-4-10 15.3 15.3 0 0 1 4-10z"/>',
+            compare: '<line x1="12" y1="3" x2="12" y2="21"/><polyline points="5 8 12 5 19 8"/><path d="M2 15l3-7 3 7a3 3 0 0 1-6 0z"/><path d="M16 15l3-7 3 7a3 3 0 0 1-6 0z"/>',
+            monitor: '<path d="M18 8A6 6 0 0 0 6 8c0 7-3 9-3 9h18s-3-2-3-9"/><path d="M13.73 21a2 2 0 0 1-3.46 0"/>'
         };
         
         const typeLabels = {
             text: 'Анализ текста',
             image: 'Анализ изображения',
-            parse: 'Парсинг сайта'
+            parse: 'Парсинг сайта',
+            crawl: 'Обход сайта',
+            compare: 'Сравнение конкурентов',
+            monitor: 'Мониторинг изменений'
         };
         
         elements.historyList.innerHTML = items.map(item => {
@@ -375,7 +641,7 @@ const handlers = {
             const result = await api.analyzeText(text);
             
             if (result.success && result.analysis) {
-                ui.showResults(ui.renderTextAnalysis(result.analysis));
+                ui.showResults(ui.renderTextAnalysis(result.analysis) + ui.renderFacts(result.facts));
             } else {
                 ui.showError(result.error || 'Произошла ошибка при анализе');
             }
@@ -422,19 +688,22 @@ const handlers = {
     processImage(file) {
         state.selectedImage = file;
         
-        const reader = new FileReader();
-        reader.onload = (e) => {
-            elements.imagePreview.src = e.target.result;
-            elements.previewContainer.hidden = false;
-            elements.uploadZone.querySelector('.upload-content').hidden = true;
-            elements.analyzeImageBtn.disabled = false;
-        };
-        reader.readAsDataURL(file);
+        // Превью по ссылке на файл, без чтения всего файла в data URL
+        if (elements.imagePreview.src.startsWith('blob:')) {
+            URL.revokeObjectURL(elements.imagePreview.src);
+        }
+        elements.imagePreview.src = URL.createObjectURL(file);
+        elements.previewContainer.hidden = false;
+        elements.uploadZone.querySelector('.upload-content').hidden = true;
+        elements.analyzeImageBtn.disabled = false;
     },
     
     handleRemoveImage() {
         state.selectedImage = null;
         elements.imageInput.value = '';
+        if (elements.imagePreview.src.startsWith('blob:')) {
+            URL.revokeObjectURL(elements.imagePreview.src);
+        }
         elements.imagePreview.src = '';
         elements.previewContainer.hidden = true;
         elements.uploadZone.querySelector('.upload-content').hidden = false;
@@ -505,7 +774,10 @@ const handlers = {
         
         try {
             await api.clearHistory();
-            ui.renderHistory([]);
+            state.history = [];
+            state.historyCursor = null;
+            state.historyEtag = null;
+            ui.renderHistory(state.history);
         } catch (error) {
             console.error('Failed to clear history:', error);
         }
@@ -553,6 +825,9 @@ function init() {
     
     // Show default tab
     ui.showTab('text');
+    
+    // Live updates
+    events.connect();
 }
 
 // Start app
@@ -0,0 +1,107 @@
+"""
+Сборка веб-интерфейса для production
+
+    python web/build.py
+
+Создаёт web/dist/:
+- app.<hash>.js, image_worker.<hash>.js, style.<hash>.css - имена с хешем содержимого: файл с
+  таким именем никогда не меняется, поэтому кешируется браузером
+  навсегда (Cache-Control: immutable);
+- index.html со ссылками на файлы с хешем (сам index.html не кешируется
+  надолго, а перепроверяется по ETag);
+- предсжатые варианты .gz и .br (brotli - если установлен пакет Brotli):
+  сервер отдаёт их без сжатия на лету;
+- manifest.json - соответствие исходных имён собранным.
+
+Если web/dist существует, сервер отдаёт интерфейс из него (/ и /assets),
+иначе - исходные файлы из web/ (/static), как при разработке.
+"""
+import gzip
+import hashlib
+import json
+import shutil
+import sys
+from pathlib import Path
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+web_dir = Path(__file__).resolve().parent
+dist_dir = web_dir / "dist"
+
+# Ресурсы, которые получают имя с хешем; ссылки на ресурс в тех, что идут
+# после него, заменяются на имя с хешем (app.js загружает image_worker.js)
+ASSETS = ("image_worker.js", "app.js", "style.css")
+# URL, по которому index.html ссылается на ресурс при разработке и после сборки
+SOURCE_PREFIX = "/static/"
+DIST_PREFIX = "/assets/"
+# Длина хеша в имени файла (должна совпадать с HASHED_NAME_RE в backend/static_files.py)
+HASH_LENGTH = 10
+# Файлы меньше этого размера не сжимаются: выигрыш меньше накладных расходов
+MIN_COMPRESS_SIZE = 256
+
+
+def hashed_name(name: str, content: bytes) -> str:
+    """app.js -> app.<hash>.js"""
+    stem, _, suffix = name.rpartition(".")
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    return f"{stem}.{digest}.{suffix}"
+
+
+def write_variants(path: Path, content: bytes) -> list:
+    """Записать файл и его предсжатые варианты"""
+    path.write_bytes(content)
+    written = [path]
+    if len(content) < MIN_COMPRESS_SIZE:
+        return written
+    gz_path = path.with_name(path.name + ".gz")
+    gz_path.write_bytes(gzip.compress(content, compresslevel=9, mtime=0))
+    written.append(gz_path)
+    if BROTLI_AVAILABLE:
+        br_path = path.with_name(path.name + ".br")
+        br_path.write_bytes(brotli.compress(content, quality=11))
+        written.append(br_path)
+    return written
+
+
+def build() -> int:
+    print("Сборка веб-интерфейса")
+    if dist_dir.exists():
+        shutil.rmtree(dist_dir)
+    dist_dir.mkdir()
+
+    manifest = {}
+    written = []
+    for name in ASSETS:
+        content = (web_dir / name).read_bytes()
+        for source, built in manifest.items():
+            content = content.replace(f"{SOURCE_PREFIX}{source}".encode(), f"{DIST_PREFIX}{built}".encode())
+        target = hashed_name(name, content)
+        manifest[name] = target
+        written += write_variants(dist_dir / target, content)
+
+    index = (web_dir / "index.html").read_text(encoding="utf-8")
+    for name in ("app.js", "style.css"):
+        target = manifest[name]
+        source_url = f"{SOURCE_PREFIX}{name}"
+        if source_url not in index:
+            print(f"ERROR: index.html не ссылается на {source_url}")
+            return 1
+        index = index.replace(source_url, f"{DIST_PREFIX}{target}")
+    written += write_variants(dist_dir / "index.html", index.encode("utf-8"))
+
+    (dist_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    for path in written:
+        print(f"   {path.relative_to(web_dir)}  {path.stat().st_size / 1024:.1f} КБ")
+    if not BROTLI_AVAILABLE:
+        print("   (варианты .br не созданы: pip install Brotli)")
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(build())
@@ -0,0 +1,36 @@
+/**
+ * Уменьшение изображения перед загрузкой (Web Worker)
+ *
+ * Декодирование и перекодирование больших изображений не блокирует
+ * интерфейс. Сообщение: { id, file, maxDimension, quality };
+ * ответ: { id, blob } (blob = null - загружать исходный файл) или { id, error }.
+ */
+self.onmessage = async (event) => {
+    const { id, file, maxDimension, quality } = event.data;
+    try {
+        const bitmap = await createImageBitmap(file);
+        const scale = Math.min(1, maxDimension / Math.max(bitmap.width, bitmap.height));
+        if (scale === 1 && file.type === 'image/jpeg') {
+            // JPEG в допустимом размере: повторное сжатие только испортит качество
+            bitmap.close();
+            self.postMessage({ id, blob: null });
+            return;
+        }
+        
+        const width = Math.max(1, Math.round(bitmap.width * scale));
+        const height = Math.max(1, Math.round(bitmap.height * scale));
+        const canvas = new OffscreenCanvas(width, height);
+        const ctx = canvas.getContext('2d');
+        // Прозрачность на белом фоне, как на сервере
+        ctx.fillStyle = '#fff';
+        ctx.fillRect(0, 0, width, height);
+        ctx.imageSmoothingQuality = 'high';
+        ctx.drawImage(bitmap, 0, 0, width, height);
+        bitmap.close();
+        
+        const blob = await canvas.convertToBlob({ type: 'image/jpeg', quality: quality / 100 });
+        self.postMessage({ id, blob: blob.size < file.size ? blob : null });
+    } catch (error) {
+        self.postMessage({ id, error: String(error) });
+    }
+};